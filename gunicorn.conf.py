@@ -0,0 +1,36 @@
+"""
+Gunicorn config for the production profile: ``gunicorn -c gunicorn.conf.py``.
+
+Pre-forks WEB_CONCURRENCY workers (default 2 x CPUs + 1) running the WSGI
+app on threaded workers. SERVER_INTERFACE=asgi runs the ASGI app on uvicorn
+workers instead.
+"""
+
+import multiprocessing
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "loanproject.settings_production")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+if os.environ.get("SERVER_INTERFACE", "wsgi") == "asgi":
+    wsgi_app = "loanproject.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "loanproject.wsgi:application"
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Load Django once in the master; workers fork with it imported. No DB
+# connection is opened at import, so none is shared across the fork.
+preload_app = True
+
+# Recycle workers now and then to bound slow leaks; jitter avoids all of
+# them restarting at once.
+max_requests = 10000
+max_requests_jitter = 1000
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
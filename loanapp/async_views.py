@@ -0,0 +1,94 @@
+"""
+Async variants of the read-mostly loan endpoints, for the ASGI server.
+
+DRF 3.14's APIView has no async handlers, so these are plain Django async
+views returning the same bodies as their APIView counterparts.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from .loan_stats import loan_history
+from .models import Loan
+from .pagination import etag_matches, next_link, page_etag, page_queryset, parse_page_request, render_rows
+from .profiles import aget_credit_profile
+from .serializers import LOAN_DETAIL_COLUMNS, EligibilityRequestSerializer, loan_detail
+from .sharding import ascatter_first, customer_shard
+from .utils import assess_eligibility
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, status=status_code, encoder=DjangoJSONEncoder, safe=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCheckEligibilityView(View):
+    # Read-only: its queries may go to a read replica (see loanapp/routers.py).
+    replica_reads = True
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError as error:
+            # DRF's wording, as the sync view answers.
+            return json_response({"detail": f"JSON parse error - {error}"}, status.HTTP_400_BAD_REQUEST)
+        serializer = EligibilityRequestSerializer(data=data)
+        if not serializer.is_valid():
+            return json_response({"error": serializer.errors}, status.HTTP_400_BAD_REQUEST)
+        item = serializer.validated_data
+
+        with customer_shard(item['customer_id']):
+            profile = await aget_credit_profile(item['customer_id'])
+        if profile is None:
+            return json_response({"error": "Customer not found"}, status.HTTP_404_NOT_FOUND)
+
+        customer = profile.customer
+        result = assess_eligibility(
+            customer, loan_history(customer), item['loan_amount'], item['interest_rate'], item['tenure'],
+        )
+        return json_response(result)
+
+
+class AsyncLoanDetailView(View):
+    replica_reads = True
+
+    async def get(self, request, loan_id):
+        row = await ascatter_first(Loan.objects.filter(loan_id=loan_id).values_list(*LOAN_DETAIL_COLUMNS).afirst)
+        if row is None:
+            return json_response({"detail": "Loan not found."}, status.HTTP_404_NOT_FOUND)
+
+        return json_response(loan_detail(row))
+
+
+class AsyncCustomerLoansView(View):
+    replica_reads = True
+
+    async def get(self, request, customer_id):
+        try:
+            page = parse_page_request(request.GET)
+        except ValueError as error:
+            return json_response({"detail": str(error)}, status.HTTP_400_BAD_REQUEST)
+
+        loans = Loan.objects.filter(customer__customer_id=customer_id, loan_approved=True)
+
+        # One query: an empty first page is the not-found case, no separate exists().
+        with customer_shard(customer_id):
+            rows = [row async for row in page_queryset(loans, page)]
+        if not rows and not page.after_pk:
+            return json_response({"detail": "No approved loans found for this customer."}, status.HTTP_404_NOT_FOUND)
+
+        etag = page_etag(rows, page.fields)
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponseNotModified()
+        else:
+            response = json_response(render_rows(rows[:page.limit], page.fields))
+        response['ETag'] = etag
+        link = next_link(request, rows, page)
+        if link:
+            response['Link'] = link
+        return response
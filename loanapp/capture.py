@@ -0,0 +1,213 @@
+"""
+Sampled capture of API traffic to rotating JSONL files, for replay_requests.
+
+CaptureMiddleware picks a CAPTURE_SAMPLE_RATE share of /api/ requests and
+hands method, path, body, selected headers, status, latency and a digest of
+the response to a background writer thread. The request thread only does a
+non-blocking queue put: if the writer falls behind, records are dropped and
+counted rather than slowing requests down. The writer batches what is
+queued, writes it in one go and rotates the file past CAPTURE_MAX_BYTES.
+
+Captured bodies can hold personal data, so capture is off unless
+CAPTURE_ENABLED is set.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+# Request headers kept, so replays hit the same code paths.
+CAPTURED_HEADERS = ('Content-Type', 'Idempotency-Key', 'If-None-Match')
+
+# Records written per batch at most.
+WRITE_BATCH = 1000
+
+
+def response_digest(content: bytes) -> str:
+    """Short digest of a response body, to compare replayed responses with captured ones."""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class CaptureWriter:
+    """
+    Appends records to a size-rotated JSONL file from a background thread.
+
+    ``path`` may contain ``{pid}`` so each server worker writes its own file.
+    The thread starts on first use in each process, so a writer created
+    before a pre-fork server forks still works in the workers.
+    """
+
+    def __init__(self, path, max_bytes: int, backup_count: int, queue_size: int = 10000):
+        self.path_template = str(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, record: dict) -> bool:
+        """Queue a record without blocking; False if it was dropped."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+            self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.path = self.path_template.format(pid=os.getpid())
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._run, name='request-capture', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file = open(self.path, 'a', encoding='utf-8')
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < WRITE_BATCH:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                records = [record for record in batch if record is not None]
+                try:
+                    file.write(''.join(json.dumps(as_entry(record)) + '\n' for record in records))
+                    file.flush()
+                    if file.tell() >= self.max_bytes:
+                        file.close()
+                        self._rotate()
+                        file = open(self.path, 'a', encoding='utf-8')
+                except (OSError, ValueError):
+                    logger.exception("Could not write %d captured requests to %s", len(records), self.path)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if len(records) < len(batch):
+                    return
+        finally:
+            file.close()
+
+    def _rotate(self):
+        """requests.jsonl -> requests.jsonl.1 -> ... -> requests.jsonl.<backup_count>, oldest dropped."""
+        if self.backup_count < 1:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+
+def as_entry(record: dict) -> dict:
+    """A replay_requests entry from a raw capture record; runs on the writer thread."""
+    body = record.pop('body')
+    if body:
+        text = body.decode('utf-8', errors='replace')
+        try:
+            record['body'] = json.loads(text) if 'json' in record['headers'].get('Content-Type', '') else text
+        except ValueError:
+            record['body'] = text
+    return record
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer() -> CaptureWriter:
+    """The process-wide writer for the configured capture file."""
+    key = (str(settings.CAPTURE_PATH), settings.CAPTURE_MAX_BYTES, settings.CAPTURE_BACKUP_COUNT)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = CaptureWriter(*key)
+        return _writers[key]
+
+
+class CaptureMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CAPTURE_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.CAPTURE_SAMPLE_RATE
+        self.prefix = settings.CAPTURE_PATH_PREFIX
+        self.max_body = settings.CAPTURE_MAX_BODY_BYTES
+        self.writer = get_writer()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+        body = self.read_body(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.capture(request, body, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+        body = self.read_body(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.capture(request, body, response, time.perf_counter() - started)
+        return response
+
+    def sampled(self, request) -> bool:
+        return request.path.startswith(self.prefix) and random.random() < self.sample_rate
+
+    def read_body(self, request) -> bytes:
+        # Read before the view does: DRF consumes the stream, after which
+        # request.body is no longer available.
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        return request.body if 0 < length <= self.max_body else b''
+
+    def capture(self, request, body, response, elapsed):
+        duration_ms = elapsed * 1000
+        content = b'' if response.streaming else response.content
+        self.writer.submit({
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'body': body,
+            'headers': {name: request.headers[name] for name in CAPTURED_HEADERS if name in request.headers},
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 3),
+            'response_bytes': len(content),
+            'response_digest': response_digest(content),
+        })
@@ -0,0 +1,153 @@
+"""
+EMI and amortization maths shared by the views and management commands.
+
+Every function accepts scalars or array-likes of principal, annual interest
+rate (%) and tenure (months) and evaluates them with NumPy, so a whole
+portfolio can be priced in one call:
+
+    EMI = P * r * (1+r)^n / ((1+r)^n - 1)
+
+where r is the monthly rate. A zero rate, or one so small that (1+r)^n - 1
+underflows to zero, falls back to P / n.
+
+``emi`` returns raw floats for comparisons and aggregates. ``emi_money``
+returns Decimals rounded half-up to 2 places, exact even on half-paisa
+ties, and is what gets stored in ``Loan.monthly_repayment``.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+CENT = Decimal('0.01')
+
+# Float EMIs carry ~1e-15 relative error, so only values this close to a
+# half-paisa boundary can round the wrong way; those are redone in Decimal.
+TIE_TOLERANCE = 1e-9
+
+
+def monthly_rate(annual_rate):
+    """Annual interest rate in percent -> monthly rate as a fraction."""
+    return np.asarray(annual_rate, dtype=float) / (12 * 100)
+
+
+def emi(principal, annual_rate, tenure):
+    """Unrounded EMI as a float array (or float for scalar inputs)."""
+    P = np.asarray(principal, dtype=float)
+    r = monthly_rate(annual_rate)
+    n = np.asarray(tenure, dtype=float)
+
+    # (1+r)^n - 1 via log1p/expm1, which keeps tiny rates from cancelling to 0.
+    growth_less_one = np.expm1(n * np.log1p(r))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(growth_less_one == 0, P / n, P * r * (growth_less_one + 1) / growth_less_one)
+
+
+def emi_decimal(principal, annual_rate, tenure) -> Decimal:
+    """Reference EMI for a single loan computed in Decimal, rounded half-up."""
+    P = Decimal(str(principal))
+    r = (Decimal(str(annual_rate)) / Decimal('12')) / Decimal('100')
+    n = int(tenure)
+
+    growth = (1 + r) ** n
+    if growth == 1:
+        value = P / n
+    else:
+        value = P * r * growth / (growth - 1)
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _round_half_up_cents(principal, annual_rate, tenure):
+    """Whole cents, rounded half-up, with Decimal recomputation of near-ties."""
+    P, rate, n = np.broadcast_arrays(
+        np.asarray(principal, dtype=float),
+        np.asarray(annual_rate, dtype=float),
+        np.asarray(tenure, dtype=float),
+    )
+    shape = P.shape
+    P, rate, n = P.ravel(), rate.ravel(), n.ravel()
+
+    cents = emi(P, rate, n) * 100
+    rounded = np.floor(cents + 0.5)
+
+    fraction = cents - np.floor(cents)
+    ties = np.abs(fraction - 0.5) <= TIE_TOLERANCE * np.maximum(1, np.abs(cents))
+    for i in np.flatnonzero(ties):
+        rounded[i] = emi_decimal(P[i], rate[i], n[i]) * 100
+    return rounded.reshape(shape)
+
+
+def emi_rounded(principal, annual_rate, tenure):
+    """EMI rounded half-up to 2 decimals, as floats."""
+    return _round_half_up_cents(principal, annual_rate, tenure) / 100
+
+
+def emi_money(principal, annual_rate, tenure):
+    """
+    EMI as Decimal rounded half-up to 2 decimals, for amounts that are stored.
+
+    Returns a Decimal for scalar inputs and a list of Decimals otherwise.
+    """
+    cents = _round_half_up_cents(principal, annual_rate, tenure)
+    if cents.ndim == 0:
+        return Decimal(int(cents)).scaleb(-2)
+    return [Decimal(int(value)).scaleb(-2) for value in cents.ravel()]
+
+
+def amortization_schedules(principal, annual_rate, tenure):
+    """
+    Month-by-month breakdown for many loans at once.
+
+    Returns a dict of 2-D arrays shaped (loans, longest tenure): ``payment``,
+    ``interest``, ``principal`` and ``balance`` (closing balance after the
+    payment). Months past a loan's own tenure are NaN.
+    """
+    P = np.atleast_1d(np.asarray(principal, dtype=float))[:, None]
+    rate = np.atleast_1d(np.asarray(annual_rate, dtype=float))[:, None]
+    n = np.atleast_1d(np.asarray(tenure, dtype=int))[:, None]
+    r = monthly_rate(rate)
+    payment = emi(P, rate, n)
+
+    months = np.arange(1, int(n.max(initial=0)) + 1)[None, :]
+    growth_less_one = np.expm1(months * np.log1p(r))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Closed-form balance after k payments: P(1+r)^k - EMI((1+r)^k - 1)/r
+        balance = np.where(
+            growth_less_one == 0, P - payment * months, P * (growth_less_one + 1) - payment * growth_less_one / r,
+        )
+    balance = np.clip(balance, 0, None)
+    opening = np.concatenate([np.broadcast_to(P, (P.shape[0], 1)), balance[:, :-1]], axis=1)
+    interest = opening * r
+    principal_paid = opening - balance
+
+    active = months <= n
+    return {
+        'payment': np.where(active, interest + principal_paid, np.nan),
+        'interest': np.where(active, interest, np.nan),
+        'principal': np.where(active, principal_paid, np.nan),
+        'balance': np.where(active, balance, np.nan),
+    }
+
+
+def amortization_schedule(principal, annual_rate, tenure):
+    """Breakdown for one loan: dict of 1-D arrays of length ``tenure``."""
+    schedules = amortization_schedules(principal, annual_rate, tenure)
+    return {key: values[0, :int(tenure)] for key, values in schedules.items()}
+
+
+def iter_schedule(principal, annual_rate, tenure):
+    """
+    Yield (month, payment, interest, principal, balance) one month at a time.
+
+    Walks the schedule by recurrence, so memory stays constant however long
+    the tenure is; the final month settles whatever balance remains.
+    """
+    balance = float(principal)
+    r = float(monthly_rate(annual_rate))
+    payment = float(emi(principal, annual_rate, tenure))
+    tenure = int(tenure)
+
+    for month in range(1, tenure + 1):
+        interest = balance * r
+        principal_paid = balance if month == tenure else min(payment - interest, balance)
+        balance -= principal_paid
+        yield month, interest + principal_paid, interest, principal_paid, balance
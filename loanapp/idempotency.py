@@ -0,0 +1,39 @@
+import hashlib
+import json
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Stable hash of the parsed request, to catch a key reused for another request."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def stored_response(key: str, fingerprint: str):
+    """
+    The response already recorded under key, or None for a new key.
+
+    A key recorded for a different request gets a 422 instead of a replay.
+    """
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is None:
+        return None
+    if record.request_hash != fingerprint:
+        return Response(
+            {"message": f"{HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def store_response(key: str, fingerprint: str, response):
+    """Record response under key; call it in the transaction that produced it."""
+    IdempotencyKey.objects.create(
+        key=key, request_hash=fingerprint, status_code=response.status_code, response=response.data,
+    )
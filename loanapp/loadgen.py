@@ -0,0 +1,209 @@
+"""Request mixes, latency summaries and stored results shared by the benchmark commands."""
+import json
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.urls import Resolver404, resolve, reverse
+
+from .models import Customer, Loan
+from .sharding import on_first_shard
+
+ELIGIBILITY_BODY = {'loan_amount': 100000, 'interest_rate': 12, 'tenure': 24}
+REGISTER_BODY = {'first_name': 'Load', 'last_name': 'Test', 'age': 35, 'phone_number': '9000000000'}
+
+# Share of each endpoint in request_mix, roughly read-heavy API traffic.
+MIX_WEIGHTS = {
+    'register_customer': 0.05,
+    'check-eligibility': 0.25,
+    'create_loan': 0.10,
+    'view_loan': 0.30,
+    'customer-loans': 0.30,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@on_first_shard
+def _customers_and_loans():
+    # Prefer customers view-loans has something to return for.
+    owners = Customer.objects.filter(loan__loan_approved=True).distinct()
+    if not owners.exists():
+        owners = Customer.objects.filter(loan_count__gt=0)
+    customer_ids = list(owners.values_list('customer_id', flat=True)[:1000])
+    loan_ids = list(Loan.objects.values_list('loan_id', flat=True)[:1000])
+    if not customer_ids or not loan_ids:
+        raise CommandError("No loans to query; run ingest_data or seed_data first.")
+    return customer_ids, loan_ids
+
+
+def request_plan(count: int, seed: int = 0) -> list:
+    """
+    A reproducible mix of check-eligibility, view-loan and view-loans calls.
+
+    Entries are (method, url name, url args, JSON body or None).
+    """
+    rng = np.random.default_rng(seed)
+    customer_ids, loan_ids = _customers_and_loans()
+
+    plan = []
+    for kind in rng.integers(0, 3, count):
+        if kind == 0:
+            body = dict(ELIGIBILITY_BODY, customer_id=customer_ids[rng.integers(len(customer_ids))])
+            plan.append(('post', 'check-eligibility', (), body))
+        elif kind == 1:
+            plan.append(('get', 'view_loan', (loan_ids[rng.integers(len(loan_ids))],), None))
+        else:
+            plan.append(('get', 'customer-loans', (customer_ids[rng.integers(len(customer_ids))],), None))
+    return plan
+
+
+def request_mix(count: int, seed: int = 0, weights=None) -> list:
+    """
+    A reproducible mix over all five API endpoints, as replay_requests entries.
+
+    Entries are dicts with ``method``, ``path`` and (for POSTs) ``body``.
+    """
+    weights = weights or MIX_WEIGHTS
+    rng = np.random.default_rng(seed)
+    customer_ids, loan_ids = _customers_and_loans()
+    names = list(weights)
+    probabilities = np.array([weights[name] for name in names], dtype=float)
+
+    entries = []
+    for kind in rng.choice(len(names), size=count, p=probabilities / probabilities.sum()):
+        name = names[kind]
+        customer_id = customer_ids[rng.integers(len(customer_ids))]
+        if name == 'register_customer':
+            body = dict(REGISTER_BODY, monthly_income=int(rng.integers(20, 200)) * 1000)
+            entries.append({'method': 'POST', 'path': reverse(name), 'body': body})
+        elif name in ('check-eligibility', 'create_loan'):
+            body = dict(ELIGIBILITY_BODY, customer_id=customer_id)
+            entries.append({'method': 'POST', 'path': reverse(name), 'body': body})
+        elif name == 'view_loan':
+            entries.append({'method': 'GET', 'path': reverse(name, args=[loan_ids[rng.integers(len(loan_ids))]])})
+        else:
+            entries.append({'method': 'GET', 'path': reverse(name, args=[customer_id])})
+    return entries
+
+
+def write_requests(path, entries):
+    with open(path, 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+
+
+def read_requests(path) -> list:
+    """replay_requests entries from a JSONL file, one request per line."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def endpoint_name(path: str) -> str:
+    """The URL name a request path resolves to, for per-endpoint reporting."""
+    try:
+        return resolve(path.split('?')[0]).url_name or path
+    except Resolver404:
+        return 'unresolved'
+
+
+def latency_summary(elapsed: float, outcomes) -> dict:
+    """Throughput and latency percentiles from (seconds, failed) per request."""
+    timings = np.array([seconds for seconds, _ in outcomes]) * 1000
+    summary = {
+        'requests': len(timings),
+        'errors': sum(failed for _, failed in outcomes),
+        'rps': len(timings) / elapsed if elapsed else 0.0,
+    }
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_ms'] = float(np.percentile(timings, percentile)) if len(timings) else 0.0
+    return summary
+
+
+# Stored results: one JSON object per line, appended by the benchmark
+# commands so later runs can be compared against earlier ones.
+
+def results_path():
+    return settings.BASE_DIR / 'benchmark_results.jsonl'
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def store_result(path, benchmark: str, params: dict, metrics: dict) -> dict:
+    record = {
+        'benchmark': benchmark,
+        'params': params,
+        'metrics': metrics,
+        'revision': git_revision(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+
+def last_result(path, benchmark: str, params: dict):
+    """The most recent stored result of ``benchmark`` run with the same params, or None."""
+    try:
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    matching = [r for r in records if r['benchmark'] == benchmark and r['params'] == params]
+    return matching[-1] if matching else None
+
+
+def regressions(current: dict, baseline: dict, tolerance: float) -> dict:
+    """
+    Metrics that got worse than ``baseline`` by more than ``tolerance`` (a fraction).
+
+    Keys ending in ``_ms`` or ``_us`` and ``errors`` are lower-is-better; ``rps``
+    and ``per_sec`` keys are higher-is-better. Returns {key: (baseline, current)}.
+    """
+    worse = {}
+    for key, value in current.items():
+        before = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+            continue
+        if key.endswith(('_ms', '_us')) or key == 'errors':
+            regressed = value > before * (1 + tolerance) if before else value > 0
+        elif key == 'rps' or key.endswith('per_sec'):
+            regressed = value < before * (1 - tolerance)
+        else:
+            continue
+        if regressed:
+            worse[key] = (before, value)
+    return worse
+
+
+def record_and_compare(path, benchmark: str, params: dict, metrics: dict, tolerance: float):
+    """
+    Store a result and compare it with the previous one of the same params.
+
+    Returns (previous record or None, regressions against it).
+    """
+    previous = last_result(path, benchmark, params)
+    store_result(path, benchmark, params, metrics)
+    if previous is None:
+        return None, {}
+    return previous, regressions(metrics, previous['metrics'], tolerance)
+
+
+def comparison_report(path, previous, worse: dict, tolerance: float) -> list:
+    """Printable lines describing a record_and_compare outcome."""
+    if previous is None:
+        return [f"Stored as the first result for these parameters in {path}"]
+    lines = [f"Compared with {previous['recorded_at']} ({previous['revision'] or 'unknown revision'}):"]
+    if not worse:
+        return lines + [f"no regressions beyond {tolerance:.0%}"]
+    return lines + [f"  REGRESSION {key}: {before:.2f} -> {after:.2f}" for key, (before, after) in worse.items()]
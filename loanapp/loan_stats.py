@@ -0,0 +1,137 @@
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+from django.db import connections, router
+from django.db.models import Case, F, Q, Value, When
+
+from .emi import emi_money, emi_rounded
+from .models import Customer, Loan
+from .utils import LoanHistory
+
+STAT_FIELDS = [
+    'loan_count', 'loans_paid_on_time', 'loan_volume',
+    'emi_total', 'last_loan_year', 'last_year_loan_count',
+]
+
+# Columns compute_loan_stats expects, in order.
+LOAN_COLUMNS = ['customer', 'loan_amount', 'interest_rate', 'tenure', 'emis_paid_on_time', 'start_date__year']
+
+
+def empty_stats() -> dict:
+    return {
+        'loan_count': 0,
+        'loans_paid_on_time': 0,
+        'loan_volume': Decimal('0.00'),
+        'emi_total': Decimal('0.00'),
+        'last_loan_year': None,
+        'last_year_loan_count': 0,
+    }
+
+
+def _cents(values) -> Decimal:
+    return Decimal(int(values)).scaleb(-2)
+
+
+def compute_loan_stats(rows) -> dict:
+    """
+    Reduce LOAN_COLUMNS rows to {customer pk: stats} with NumPy.
+
+    A pure function of the rows, so callers choose the query that feeds it.
+    """
+    loans = np.array(list(rows), dtype=float).reshape(-1, len(LOAN_COLUMNS))
+    owners, amounts, rates, tenures, emis_paid, start_years = loans.T
+
+    pks, index = np.unique(owners, return_inverse=True)
+
+    def per_customer(weights=None):
+        return np.bincount(index, weights=weights, minlength=len(pks))
+
+    counts = per_customer()
+    # A loan counts as paid on time when every EMI so far was paid on time.
+    paid_on_time = per_customer(emis_paid >= tenures)
+    # Work in whole cents so the sums are exact.
+    volume_cents = per_customer(np.rint(amounts * 100))
+    emi_cents = per_customer(np.rint(emi_rounded(amounts, rates, tenures) * 100))
+    last_years = np.full(len(pks), -np.inf)
+    np.maximum.at(last_years, index, start_years)
+    last_year_counts = per_customer(start_years == last_years[index])
+
+    return {
+        int(pk): {
+            'loan_count': int(counts[i]),
+            'loans_paid_on_time': int(paid_on_time[i]),
+            'loan_volume': _cents(volume_cents[i]),
+            'emi_total': _cents(emi_cents[i]),
+            'last_loan_year': int(last_years[i]),
+            'last_year_loan_count': int(last_year_counts[i]),
+        }
+        for i, pk in enumerate(pks)
+    }
+
+
+def aggregate_loan_stats(customer_pks) -> dict:
+    """Stats recomputed from the Loan table for the given customers, in one query."""
+    customer_pks = list(customer_pks)
+    rows = Loan.objects.filter(customer__in=customer_pks).values_list(*LOAN_COLUMNS)
+    stats = compute_loan_stats(rows)
+    return {pk: stats.get(pk, empty_stats()) for pk in customer_pks}
+
+
+def write_loan_stats(stats):
+    """Store {customer pk: stats} with one batched UPDATE statement."""
+    connection = connections[router.db_for_write(Customer)]
+    table = connection.ops.quote_name(Customer._meta.db_table)
+    assignments = ', '.join(f'{connection.ops.quote_name(field)} = %s' for field in STAT_FIELDS)
+    sql = f"UPDATE {table} SET {assignments} WHERE {connection.ops.quote_name(Customer._meta.pk.column)} = %s"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [values[field] for field in STAT_FIELDS] + [pk]
+            for pk, values in stats.items()
+        ])
+
+
+def rebuild_loan_stats(customer_pks):
+    """Recompute and store the counters for the given customers."""
+    stats = aggregate_loan_stats(customer_pks)
+    write_loan_stats(stats)
+    return stats
+
+
+def record_loan(loan):
+    """
+    Fold one newly created loan into its customer's counters.
+
+    A single UPDATE with F() expressions, so concurrent writers never lose
+    increments; call it in the same transaction that creates the loan.
+    """
+    year = loan.start_date.year
+    newer_year = Q(last_loan_year__isnull=True) | Q(last_loan_year__lt=year)
+    Customer.objects.filter(pk=loan.customer_id).update(
+        loan_count=F('loan_count') + 1,
+        loans_paid_on_time=F('loans_paid_on_time') + int(loan.emis_paid_on_time >= loan.tenure),
+        loan_volume=F('loan_volume') + Decimal(str(loan.loan_amount)),
+        emi_total=F('emi_total') + emi_money(loan.loan_amount, loan.interest_rate, loan.tenure),
+        # SET expressions all see the pre-update row, so these two agree.
+        last_year_loan_count=Case(
+            When(newer_year, then=Value(1)),
+            When(last_loan_year=year, then=F('last_year_loan_count') + 1),
+            default=F('last_year_loan_count'),
+        ),
+        last_loan_year=Case(
+            When(newer_year, then=Value(year)),
+            default=F('last_loan_year'),
+        ),
+    )
+
+
+def loan_history(customer) -> LoanHistory:
+    """Eligibility inputs read straight off the customer's counters."""
+    current_year_loans = customer.last_year_loan_count if customer.last_loan_year == datetime.now().year else 0
+    return LoanHistory(
+        count=customer.loan_count,
+        paid_on_time=customer.loans_paid_on_time,
+        current_year_loans=current_year_loans,
+        total_loan_amount=float(customer.loan_volume),
+        existing_emis=float(customer.emi_total),
+    )
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from loanapp.loadgen import latency_summary, request_plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec and latency of the sync (WSGI) and async (ASGI) read "
+        "views, driving each handler in-process at the same concurrency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per path (default: 2000).')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight (default: 32).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for picking targets (default: 0).')
+
+    def handle(self, *args, **options):
+        self.plan = request_plan(options['requests'], options['seed'])
+        concurrency = options['concurrency']
+        # 404s are part of the mix; keep django.request from logging each one.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        self.stdout.write(f"{len(self.plan)} requests per path at concurrency {concurrency} ({connection.vendor})")
+
+        results = {
+            'sync (WSGI)': self.run_sync(concurrency),
+            'async (ASGI)': self.run_async(concurrency),
+        }
+
+        self.stdout.write(f"\n{'path':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for label, summary in results.items():
+            self.stdout.write(
+                f"{label:<14} {summary['rps']:>9.1f} {summary['p50_ms']:>9.2f} "
+                f"{summary['p99_ms']:>9.2f} {summary['errors']:>7}"
+            )
+
+    @staticmethod
+    def request_kwargs(body):
+        return {'data': body, 'content_type': 'application/json'} if body else {}
+
+    def run_sync(self, concurrency):
+        local = threading.local()
+
+        def call(entry):
+            method, name, args, body = entry
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            response = getattr(local.client, method)(reverse(name, args=args), **self.request_kwargs(body))
+            return time.perf_counter() - started, response.status_code >= 500
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(call, self.plan))
+        return latency_summary(time.perf_counter() - started, outcomes)
+
+    def run_async(self, concurrency):
+        async def drive():
+            client = AsyncClient(raise_request_exception=False)
+            slots = asyncio.Semaphore(concurrency)
+
+            async def call(entry):
+                method, name, args, body = entry
+                async with slots:
+                    started = time.perf_counter()
+                    response = await getattr(client, method)(
+                        reverse(f'async-{name.replace("_", "-")}', args=args), **self.request_kwargs(body),
+                    )
+                    return time.perf_counter() - started, response.status_code >= 500
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(call(entry) for entry in self.plan))
+            return time.perf_counter() - started, outcomes
+
+        return latency_summary(*asyncio.run(drive()))
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from datetime import date
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from openpyxl import Workbook
+
+from loanapp.sources import CUSTOMER_COLUMNS, LOAN_COLUMNS, pq, read_chunks, typed, write_chunks
+
+
+def synthetic_sources(customers: int, loans: int, seed: int = 0):
+    """Customer and loan DataFrames shaped like the source workbooks."""
+    rng = np.random.default_rng(seed)
+    customer_df = pd.DataFrame({
+        'Customer ID': np.arange(1, customers + 1),
+        'First Name': rng.choice(['Aaron', 'Abbey', 'Carmen', 'Dev'], customers),
+        'Last Name': rng.choice(['Garcia', 'Lee', 'Patel', 'Smith'], customers),
+        'Age': rng.integers(21, 70, customers),
+        'Phone Number': rng.integers(9_000_000_000, 9_999_999_999, customers),
+        'Monthly Salary': rng.integers(20, 200, customers) * 1000,
+        'Approved Limit': rng.integers(1, 80, customers) * 100000,
+    })
+    start = np.datetime64(date(2010, 1, 1)) + rng.integers(0, 5000, loans).astype('timedelta64[D]')
+    tenure = rng.choice([6, 12, 24, 36, 60, 120], loans)
+    loan_df = pd.DataFrame({
+        'Customer ID': rng.integers(1, customers + 1, loans),
+        'Loan ID': np.arange(1, loans + 1),
+        'Loan Amount': rng.integers(1, 100, loans) * 10000,
+        'Tenure': tenure,
+        'Interest Rate': rng.choice([8.2, 10.5, 12.0, 13.46, 16.5], loans),
+        'Monthly payment': rng.integers(1000, 50000, loans),
+        'EMIs paid on Time': rng.integers(0, 120, loans),
+        'Date of Approval': start,
+        'End Date': start + (tenure * 30).astype('timedelta64[D]'),
+    })
+    return customer_df, loan_df
+
+
+def write_xlsx(df, path):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(df.columns))
+    for row in df.itertuples(index=False):
+        sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+    workbook.save(path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time reading the loan file as xlsx (whole-file pd.read_excel and streamed), "
+        "chunked CSV and chunked Parquet, with peak Python memory; --ingest also "
+        "times full ingest_data runs per format and an unchanged --incremental re-run "
+        "(writes to the database: use a scratch copy)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=100000, help='Loan rows to generate (default: 100000).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per chunk (default: 5000).')
+        parser.add_argument('--ingest', action='store_true', help='Also time ingest_data for each format.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        customers = max(1, options['loans'] // 10)
+        customer_df, loan_df = synthetic_sources(customers, options['loans'])
+        formats = ['xlsx', 'csv'] + (['parquet'] if pq is not None else [])
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            started = time.perf_counter()
+            for file_format in formats:
+                for name, df, columns in (('customers', customer_df, CUSTOMER_COLUMNS), ('loans', loan_df, LOAN_COLUMNS)):
+                    path = os.path.join(directory, f'{name}.{file_format}')
+                    if file_format == 'xlsx':
+                        write_xlsx(df, path)
+                    else:
+                        write_chunks([typed(df, columns)], path, file_format, columns)
+                    paths[file_format, name] = path
+            self.stdout.write(
+                f"Generated {options['loans']} loans / {customers} customers in "
+                f"{', '.join(formats)} in {time.perf_counter() - started:.1f}s"
+            )
+            if pq is None:
+                self.stdout.write(self.style.WARNING("pyarrow is not installed; skipping Parquet."))
+
+            loans = {file_format: paths[file_format, 'loans'] for file_format in formats}
+            cases = {'xlsx pd.read_excel (whole file)': lambda: typed(pd.read_excel(loans['xlsx']), LOAN_COLUMNS)}
+            for file_format in formats:
+                # Each chunk is dropped before the next is read, as ingest_data does.
+                cases[f'{file_format} chunked'] = lambda path=loans[file_format]: deque(
+                    read_chunks(path, LOAN_COLUMNS, chunk_size), maxlen=0,
+                )
+
+            self.stdout.write(f"\n{'read + type loans':<34} {'seconds':>8} {'rows/sec':>11} {'peak MiB':>9}")
+            for label, case in cases.items():
+                started = time.perf_counter()
+                case()
+                elapsed = time.perf_counter() - started
+                # A second, traced pass: tracemalloc slows the first one down.
+                tracemalloc.start()
+                case()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{label:<34} {elapsed:>8.2f} {options['loans'] / elapsed:>11,.0f} {peak / 2 ** 20:>9.1f}"
+                )
+
+            if options['ingest']:
+                self.stdout.write("\ningest_data")
+                for file_format in formats:
+                    started = time.perf_counter()
+                    call_command(
+                        'ingest_data', customers=paths[file_format, 'customers'], loans=loans[file_format],
+                        chunk_size=chunk_size, stdout=StringIO(),
+                    )
+                    self.stdout.write(f"{file_format:<10} {time.perf_counter() - started:>8.2f}s")
+
+                # Every full run above recorded fingerprints, so nothing has changed.
+                file_format = formats[-1]
+                started = time.perf_counter()
+                call_command(
+                    'ingest_data', customers=paths[file_format, 'customers'], loans=loans[file_format],
+                    chunk_size=chunk_size, incremental=True, stdout=StringIO(),
+                )
+                self.stdout.write(f"{file_format + ' unchanged, --incremental':<10} {time.perf_counter() - started:>8.2f}s")
@@ -0,0 +1,46 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from loanapp.metrics import reset_metrics
+from loanapp.models import Loan
+from loanapp.sharding import scatter_first
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request overhead of MetricsMiddleware on view-loan, enabled vs disabled"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per timed run (default: 2000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per setting, interleaved (default: 5).')
+
+    def handle(self, *args, **options):
+        loan_id = scatter_first(lambda: Loan.objects.values_list('loan_id', flat=True).first())
+        if loan_id is None:
+            raise CommandError("No loans; run ingest_data or seed_data first.")
+        url = reverse('view_loan', args=[loan_id])
+
+        # Each client builds its middleware chain on first use, under its setting.
+        clients = {}
+        for enabled in (False, True):
+            with override_settings(METRICS_ENABLED=enabled, ALLOWED_HOSTS=['*']):
+                clients[enabled] = Client()
+                clients[enabled].get(url)
+
+        timings = {False: [], True: []}
+        for _ in range(options['repeat']):
+            for enabled, client in clients.items():
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    client.get(url)
+                timings[enabled].append((time.perf_counter() - started) / options['requests'])
+        reset_metrics()
+
+        off, on = (statistics.median(timings[enabled]) * 1e6 for enabled in (False, True))
+        self.stdout.write(f"{options['requests']} requests x {options['repeat']} runs of {url}")
+        self.stdout.write(f"metrics off: {off:.1f} us/request")
+        self.stdout.write(f"metrics on:  {on:.1f} us/request")
+        self.stdout.write(f"overhead:    {on - off:.1f} us/request ({(on - off) / off:.1%})")
@@ -0,0 +1,96 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from loanapp.emi import emi, emi_decimal, emi_money, emi_rounded
+from loanapp.loadgen import comparison_report, record_and_compare, results_path
+from loanapp.models import Customer, Loan
+from loanapp.serializers import (
+    LOAN_DETAIL_COLUMNS, CustomerRegisterSerializer, LoanDetailsSerializer, loan_detail,
+)
+from loanapp.sharding import on_first_shard
+from loanapp.utils import calculate_credit_score, calculate_credit_scores
+
+REGISTER_PAYLOAD = {
+    'first_name': 'Bench', 'last_name': 'Mark', 'age': 35, 'monthly_income': 75000, 'phone_number': '9000000000',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark credit scoring, the EMI implementations and the serializers; "
+        "results are stored and compared with the previous run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help='Customers / loans per case (default: 1000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5).')
+        parser.add_argument('--results', default=None, help='Results file (default: benchmark_results.jsonl).')
+        parser.add_argument('--no-store', action='store_true', help="Don't store or compare this run.")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.10,
+            help='Fractional slowdown reported as a regression (default: 0.10).',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true', help='Exit with an error if anything regressed.',
+        )
+
+    @on_first_shard
+    def handle(self, *args, **options):
+        size = options['size']
+        customer_pks = list(Customer.objects.filter(loan_count__gt=0).order_by('pk').values_list('pk', flat=True)[:size])
+        loans = list(Loan.objects.select_related('customer').order_by('pk')[:size])
+        if not customer_pks or not loans:
+            raise CommandError("No loans; run ingest_data or seed_data first.")
+        loan_ids = [loan.loan_id for loan in loans]
+        rows = list(Loan.objects.filter(loan_id__in=loan_ids).values_list(*LOAN_DETAIL_COLUMNS))
+
+        rng = np.random.default_rng(0)
+        principal = rng.integers(10, 1000, size) * 1000.0
+        rate = rng.choice([8.0, 10.5, 12.0, 14.0, 16.5], size)
+        tenure = rng.choice([6, 12, 24, 36, 60], size)
+        terms = list(zip(principal.tolist(), rate.tolist(), tenure.tolist()))
+        renderer = JSONRenderer()
+
+        # label -> (case, items it handles per call)
+        cases = {
+            'calculate_credit_score': (lambda: [calculate_credit_score(pk) for pk in customer_pks], len(customer_pks)),
+            'calculate_credit_scores': (lambda: calculate_credit_scores(customer_pks), len(customer_pks)),
+            'emi_decimal': (lambda: [emi_decimal(*loan) for loan in terms], size),
+            'emi_rounded scalar': (lambda: [emi_rounded(*loan) for loan in terms], size),
+            'emi_money vector': (lambda: emi_money(principal, rate, tenure), size),
+            'emi vector': (lambda: emi(principal, rate, tenure), size),
+            'LoanDetailsSerializer': (lambda: [renderer.render(LoanDetailsSerializer(loan).data) for loan in loans],
+                                      len(loans)),
+            'loan_detail projection': (lambda: [renderer.render(loan_detail(row)) for row in rows], len(rows)),
+            'CustomerRegisterSerializer': (
+                lambda: [CustomerRegisterSerializer(data=REGISTER_PAYLOAD).is_valid() for _ in range(size)], size,
+            ),
+        }
+
+        self.stdout.write(f"{'case':<28} {'us / item':>10} {'items / sec':>12}")
+        metrics = {}
+        for label, (case, items) in cases.items():
+            per_item_us = self.median_seconds(case, options['repeat']) / items * 1e6
+            metrics[f'{label}_us'] = per_item_us
+            self.stdout.write(f"{label:<28} {per_item_us:>10.2f} {1e6 / per_item_us:>12,.0f}")
+
+        if options['no_store']:
+            return
+        path = options['results'] or results_path()
+        previous, worse = record_and_compare(path, 'benchmark_micro', {'size': size}, metrics, options['tolerance'])
+        self.stdout.write('\n' + '\n'.join(comparison_report(path, previous, worse, options['tolerance'])))
+        if worse and options['fail_on_regression']:
+            raise CommandError(f"{len(worse)} metric(s) regressed.")
+
+    @staticmethod
+    def median_seconds(case, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
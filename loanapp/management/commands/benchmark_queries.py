@@ -0,0 +1,108 @@
+import statistics
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from loanapp.loan_stats import LOAN_COLUMNS
+from loanapp.models import Customer, Loan
+from loanapp.sharding import on_first_shard
+from loanapp.utils import credit_score_aggregates
+
+
+def hot_queries(customer):
+    """The query shapes the API and admin run most, keyed by a short label."""
+    this_year = date.today().year
+    return {
+        'view-loans (customer_id, approved)': lambda: Loan.objects.filter(
+            customer__customer_id=customer.customer_id, loan_approved=True,
+        ),
+        'credit score aggregate': lambda: credit_score_aggregates([customer.pk]),
+        'loan stats rebuild': lambda: Loan.objects.filter(customer=customer).values_list(*LOAN_COLUMNS),
+        'loans this year': lambda: Loan.objects.filter(customer=customer, start_date__year=this_year).values('pk'),
+        'admin start_date filter': lambda: Loan.objects.filter(
+            start_date__gte=date(this_year, 1, 1),
+        ).order_by('-pk')[:100],
+        'admin end_date filter': lambda: Loan.objects.filter(
+            end_date__lt=date(this_year, 1, 1),
+        ).order_by('-pk')[:100],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Show EXPLAIN plans and latency of the hot Loan queries with and without "
+        "the Loan indexes. Drops and recreates the indexes: use a scratch database "
+        "seeded with seed_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default: 20).')
+        parser.add_argument(
+            '--customer', help='customer_id to query for (default: the customer with the most loans).',
+        )
+        parser.add_argument('--no-drop', action='store_true', help='Only measure the current indexes.')
+
+    @on_first_shard
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(Loan)]
+        customer = self.pick_customer(options['customer'])
+        self.stdout.write(
+            f"{connection.vendor}: {Loan.objects.count()} loans; "
+            f"customer {customer.customer_id} has {customer.loan_count} loans\n"
+        )
+
+        queries = hot_queries(customer)
+        after = self.measure('with indexes', queries, options['repeat'])
+        if options['no_drop']:
+            return
+
+        indexes = Loan._meta.indexes
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Loan, index)
+            # Stand-in for the FK index Django would otherwise create.
+            editor.execute(
+                f"CREATE INDEX loan_customer_fk_bench ON {editor.quote_name(Loan._meta.db_table)} "
+                f"({editor.quote_name('customer_id')})"
+            )
+        try:
+            before = self.measure('without indexes', queries, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                editor.execute("DROP INDEX loan_customer_fk_bench")
+                for index in indexes:
+                    editor.add_index(Loan, index)
+
+        self.stdout.write("\nMedian latency (ms)")
+        for label in queries:
+            speedup = before[label] / after[label] if after[label] else float('inf')
+            self.stdout.write(f"  {label:<38} {before[label]:>9.3f} -> {after[label]:>9.3f}  ({speedup:.1f}x)")
+
+    def pick_customer(self, customer_id):
+        if customer_id is not None:
+            try:
+                return Customer.objects.get(customer_id=customer_id)
+            except Customer.DoesNotExist:
+                raise CommandError(f"Customer {customer_id} not found.")
+        customer = Customer.objects.order_by('-loan_count').first()
+        if customer is None:
+            raise CommandError("No customers; run seed_data first.")
+        return customer
+
+    def measure(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {title}"))
+        medians = {}
+        for label, build in queries.items():
+            plan = build().explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            medians[label] = statistics.median(timings)
+            self.stdout.write(f"-- {label}: {medians[label]:.3f} ms")
+            for line in plan.splitlines():
+                self.stdout.write(f"   {line}")
+        return medians
@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries, router
+from rest_framework.renderers import JSONRenderer
+
+from loanapp.models import Loan
+from loanapp.renderers import ORJSONRenderer, orjson
+from loanapp.serializers import (
+    LOAN_DETAIL_COLUMNS, LOAN_SUMMARY_COLUMNS, LoanDetailsSerializer, LoanSummarySerializer,
+    loan_detail, loan_summary,
+)
+from loanapp.sharding import on_first_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Time fetching, serializing and rendering the view-loan and view-loans "
+        "payloads, model serializers vs values_list projections, per 1,000 loans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=1000, help='Loans per measurement (default: 1000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5).')
+
+    @on_first_shard
+    def handle(self, *args, **options):
+        loan_ids = list(Loan.objects.order_by('pk').values_list('loan_id', flat=True)[:options['loans']])
+        if not loan_ids:
+            raise CommandError("No loans; run ingest_data or seed_data first.")
+
+        def loans():
+            # A fresh queryset per run, so nothing is served from a result cache.
+            return Loan.objects.filter(loan_id__in=loan_ids)
+
+        json_renderer = JSONRenderer()
+        fast_renderer = ORJSONRenderer() if orjson is not None else json_renderer
+
+        cases = {
+            # view-loans: one list of summaries
+            'view-loans serializer': lambda: json_renderer.render(
+                LoanSummarySerializer(loans(), many=True).data if loans().exists() else None
+            ),
+            'view-loans projection': lambda: fast_renderer.render(
+                [loan_summary(row) for row in loans().values_list(*LOAN_SUMMARY_COLUMNS)]
+            ),
+            # view-loan: one request per loan
+            'view-loan serializer': lambda: [
+                json_renderer.render(LoanDetailsSerializer(Loan.objects.get(loan_id=loan_id)).data)
+                for loan_id in loan_ids
+            ],
+            'view-loan projection': lambda: [
+                fast_renderer.render(loan_detail(
+                    Loan.objects.filter(loan_id=loan_id).values_list(*LOAN_DETAIL_COLUMNS).first()
+                ))
+                for loan_id in loan_ids
+            ],
+        }
+
+        scale = 1000 / len(loan_ids)
+        renderer_name = type(fast_renderer).__name__
+        self.stdout.write(f"{len(loan_ids)} loans, projections rendered with {renderer_name}")
+        self.stdout.write(f"{'case':<24} {'ms / 1,000 loans':>17} {'queries / 1,000':>16}")
+        results = {}
+        for label, case in cases.items():
+            results[label] = self.median_ms(case, options['repeat']) * scale
+            self.stdout.write(f"{label:<24} {results[label]:>17.2f} {self.count_queries(case) * scale:>16.0f}")
+
+        for endpoint in ('view-loans', 'view-loan'):
+            before, after = results[f'{endpoint} serializer'], results[f'{endpoint} projection']
+            self.stdout.write(f"{endpoint}: {before / after:.1f}x faster")
+
+        # Serialization and rendering alone, rows already fetched.
+        instances = list(loans())
+        rows = list(loans().values_list(*LOAN_SUMMARY_COLUMNS))
+        serialize_cases = {
+            'serializer + JSONRenderer': lambda: json_renderer.render(LoanSummarySerializer(instances, many=True).data),
+            f'projection + {renderer_name}': lambda: fast_renderer.render([loan_summary(row) for row in rows]),
+        }
+        self.stdout.write("\nview-loans serialization only")
+        for label, case in serialize_cases.items():
+            self.stdout.write(f"{label:<34} {self.median_ms(case, options['repeat']) * scale:>9.2f} ms / 1,000 loans")
+
+    @staticmethod
+    def median_ms(case, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
+
+    def count_queries(self, case):
+        connection = connections[router.db_for_read(Loan)]
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        reset_queries()
+        try:
+            case()
+            return len(connection.queries)
+        finally:
+            connection.force_debug_cursor = force_debug_cursor
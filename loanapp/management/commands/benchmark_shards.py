@@ -0,0 +1,139 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from loanapp.loadgen import latency_summary
+from loanapp.loan_stats import rebuild_loan_stats
+from loanapp.models import Customer, Loan
+from loanapp.registration import register_customers
+from loanapp.sharding import use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Create-loan throughput as shards are added: seeds one scratch SQLite shard, "
+        "then for 1..N shards runs rebalance_shards and drives create-loan from "
+        "concurrent threads. Leaves the configured databases untouched"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=4, help='Largest shard count (default: 4).')
+        parser.add_argument('--customers', type=int, default=2000, help='Customers to seed (default: 2000).')
+        parser.add_argument('--requests', type=int, default=2000, help='create-loan requests per step (default: 2000).')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight (default: 16).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for picking customers (default: 0).')
+
+    def handle(self, *args, **options):
+        # Failures and slow requests are counted, not logged one by one.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        logging.getLogger('loanapp.metrics').setLevel(logging.ERROR)
+        rng = np.random.default_rng(options['seed'])
+        with tempfile.TemporaryDirectory() as directory:
+            aliases = self.scratch_databases(directory, options['shards'])
+            try:
+                with override_settings(SHARDS=aliases[:1]):
+                    customer_ids = self.seed(aliases[0], options['customers'])
+
+                self.stdout.write(
+                    f"{len(customer_ids)} customers; {options['requests']} create-loan requests per step "
+                    f"at concurrency {options['concurrency']}"
+                )
+                self.stdout.write(
+                    f"\n{'shards':>6} {'rebalance s':>12} {'per shard':>12} {'req/s':>9} "
+                    f"{'p50 ms':>9} {'p99 ms':>9} {'approved':>9} {'errors':>7}"
+                )
+                for count in range(1, len(aliases) + 1):
+                    with override_settings(SHARDS=aliases[:count]):
+                        started = time.perf_counter()
+                        if count > 1:
+                            call_command('rebalance_shards', stdout=StringIO())
+                        rebalance = time.perf_counter() - started
+                        sizes = [self.customer_count(alias) for alias in aliases[:count]]
+                        plan = rng.choice(customer_ids, options['requests'])
+                        summary, approved = self.drive(plan, options['concurrency'])
+                    self.stdout.write(
+                        f"{count:>6} {rebalance:>12.2f} {f'{min(sizes)}-{max(sizes)}':>12} {summary['rps']:>9.1f} "
+                        f"{summary['p50_ms']:>9.2f} {summary['p99_ms']:>9.2f} {approved:>9} {summary['errors']:>7}"
+                    )
+            finally:
+                for alias in aliases:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+    def scratch_databases(self, directory, count):
+        """Register and migrate ``count`` SQLite files as bench_shard_N aliases, configured like "default" otherwise."""
+        aliases = [f'bench_shard_{number}' for number in range(count)]
+        for alias in aliases:
+            connections.settings[alias] = {
+                **connections.settings[DEFAULT_DB_ALIAS],
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(directory, f'{alias}.sqlite3'),
+                'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+                # Concurrent writers to one file wait for its lock instead of failing.
+                'OPTIONS': {'timeout': 30},
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        return aliases
+
+    def seed(self, shard, customers):
+        """
+        Register ``customers`` and give each two paid-off loans, enough
+        history for create-loan to approve further loans at 16%.
+        """
+        rows = [
+            {'first_name': 'Bench', 'last_name': f'Customer{number}', 'age': 35,
+             'monthly_income': 100000, 'phone_number': '9000000000'}
+            for number in range(customers)
+        ]
+        customer_ids = [result['customer_id'] for result in register_customers(rows)]
+        with use_shard(shard), transaction.atomic(using=shard):
+            pks = list(Customer.objects.values_list('pk', flat=True))
+            Loan.objects.bulk_create([
+                Loan(
+                    customer_id=pk, loan_id=f'seed-{pk}-{number}', loan_amount=300000, tenure=12, interest_rate=12,
+                    monthly_repayment=26654, emis_paid_on_time=12,
+                    start_date=date(2015, 1, 1), end_date=date(2016, 1, 1), loan_approved=True,
+                )
+                for pk in pks for number in range(2)
+            ], batch_size=1000)
+            rebuild_loan_stats(pks)
+        return customer_ids
+
+    @staticmethod
+    def customer_count(alias):
+        with use_shard(alias):
+            return Customer.objects.count()
+
+    def drive(self, customer_ids, concurrency):
+        """POST create-loan once per customer id from ``concurrency`` threads; (latency summary, approvals)."""
+        local = threading.local()
+        url = reverse('create_loan')
+
+        def call(customer_id):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            response = local.client.post(url, {
+                'customer_id': customer_id, 'loan_amount': 10000, 'interest_rate': 16, 'tenure': 12,
+            }, content_type='application/json')
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(call, customer_ids))
+        elapsed = time.perf_counter() - started
+        summary = latency_summary(elapsed, [(seconds, status_code >= 500) for seconds, status_code in results])
+        return summary, sum(status_code == 201 for _, status_code in results)
@@ -0,0 +1,40 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loanapp.management.commands.ingest_data import CUSTOMER_FILE, LOAN_FILE
+from loanapp.sources import CUSTOMER_COLUMNS, LOAN_COLUMNS, read_chunks, write_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the customer and loan workbooks to Parquet (or CSV) once, typed "
+        "and pruned to the columns ingest_data reads, so later ingests skip openpyxl"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', default=CUSTOMER_FILE, help='Customer file (default: %(default)s).')
+        parser.add_argument('--loans', default=LOAN_FILE, help='Loan file (default: %(default)s).')
+        parser.add_argument('--to', choices=('parquet', 'csv'), default='parquet', help='Output format (default: parquet).')
+        parser.add_argument(
+            '--output-dir', help='Directory for the converted files (default: next to each source file).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000, help='Rows converted at a time (default: 50000).',
+        )
+
+    def handle(self, *args, **options):
+        for path, columns in ((options['customers'], CUSTOMER_COLUMNS), (options['loans'], LOAN_COLUMNS)):
+            source = Path(path)
+            target = Path(options['output_dir'] or source.parent) / f"{source.stem}.{options['to']}"
+            if target.resolve() == source.resolve():
+                raise CommandError(f"{source} is already {options['to']}.")
+            target.parent.mkdir(parents=True, exist_ok=True)
+
+            started = time.perf_counter()
+            try:
+                rows = write_chunks(read_chunks(source, columns, options['chunk_size']), target, options['to'], columns)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Can't convert {source}: {error}")
+            self.stdout.write(f"Wrote {rows} rows from {source} to {target} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from loanapp.loadgen import MIX_WEIGHTS, request_mix, write_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a reproducible JSONL request mix over register, check-eligibility, "
+        "create-loan, view-loan and view-loans for replay_requests"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='JSONL file to write.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests in the mix (default: 2000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+
+    def handle(self, *args, **options):
+        entries = request_mix(options['requests'], options['seed'])
+        write_requests(options['output'], entries)
+        shares = ', '.join(f"{name} {weight:.0%}" for name, weight in MIX_WEIGHTS.items())
+        self.stdout.write(f"Wrote {len(entries)} requests to {options['output']} ({shares})")
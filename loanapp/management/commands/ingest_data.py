@@ -1,66 +1,313 @@
+import time
+
+import numpy as np
 import pandas as pd
-from django.core.management.base import BaseCommand
-from django.utils.dateparse import parse_date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from loanapp.emi import emi_money
+from loanapp.fingerprints import (
+    changed_rows, forget_fingerprints, key_hashes, last_occurrences, missing_keys, record_fingerprints, row_digests,
+)
+from loanapp.loan_stats import rebuild_loan_stats
 from loanapp.models import Customer, Loan
+from loanapp.profiles import invalidate_all_credit_profiles
+from loanapp.sharding import group_by_shard, shard_aliases, use_shard
+from loanapp.sources import CUSTOMER_COLUMNS, FORMATS, LOAN_COLUMNS, as_dates, read_chunks
+from loanapp.utils import advance_ids
+
+CUSTOMER_FILE = 'data/customer_data.xlsx'
+LOAN_FILE = 'data/loan_data.xlsx'
+
+CUSTOMER_UPDATE_FIELDS = [
+    'first_name', 'last_name', 'age', 'phone_number',
+    'monthly_salary', 'approved_limit', 'current_debt',
+]
+LOAN_UPDATE_FIELDS = [
+    'customer', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+    'emis_paid_on_time', 'start_date', 'end_date',
+]
+
 
 class Command(BaseCommand):
-    help = 'Ingest customer and loan data from Excel files'
+    help = 'Ingest customer and loan data from xlsx, CSV or Parquet files'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers', default=CUSTOMER_FILE, help='Customer file (default: %(default)s).',
+        )
+        parser.add_argument('--loans', default=LOAN_FILE, help='Loan file (default: %(default)s).')
+        parser.add_argument(
+            '--format', choices=('auto',) + FORMATS, default='auto',
+            help='Format of both files (default: from each file suffix).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Rows read and written per transaction (default: 5000).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per bulk INSERT/UPDATE statement (default: 1000).',
+        )
+        parser.add_argument(
+            '--recompute-emi', action='store_true',
+            help="Store EMIs computed from amount/rate/tenure instead of the sheet's 'Monthly payment'.",
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only write rows that are new or changed since the last ingest, and report deleted ones.',
+        )
+        parser.add_argument(
+            '--delete-missing', action='store_true',
+            help='With --incremental, also delete customers and loans that are no longer in the files.',
+        )
 
-        def parse_excel_date(value):
-            if pd.isna(value) or value == '':
-                return None
-            return parse_date(str(value))
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.batch_size = options['batch_size']
+        self.recompute_emi = options['recompute_emi']
+        self.format = options['format']
+        self.incremental = options['incremental']
+        if options['delete_missing'] and not self.incremental:
+            raise CommandError("--delete-missing needs --incremental.")
+        self.delete_missing = options['delete_missing']
 
         # 1) Ingest customers
-        customer_df = pd.read_excel('data/customer_data.xlsx')
-        for _, row in customer_df.iterrows():
-            Customer.objects.update_or_create(
+        self.run_stage('customers', options['customers'], CUSTOMER_COLUMNS, 'Customer ID', self.ingest_customer_chunk)
+
+        # 2) Ingest loans; --recompute-emi changes what every loan row turns into.
+        salt = 'recompute-emi' if self.recompute_emi else ''
+        self.run_stage('loans', options['loans'], LOAN_COLUMNS, 'Loan ID', self.ingest_loan_chunk, salt)
+
+        # Bulk upserts bypass model signals, so cached profiles are stale.
+        invalidate_all_credit_profiles()
+
+        self.stdout.write(self.style.SUCCESS("Data ingestion completed successfully."))
+
+    def run_stage(self, label, path, columns, key_column, ingest_chunk, salt=''):
+        """
+        Ingest one file chunk by chunk, recording each written row's fingerprint.
+
+        With --incremental, a first pass over just the key column finds each
+        key's last row in the file (the one a full ingest would leave in place)
+        and the keys that disappeared; the second pass then writes only last
+        rows whose fingerprint changed.
+        """
+        started = time.perf_counter()
+        read = written = 0
+        if self.incremental:
+            hashes = [key_hashes(chunk[key_column]) for chunk in self.read(label, path, {key_column: str})]
+            hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+            latest = last_occurrences(hashes)
+
+        for chunk in self.read(label, path, columns):
+            digests = row_digests(chunk, salt)
+            if self.incremental:
+                keep = latest[read:read + len(chunk)] & changed_rows(label, chunk[key_column].tolist(), digests)
+                read += len(chunk)
+                chunk, digests = chunk[keep], digests[keep]
+                if chunk.empty:
+                    continue
+            else:
+                read += len(chunk)
+            # Sharded, each shard's rows commit on their own inside this; a
+            # failure then rolls back only the fingerprints, so the rows that
+            # did commit are written again next time.
+            with transaction.atomic():
+                keys = set(ingest_chunk(chunk))
+                # Only rows that made it into the database, so skipped ones are retried next time.
+                stored = chunk[key_column].isin(keys).to_numpy()
+                fingerprints = pd.Series(digests[stored], index=chunk[key_column][stored])
+                fingerprints = fingerprints[~fingerprints.index.duplicated(keep='last')]
+                record_fingerprints(label, fingerprints.index, fingerprints.to_numpy(), self.batch_size)
+            written += len(keys)
+
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed if elapsed else 0
+        if not self.incremental:
+            self.stdout.write(f"Ingested {written} {label} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+            return
+        deleted = missing_keys(label, hashes)
+        self.stdout.write(
+            f"Ingested {label} incrementally in {elapsed:.2f}s ({rate:,.0f} rows/sec): "
+            f"{read} read, {written} new or changed, {len(deleted)} no longer in the file"
+        )
+        if deleted and self.delete_missing:
+            with transaction.atomic():
+                for start in range(0, len(deleted), self.chunk_size):
+                    self.delete_rows(label, deleted[start:start + self.chunk_size])
+            self.stdout.write(f"Deleted {len(deleted)} {label}")
+
+    def delete_rows(self, label, keys):
+        # A loan_id doesn't say which shard holds it, so each shard is asked.
+        for shard in shard_aliases():
+            with use_shard(shard), transaction.atomic(using=shard):
+                if label == 'customers':
+                    customers = Customer.objects.filter(customer_id__in=keys)
+                    # Their loans go with them; forget those too so they come back if the customer does.
+                    forget_fingerprints('loans', Loan.objects.filter(customer__in=customers).values_list('loan_id', flat=True))
+                    customers.delete()
+                else:
+                    self.delete_loans(keys)
+        forget_fingerprints(label, keys)
+
+    @staticmethod
+    def delete_loans(loan_ids):
+        """Delete loans from the current shard and refresh their customers' counters."""
+        loans = Loan.objects.filter(loan_id__in=loan_ids)
+        owners = set(loans.values_list('customer_id', flat=True))
+        if owners:
+            loans.delete()
+            rebuild_loan_stats(owners)
+
+    def read(self, label, path, columns):
+        # Only read errors are caught here; ones raised while writing a chunk
+        # propagate from the loop body untouched.
+        try:
+            yield from read_chunks(path, columns, self.chunk_size, self.format)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Can't read {label} from {path}: {error}")
+
+    @staticmethod
+    def split_by_shard(df):
+        """{shard: rows of ``df`` whose customer lives there}, in file order within each."""
+        customer_ids = df['Customer ID'].tolist()
+        groups = group_by_shard(range(len(df)), key=customer_ids.__getitem__)
+        if len(groups) == 1:
+            return {shard: df for shard in groups}
+        return {shard: df.iloc[positions] for shard, positions in groups.items()}
+
+    def ingest_customer_chunk(self, df):
+        # Later rows win, matching the previous update_or_create behaviour.
+        df = df.drop_duplicates('Customer ID', keep='last')
+
+        keys = []
+        for shard, rows in self.split_by_shard(df).items():
+            with use_shard(shard), transaction.atomic(using=shard):
+                keys += self.ingest_customers(rows)
+        # Source rows bring their own ids; new customers are numbered past them.
+        advance_ids('customer', keys)
+        return keys
+
+    def ingest_customers(self, df):
+        customers = [
+            Customer(
                 customer_id=row['Customer ID'],
-                defaults={
-                    'first_name':     row['First Name'],
-                    'last_name':      row['Last Name'],
-                    'phone_number':   str(row['Phone Number']),
-                    'monthly_salary': row['Monthly Salary'],
-                    'approved_limit': row['Approved Limit'],
-                    'current_debt':   0.0,  # assume 0 since Excel lacks it
-                }
+                first_name=row['First Name'],
+                last_name=row['Last Name'],
+                age=row['Age'],
+                phone_number=row['Phone Number'],
+                monthly_salary=row['Monthly Salary'],
+                approved_limit=row['Approved Limit'],
+                current_debt=0.0,  # assume 0 since Excel lacks it
+            )
+            for row in df.to_dict('records')
+        ]
+        self.upsert(Customer, customers, 'customer_id', CUSTOMER_UPDATE_FIELDS)
+        return [customer.customer_id for customer in customers]
+
+    def ingest_loan_chunk(self, df):
+        df = df.drop_duplicates('Loan ID', keep='last')
+        df = df.assign(**{
+            'Date of Approval': as_dates(df['Date of Approval']),
+            'End Date': as_dates(df['End Date']),
+        })
+
+        # An EMI can't be priced, or a schedule built, without a positive tenure.
+        bad_tenure = ~(df['Tenure'] > 0)
+        for loan_id in df.loc[bad_tenure, 'Loan ID']:
+            self.stdout.write(self.style.WARNING(
+                f"Skipping Loan {loan_id}: tenure must be a positive number of months."
+            ))
+        df = df[~bad_tenure]
+
+        # Blank payments (or all of them, with --recompute-emi) come from the
+        # shared EMI engine, priced together; filled ones are kept as they are.
+        unpriced = df['Monthly payment'].isna() | self.recompute_emi
+        unpriceable = unpriced & (df['Loan Amount'].isna() | df['Interest Rate'].isna())
+        for loan_id in df.loc[unpriceable, 'Loan ID']:
+            self.stdout.write(self.style.WARNING(
+                f"Skipping Loan {loan_id}: no monthly payment and no amount or rate to price one from."
+            ))
+        df = df[~unpriceable]
+        unpriced = unpriced[~unpriceable]
+        if unpriced.any():
+            priced = df[unpriced]
+            df = df.assign(**{'Monthly payment': df['Monthly payment'].astype(object)})
+            df.loc[unpriced, 'Monthly payment'] = pd.Series(
+                emi_money(priced['Loan Amount'], priced['Interest Rate'], priced['Tenure'].astype('int64')),
+                index=priced.index, dtype=object,
             )
 
-        # 2) Ingest loans
-        loan_df = pd.read_excel('data/loan_data.xlsx')
-        for _, row in loan_df.iterrows():
-            try:
-                customer = Customer.objects.get(customer_id=row['Customer ID'])
-            except Customer.DoesNotExist:
+        stored = {}
+        for shard, rows in self.split_by_shard(df).items():
+            with use_shard(shard), transaction.atomic(using=shard):
+                stored[shard] = self.ingest_loans(rows)
+        # A loan moved to a customer on another shard leaves its old row behind
+        # there: one probe per shard for the chunk's loans stored elsewhere.
+        for shard in shard_aliases():
+            elsewhere = [loan_id for other, loan_ids in stored.items() if other != shard for loan_id in loan_ids]
+            if elsewhere:
+                with use_shard(shard), transaction.atomic(using=shard):
+                    self.delete_loans(elsewhere)
+        keys = [loan_id for loan_ids in stored.values() for loan_id in loan_ids]
+        advance_ids('loan', keys)
+        return keys
+
+    def ingest_loans(self, df):
+        # One lookup per chunk and shard resolves every referenced customer.
+        customers = dict(
+            Customer.objects.filter(customer_id__in=df['Customer ID'].unique().tolist())
+            .values_list('customer_id', 'pk')
+        )
+
+        loans = []
+        for row in df.to_dict('records'):
+            customer_pk = customers.get(row['Customer ID'])
+            if customer_pk is None:
                 self.stdout.write(self.style.WARNING(
                     f"Skipping Loan {row['Loan ID']}: Customer ID {row['Customer ID']} not found."
                 ))
                 continue
 
-            start_date = parse_excel_date(row['Date of Approval'])
-            end_date = parse_excel_date(row['End Date'])
-
+            start_date = row['Date of Approval']
+            end_date = row['End Date']
             if start_date is None or end_date is None:
                 self.stdout.write(self.style.WARNING(
                     f"Skipping Loan {row['Loan ID']} due to missing start or end date."
                 ))
                 continue
 
-            Loan.objects.update_or_create(
+            loan = Loan(
                 loan_id=row['Loan ID'],
-                defaults={
-                    'customer':          customer,
-                    'loan_amount':       row['Loan Amount'],
-                    'tenure':            row['Tenure'],
-                    'interest_rate':     row['Interest Rate'],
-                    'monthly_repayment': row['Monthly payment'],
-                    'emis_paid_on_time': row['EMIs paid on Time'],
-                    'start_date':        start_date,
-                    'end_date':          end_date,
-                }
+                customer_id=customer_pk,
+                loan_amount=row['Loan Amount'],
+                tenure=row['Tenure'],
+                interest_rate=row['Interest Rate'],
+                monthly_repayment=row['Monthly payment'],
+                emis_paid_on_time=row['EMIs paid on Time'],
+                start_date=start_date,
+                end_date=end_date,
             )
+            loans.append(loan)
 
-        self.stdout.write(self.style.SUCCESS("Data ingestion completed successfully."))
+        # Customers losing a loan the file now gives someone else are refreshed too.
+        previous_owners = set(
+            Loan.objects.filter(loan_id__in=[loan.loan_id for loan in loans]).values_list('customer_id', flat=True)
+        )
+        self.upsert(Loan, loans, 'loan_id', LOAN_UPDATE_FIELDS)
+        # Refresh the loan-book counters of every customer this chunk touched,
+        # inside the shard's transaction.
+        rebuild_loan_stats(previous_owners | {loan.customer_id for loan in loans})
+        return [loan.loan_id for loan in loans]
+
+    def upsert(self, model, objs, unique_field, update_fields):
+        # INSERT ... ON CONFLICT DO UPDATE: one statement per batch whether the
+        # rows are new or already present.
+        model.objects.bulk_create(
+            objs,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=[unique_field],
+            update_fields=update_fields,
+        )
@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from loanapp.loadgen import latency_summary, request_plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the production server (gunicorn.conf.py) at each worker count and "
+        "drive it over HTTP, reporting throughput scaling and latency. The server "
+        "uses this command's database; SQLite is switched to WAL mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', default='1,2,4',
+            help='Comma-separated worker counts to try (default: 1,2,4).',
+        )
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run (default: 2000).')
+        parser.add_argument('--concurrency', type=int, default=32, help='Client threads (default: 32).')
+        parser.add_argument('--port', type=int, default=8765, help='Port for the server (default: 8765).')
+        parser.add_argument(
+            '--interface', choices=['wsgi', 'asgi'], default='wsgi',
+            help='Serve the WSGI app on threaded workers or the ASGI app on uvicorn workers.',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for picking targets (default: 0).')
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options['workers'].split(',')]
+        base_url = f"http://127.0.0.1:{options['port']}"
+        plan = [
+            (method, base_url + reverse(name, args=url_args), body)
+            for method, name, url_args, body in request_plan(options['requests'], options['seed'])
+        ]
+
+        results = {}
+        for workers in worker_counts:
+            server = self.start_server(workers, options)
+            try:
+                self.wait_until_ready(server, base_url + reverse('view_loan', args=[0]))
+                results[workers] = self.drive(plan, options['concurrency'])
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            summary = results[workers]
+            self.stdout.write(f"{workers} worker(s): {summary['rps']:.1f} req/s")
+
+        baseline = results[worker_counts[0]]['rps']
+        self.stdout.write(
+            f"\n{options['interface']}, {options['requests']} requests at concurrency {options['concurrency']}"
+        )
+        self.stdout.write(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for workers, summary in results.items():
+            self.stdout.write(
+                f"{workers:>7} {summary['rps']:>9.1f} {summary['rps'] / baseline:>7.2f}x "
+                f"{summary['p50_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['errors']:>7}"
+            )
+
+    def start_server(self, workers, options):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='loanproject.settings_production',
+            # A local throwaway server: the dev key is fine unless one is set.
+            DJANGO_SECRET_KEY=os.environ.get('DJANGO_SECRET_KEY', settings.SECRET_KEY),
+            DJANGO_ALLOWED_HOSTS='127.0.0.1',
+            SQLITE_PATH=str(settings.DATABASES['default']['NAME']),
+            WEB_CONCURRENCY=str(workers),
+            BIND=f"127.0.0.1:{options['port']}",
+            SERVER_INTERFACE=options['interface'],
+        )
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+
+    def wait_until_ready(self, server, url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited with status {server.returncode}.")
+            try:
+                requests.get(url, timeout=1)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not answer within {timeout}s.")
+
+    def drive(self, plan, concurrency):
+        local = threading.local()
+
+        def call(entry):
+            method, url, body = entry
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            response = local.session.request(method, url, json=body)
+            return time.perf_counter() - started, response.status_code >= 500
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(call, plan))
+        return latency_summary(time.perf_counter() - started, outcomes)
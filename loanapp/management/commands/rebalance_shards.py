@@ -0,0 +1,129 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from loanapp.models import Customer, IdempotencyKey, Loan
+from loanapp.profiles import invalidate_all_credit_profiles
+from loanapp.sharding import group_by_shard, shard_aliases, use_shard
+
+CUSTOMER_FIELDS = [
+    field.name for field in Customer._meta.concrete_fields if not field.primary_key and field.name != 'customer_id'
+]
+LOAN_FIELDS = [field.name for field in Loan._meta.concrete_fields if not field.primary_key and field.name != 'loan_id']
+
+
+class Command(BaseCommand):
+    help = (
+        "Move every customer, with its loans and idempotency keys, to the shard SHARDS now assigns it. "
+        "Run it with writes stopped after appending shards to SHARDS; customers are "
+        "missing from reads until their batch has moved"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--drain', nargs='+', default=[], metavar='ALIAS',
+            help='Databases no longer in SHARDS to move every customer off.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Customers scanned and moved per transaction (default: 1000).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only count the customers that would move.')
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        unknown = [alias for alias in options['drain'] if alias not in connections or alias in shards]
+        if unknown:
+            raise CommandError(f"--drain takes configured databases outside SHARDS, not {', '.join(unknown)}.")
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        started = time.perf_counter()
+        moved = Counter()
+        loans = 0
+        for source in shards + options['drain']:
+            last_pk = 0
+            while True:
+                with use_shard(source):
+                    rows = list(
+                        Customer.objects.filter(pk__gt=last_pk).order_by('pk')
+                        .values_list('pk', 'customer_id')[:self.batch_size]
+                    )
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                for target, misplaced in group_by_shard(rows, key=lambda row: row[1], shards=shards).items():
+                    if target == source:
+                        continue
+                    moved[source, target] += len(misplaced)
+                    if not self.dry_run:
+                        loans += self.move(source, target, [pk for pk, customer_id in misplaced])
+
+        if moved and not self.dry_run:
+            invalidate_all_credit_profiles()
+
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f"{source} -> {target}: {count} customers")
+        elapsed = time.perf_counter() - started
+        verb = "Would move" if self.dry_run else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(moved.values())} customers" + ("" if self.dry_run else f" and {loans} loans")
+            + f" in {elapsed:.2f}s"
+        ))
+
+    def move(self, source, target, customer_pks):
+        """
+        Copy customers and their loans to ``target``, then delete them from ``source``.
+
+        The copy is an upsert on customer_id / loan_id, so a run cut short
+        between the two steps is finished by running again. The customers'
+        idempotency keys move too, so a create-loan retried after the move
+        is still replayed rather than booked again. Score snapshots are not
+        copied (rescore_portfolio recomputes them).
+        """
+        with use_shard(source):
+            customers = list(Customer.objects.filter(pk__in=customer_pks))
+            loans = list(Loan.objects.filter(customer__in=customer_pks))
+            customer_ids = {customer.pk: customer.customer_id for customer in customers}
+            keys = self.idempotency_keys(customer_ids.values())
+            records = list(keys)
+
+        with use_shard(target), transaction.atomic(using=target):
+            for customer in customers:
+                customer.pk = None
+            Customer.objects.bulk_create(
+                customers, batch_size=self.batch_size,
+                update_conflicts=True, unique_fields=['customer_id'], update_fields=CUSTOMER_FIELDS,
+            )
+            target_pks = dict(
+                Customer.objects.filter(customer_id__in=customer_ids.values()).values_list('customer_id', 'pk')
+            )
+            for loan in loans:
+                loan.pk = None
+                loan.customer_id = target_pks[customer_ids[loan.customer_id]]
+            Loan.objects.bulk_create(
+                loans, batch_size=self.batch_size,
+                update_conflicts=True, unique_fields=['loan_id'], update_fields=LOAN_FIELDS,
+            )
+            for record in records:
+                record.pk = None
+            IdempotencyKey.objects.bulk_create(records, batch_size=self.batch_size, ignore_conflicts=True)
+
+        with use_shard(source), transaction.atomic(using=source):
+            Customer.objects.filter(pk__in=customer_pks).delete()
+            keys.delete()
+        return len(loans)
+
+    @staticmethod
+    def idempotency_keys(customer_ids):
+        """
+        The current shard's idempotency keys recorded for ``customer_ids``.
+
+        Keys are found by the customer_id in their stored response, which
+        older records hold as the client sent it: a number or a string.
+        """
+        customer_ids = list(customer_ids)
+        numbers = [int(customer_id) for customer_id in customer_ids if customer_id.isdigit()]
+        return IdempotencyKey.objects.filter(response__customer_id__in=customer_ids + numbers)
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from loanapp.capture import response_digest
+from loanapp.loadgen import (
+    PERCENTILES, comparison_report, endpoint_name, latency_summary, read_requests, record_and_compare, results_path,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay JSONL request files (from generate_request_mix or captured by "
+        "CaptureMiddleware) against a running server at a set concurrency and rate, "
+        "report throughput and latency percentiles per endpoint, compare captured "
+        "responses with the replayed ones, and store the result for comparison with "
+        "earlier runs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='+', metavar='file',
+            help='JSONL files of {"method", "path", "body", "headers"} requests; captured files are merged by time.',
+        )
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000', help='Server to replay against (default: %(default)s).',
+        )
+        parser.add_argument('--concurrency', type=int, default=16, help='Client threads (default: 16).')
+        pacing = parser.add_mutually_exclusive_group()
+        pacing.add_argument(
+            '--rate', type=float,
+            help='Send at this many requests/sec instead of as fast as the threads allow.',
+        )
+        pacing.add_argument(
+            '--speed', type=float,
+            help='Keep the captured gaps between requests, sped up by this factor (1 = real time).',
+        )
+        parser.add_argument('--results', default=None, help='Results file (default: benchmark_results.jsonl).')
+        parser.add_argument('--no-store', action='store_true', help="Don't store or compare this run.")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.10,
+            help='Fractional slowdown reported as a regression (default: 0.10).',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true', help='Exit with an error if anything regressed.',
+        )
+
+    def handle(self, *args, **options):
+        entries = []
+        for path in options['files']:
+            try:
+                entries += read_requests(path)
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {path}")
+        if not entries:
+            raise CommandError("No requests to replay.")
+        captured = all('ts' in entry for entry in entries)
+        if captured:
+            entries.sort(key=lambda entry: entry['ts'])
+        elif options['speed']:
+            raise CommandError("--speed needs captured requests with timestamps.")
+        base_url = options['base_url'].rstrip('/')
+
+        elapsed, outcomes = self.replay(entries, base_url, options['concurrency'], self.schedule(entries, options))
+        by_endpoint = defaultdict(list)
+        for entry, outcome in zip(entries, outcomes):
+            by_endpoint[endpoint_name(entry['path'])].append((entry, outcome))
+        overall = latency_summary(elapsed, [outcome[:2] for outcome in outcomes])
+
+        pacing = (
+            f"{options['rate']:g} req/s target" if options['rate']
+            else f"{options['speed']:g}x captured pace" if options['speed'] else "unpaced"
+        )
+        self.stdout.write(
+            f"{len(entries)} requests against {base_url} at concurrency {options['concurrency']}, {pacing}: "
+            f"{overall['rps']:.1f} req/s\n"
+        )
+        percentile_headers = ''.join(f"{f'p{p} ms':>9}" for p in PERCENTILES)
+        self.stdout.write(f"{'endpoint':<20} {'requests':>8} {'errors':>7}{percentile_headers}")
+        rows = {
+            name: latency_summary(elapsed, [outcome[:2] for _, outcome in pairs])
+            for name, pairs in sorted(by_endpoint.items())
+        }
+        rows['all'] = overall
+        for name, summary in rows.items():
+            percentiles = ''.join(f"{summary[f'p{p}_ms']:>9.2f}" for p in PERCENTILES)
+            self.stdout.write(f"{name:<20} {summary['requests']:>8} {summary['errors']:>7}{percentiles}")
+
+        # Per-endpoint throughput depends on the mix, so only its latency is kept.
+        metrics = dict(overall)
+        for name, summary in rows.items():
+            if name != 'all':
+                metrics.update({f'{name}.{key}': summary[key] for key in summary if key.endswith('_ms')})
+        if captured:
+            metrics.update(self.compare_with_capture(by_endpoint))
+
+        if options['no_store']:
+            return
+        params = {
+            'file': os.path.basename(options['files'][0]),
+            'files': len(options['files']),
+            'requests': len(entries),
+            'concurrency': options['concurrency'],
+            'rate': options['rate'],
+            'speed': options['speed'],
+        }
+        self.report_comparison('replay_requests', params, metrics, options)
+
+    @staticmethod
+    def schedule(entries, options):
+        """Send offsets in seconds from the start of the replay, or None to send as fast as possible."""
+        if options['rate']:
+            return [i / options['rate'] for i in range(len(entries))]
+        if options['speed']:
+            first = entries[0]['ts']
+            return [(entry['ts'] - first) / options['speed'] for entry in entries]
+        return None
+
+    def replay(self, entries, base_url, concurrency, offsets=None):
+        """
+        Send every entry; returns (wall seconds, [(seconds, failed, status, digest)] in entry order).
+
+        Paced requests are timed from when they were due, not when a thread
+        got to them, so a backed-up server shows up as latency instead of
+        silently lowering the offered load.
+        """
+        local = threading.local()
+
+        def call(entry, offset):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            if offset is not None:
+                due = begin + offset
+                if due > started:
+                    time.sleep(due - started)
+                started = due
+            body = entry.get('body')
+            try:
+                response = local.session.request(
+                    entry['method'], base_url + entry['path'], headers=entry.get('headers'),
+                    **({'data': body.encode()} if isinstance(body, str) else {'json': body}),
+                )
+                outcome = (response.status_code >= 500, response.status_code, response_digest(response.content))
+            except requests.ConnectionError:
+                outcome = (True, None, None)
+            return (time.perf_counter() - started, *outcome)
+
+        begin = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(call, entries, offsets or [None] * len(entries)))
+        return time.perf_counter() - begin, outcomes
+
+    def compare_with_capture(self, by_endpoint):
+        """
+        Print replayed vs captured status codes, bodies and server-side latency per endpoint.
+
+        Captured latency is measured inside the server, replayed latency at the
+        client, so the replayed numbers also include the network and queueing.
+        Returns mismatch totals for the stored result.
+        """
+        self.stdout.write(
+            f"\n{'vs capture':<20} {'status diffs':>12} {'body diffs':>10} {'captured p50':>13} {'captured p99':>13}"
+        )
+        status_diffs = body_diffs = 0
+        for name, pairs in sorted(by_endpoint.items()):
+            statuses = sum(entry['status'] != outcome[2] for entry, outcome in pairs)
+            bodies = sum(entry['response_digest'] != outcome[3] for entry, outcome in pairs)
+            captured = latency_summary(0, [(entry['duration_ms'] / 1000, False) for entry, _ in pairs])
+            self.stdout.write(
+                f"{name:<20} {statuses:>12} {bodies:>10} {captured['p50_ms']:>13.2f} {captured['p99_ms']:>13.2f}"
+            )
+            status_diffs += statuses
+            body_diffs += bodies
+        return {'status_mismatches': status_diffs, 'body_mismatches': body_diffs}
+
+    def report_comparison(self, benchmark, params, metrics, options):
+        path = options['results'] or results_path()
+        previous, worse = record_and_compare(path, benchmark, params, metrics, options['tolerance'])
+        self.stdout.write('\n' + '\n'.join(comparison_report(path, previous, worse, options['tolerance'])))
+        if worse and options['fail_on_regression']:
+            raise CommandError(f"{len(worse)} metric(s) regressed.")
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from loanapp.models import CreditScoreSnapshot, ScoringRun
+from loanapp.scoring import score_customer_range, unscored_customers, write_snapshots
+from loanapp.sharding import shard_aliases, use_shard
+
+
+def forget_inherited_connections():
+    """
+    Pool initializer: drop DB connections copied from the parent by fork().
+
+    The pool always forks (see Command.score): a forked worker starts with
+    Django set up, and with the parent's settings, including test
+    databases and overrides, which a spawned one would have to rebuild.
+
+    They are not closed, since closing a shared socket would end the
+    parent's session; each worker opens its own on first use.
+    """
+    for connection in connections.all():
+        connection.connection = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every customer's credit score into a new snapshot, scoring "
+        "chunks of customers vectorized across a process pool; sharded, each "
+        "shard gets a run of its own"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue the latest unfinished run instead of starting a new one.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Customers scored per task and written per transaction (default: 20000).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Worker processes; 1 scores in this process (default: CPU count).',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        runs = []
+        for shard in shard_aliases():
+            with use_shard(shard):
+                run = self.get_run(options['resume'])
+            if run is not None:
+                runs.append(run)
+        if not runs:
+            raise CommandError("No unfinished scoring run to resume.")
+        for run in runs:
+            self.score(run, options['chunk_size'], options['workers'])
+
+    def score(self, run, chunk_size, workers):
+        started = time.perf_counter()
+        self.scored = 0
+        chunks = self.chunk_ranges(run, chunk_size)
+        if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            self.stdout.write(self.style.WARNING("This platform can't fork workers; scoring in this process."))
+            workers = 1
+        if workers <= 1:
+            for first_pk, last_pk in chunks:
+                self.write(run, *score_customer_range(run, first_pk, last_pk))
+        else:
+            # Workers must not inherit an open connection; see the initializer.
+            connections.close_all()
+            # Fork explicitly: spawn and forkserver, the default on macOS and
+            # newer Pythons, would start workers without Django set up.
+            pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('fork'), initializer=forget_inherited_connections,
+            )
+            with pool:
+                pending = set()
+                for first_pk, last_pk in chunks:
+                    pending.add(pool.submit(score_customer_range, run, first_pk, last_pk))
+                    # Bound the results held in memory at once.
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.write(run, *future.result())
+                for future in wait(pending).done:
+                    self.write(run, *future.result())
+
+        run.finished_at = timezone.now()
+        run.save(update_fields=['finished_at'])
+
+        elapsed = time.perf_counter() - started
+        rate = self.scored / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk}{self.on_shard(run)}: scored {self.scored} customers in {elapsed:.2f}s "
+            f"({rate:,.0f} customers/sec)"
+        ))
+
+    def get_run(self, resume):
+        """A new run on the current shard, or with ``resume`` its latest unfinished one (None if there is none)."""
+        if not resume:
+            return ScoringRun.objects.create(score_year=datetime.now().year)
+        run = ScoringRun.objects.filter(finished_at__isnull=True).order_by('-pk').first()
+        if run is not None:
+            done = CreditScoreSnapshot.objects.filter(run=run).count()
+            self.stdout.write(f"Resuming run {run.pk}{self.on_shard(run)} with {done} customers already scored")
+        return run
+
+    @staticmethod
+    def on_shard(run) -> str:
+        return f" on {run._state.db}" if len(shard_aliases()) > 1 else ""
+
+    def chunk_ranges(self, run, chunk_size):
+        """Keyset-paginated (first pk, last pk) ranges of the customers left to score."""
+        last_pk = 0
+        while True:
+            pks = list(unscored_customers(run).filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return
+            yield pks[0], pks[-1]
+            last_pk = pks[-1]
+
+    def write(self, run, pks, scores):
+        # Each chunk commits on its own, so an interrupted run loses at most the
+        # chunks in flight.
+        with transaction.atomic(using=run._state.db):
+            write_snapshots(run, pks, scores)
+        self.scored += len(pks)
+        if self.verbosity > 1:
+            self.stdout.write(f"  wrote {len(pks)} scores (total {self.scored})")
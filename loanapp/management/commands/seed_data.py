@@ -0,0 +1,129 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from loanapp.emi import emi_money
+from loanapp.loan_stats import rebuild_loan_stats
+from loanapp.models import Customer, Loan
+from loanapp.profiles import invalidate_all_credit_profiles
+from loanapp.sharding import group_by_shard, shard_aliases, use_shard
+from loanapp.utils import allocate_ids
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic customers and loans for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000, help='Customers to create (default: 10000).')
+        parser.add_argument('--loans', type=int, default=100000, help='Loans to create (default: 100000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Rows generated and written per transaction (default: 20000).',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        shards = shard_aliases()
+        first_customer_id = allocate_ids('customer', options['customers'])
+        last_pks = {shard: self.last_pk(shard) for shard in shards}
+        for start in range(0, options['customers'], chunk_size):
+            size = min(chunk_size, options['customers'] - start)
+            self.create_customers(rng, first_customer_id + start, size)
+        self.stdout.write(f"Created {options['customers']} customers in {time.perf_counter() - started:.2f}s")
+
+        # Loans go to the new customers, or to everyone if none were created.
+        # Customer pks are per shard, so owners are (shard index, pk) pairs.
+        owner_shards, customer_pks = [], []
+        for index, shard in enumerate(shards):
+            seeded = Customer.objects.using(shard).order_by('pk')
+            if options['customers']:
+                seeded = seeded.filter(pk__gt=last_pks[shard])
+            pks = list(seeded.values_list('pk', flat=True))
+            owner_shards += [index] * len(pks)
+            customer_pks += pks
+        owner_shards, customer_pks = np.array(owner_shards, dtype=int), np.array(customer_pks, dtype=int)
+
+        loans_started = time.perf_counter()
+        first_loan_id = allocate_ids('loan', options['loans'])
+        for start in range(0, options['loans'], chunk_size):
+            size = min(chunk_size, options['loans'] - start)
+            self.create_loans(rng, shards, owner_shards, customer_pks, first_loan_id + start, size)
+        elapsed = time.perf_counter() - loans_started
+        self.stdout.write(f"Created {options['loans']} loans in {elapsed:.2f}s")
+
+        for index, shard in enumerate(shards):
+            pks = customer_pks[owner_shards == index]
+            for start in range(0, len(pks), chunk_size):
+                with use_shard(shard), transaction.atomic(using=shard):
+                    rebuild_loan_stats(pks[start:start + chunk_size].tolist())
+        invalidate_all_credit_profiles()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeding completed in {time.perf_counter() - started:.2f}s"))
+
+    @staticmethod
+    def last_pk(shard):
+        return Customer.objects.using(shard).aggregate(last_pk=Max('pk'))['last_pk'] or 0
+
+    def create_customers(self, rng, first_id, size):
+        salaries = rng.integers(20, 500, size) * 1000
+        ages = rng.integers(21, 70, size)
+        phones = rng.integers(7000000000, 9999999999, size)
+        customers = [
+            Customer(
+                customer_id=str(first_id + i),
+                first_name=f'First{first_id + i}',
+                last_name=f'Last{first_id + i}',
+                age=int(ages[i]),
+                phone_number=str(phones[i]),
+                monthly_salary=int(salaries[i]),
+                approved_limit=round(36 * int(salaries[i]), -5),
+                current_debt=0,
+            )
+            for i in range(size)
+        ]
+        for shard, group in group_by_shard(customers, key=lambda customer: customer.customer_id).items():
+            with transaction.atomic(using=shard):
+                Customer.objects.using(shard).bulk_create(group, batch_size=1000)
+
+    def create_loans(self, rng, shards, owner_shards, customer_pks, first_id, size):
+        # Mostly uniform, with a Zipf tail so a few customers get long histories.
+        picks = np.where(
+            rng.random(size) < 0.8,
+            rng.integers(0, len(customer_pks), size),
+            rng.zipf(1.5, size) % len(customer_pks),
+        )
+        owners, owner_shard = customer_pks[picks], owner_shards[picks]
+        amounts = rng.integers(1, 100, size) * 10000
+        rates = rng.uniform(6, 20, size).round(2)
+        tenures = rng.integers(6, 240, size)
+        emis_paid = rng.integers(0, tenures + 1)
+        start_offsets = rng.integers(0, 15 * 365, size)
+        emis = emi_money(amounts, rates, tenures)
+        today = date.today()
+
+        loans = {shard: [] for shard in shards}
+        for i in range(size):
+            start_date = today - timedelta(days=int(start_offsets[i]))
+            loans[shards[owner_shard[i]]].append(Loan(
+                customer_id=int(owners[i]),
+                loan_id=str(first_id + i),
+                loan_amount=int(amounts[i]),
+                tenure=int(tenures[i]),
+                interest_rate=float(rates[i]),
+                monthly_repayment=emis[i],
+                emis_paid_on_time=int(emis_paid[i]),
+                start_date=start_date,
+                end_date=start_date + timedelta(days=int(tenures[i]) * 30),
+                loan_approved=bool(i % 4),
+            ))
+        for shard, shard_loans in loans.items():
+            with transaction.atomic(using=shard):
+                Loan.objects.using(shard).bulk_create(shard_loans, batch_size=1000)
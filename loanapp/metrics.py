@@ -0,0 +1,207 @@
+"""
+Per-view request metrics, exposed in Prometheus text format at /api/metrics.
+
+MetricsMiddleware times each request, counts its queries and their time,
+and records the response size, all keyed by the resolved view name. It
+runs natively under both WSGI and ASGI. Queries are seen by an execute
+wrapper every connection gets when it opens (see loanapp/signals.py); the
+wrapper reports to the recorder of the request in the current context, so
+queries of sync views run in a worker thread under ASGI are counted too.
+Metrics live in this process; under a multi-worker server each worker
+reports its own. Set METRICS_ENABLED = False to drop the middleware
+entirely; /api/metrics answers only METRICS_ALLOWED_IPS.
+"""
+import contextvars
+import ipaddress
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# SQL statements kept per request for the slow-request log.
+MAX_LOGGED_QUERIES = 50
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# name -> (help, buckets); every histogram is labelled by view and method.
+HISTOGRAMS = {
+    'loanapp_request_duration_seconds': ('Request latency.', LATENCY_BUCKETS),
+    'loanapp_request_db_queries': ('Database queries per request.', QUERY_COUNT_BUCKETS),
+    'loanapp_request_db_duration_seconds': ('Time spent in database queries per request.', LATENCY_BUCKETS),
+    'loanapp_response_size_bytes': ('Response body size; streamed responses are not sized.', SIZE_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = {name: defaultdict(lambda buckets=buckets: Histogram(buckets)) for name, (_, buckets) in HISTOGRAMS.items()}
+_requests = defaultdict(int)
+
+
+def reset_metrics():
+    with _lock:
+        for series in _histograms.values():
+            series.clear()
+        _requests.clear()
+
+
+# The QueryRecorder of the request being served in this context.
+_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; passes queries to the current request's recorder."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+class QueryRecorder:
+    """Counts and times every query of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            if len(self.statements) < MAX_LOGGED_QUERIES:
+                self.statements.append(sql)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500) / 1000
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.finish(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.finish(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    def finish(self, request, response, elapsed, recorder):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        self.record(view, request.method, response.status_code, elapsed, recorder, size)
+
+        if elapsed >= self.slow_seconds:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms",
+                request.method, request.get_full_path(), view, elapsed * 1000,
+                recorder.count, recorder.seconds * 1000,
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "SQL of %s %s:\n%s", request.method, request.get_full_path(), "\n".join(recorder.statements),
+                )
+
+    @staticmethod
+    def record(view, method, status_code, elapsed, recorder, size):
+        labels = (view, method)
+        with _lock:
+            _histograms['loanapp_request_duration_seconds'][labels].observe(elapsed)
+            _histograms['loanapp_request_db_queries'][labels].observe(recorder.count)
+            _histograms['loanapp_request_db_duration_seconds'][labels].observe(recorder.seconds)
+            if size is not None:
+                _histograms['loanapp_response_size_bytes'][labels].observe(size)
+            _requests[(view, method, str(status_code))] += 1
+
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics() -> str:
+    """The current metrics in Prometheus text exposition format 0.0.4."""
+    lines = [
+        '# HELP loanapp_requests_total Requests served.',
+        '# TYPE loanapp_requests_total counter',
+    ]
+    with _lock:
+        for (view, method, code), count in sorted(_requests.items()):
+            lines.append(f'loanapp_requests_total{_labels(view=view, method=method, status=code)} {count}')
+
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (view, method), histogram in sorted(_histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(view=view, method=method, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(view=view, method=method)} {histogram.sum}')
+                lines.append(f'{name}_count{_labels(view=view, method=method)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_allowed(request) -> bool:
+    """True if the client address is in one of the METRICS_ALLOWED_IPS networks."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+
+
+def metrics_view(request):
+    # Not found, rather than forbidden, for clients outside the allowlist.
+    if not getattr(settings, 'METRICS_ENABLED', True) or not scrape_allowed(request):
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
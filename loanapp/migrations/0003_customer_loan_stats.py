@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:31
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+# Frozen here rather than imported from loanapp, whose code moves on
+# while this migration must keep running against the schema it was written for.
+STAT_FIELDS = [
+    'loan_count', 'loans_paid_on_time', 'loan_volume',
+    'emi_total', 'last_loan_year', 'last_year_loan_count',
+]
+CENT = Decimal('0.01')
+
+
+def loan_emi(amount, annual_rate, tenure):
+    """EMI of one loan, rounded half-up to cents."""
+    principal = Decimal(str(amount))
+    rate = Decimal(str(annual_rate)) / 1200
+    growth = (1 + rate) ** tenure
+    value = principal / tenure if growth == 1 else principal * rate * growth / (growth - 1)
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def populate_loan_stats(apps, schema_editor):
+    Customer = apps.get_model('loanapp', 'Customer')
+    Loan = apps.get_model('loanapp', 'Loan')
+    # The database being migrated, which need not be "default" (replicas, shards).
+    db_alias = schema_editor.connection.alias
+    stats = {}
+    loans = Loan.objects.using(db_alias).values_list(
+        'customer_id', 'loan_amount', 'interest_rate', 'tenure', 'emis_paid_on_time', 'start_date',
+    )
+    for customer_pk, amount, rate, tenure, emis_paid, start_date in loans.iterator():
+        customer = stats.setdefault(customer_pk, {
+            'loan_count': 0, 'loans_paid_on_time': 0, 'loan_volume': Decimal('0.00'),
+            'emi_total': Decimal('0.00'), 'last_loan_year': None, 'last_year_loan_count': 0,
+        })
+        customer['loan_count'] += 1
+        # A loan counts as paid on time when every EMI so far was paid on time.
+        customer['loans_paid_on_time'] += emis_paid >= tenure
+        customer['loan_volume'] += Decimal(str(amount))
+        customer['emi_total'] += loan_emi(amount, rate, tenure)
+        if customer['last_loan_year'] is None or start_date.year > customer['last_loan_year']:
+            customer['last_loan_year'], customer['last_year_loan_count'] = start_date.year, 1
+        elif start_date.year == customer['last_loan_year']:
+            customer['last_year_loan_count'] += 1
+
+    customers = list(Customer.objects.using(db_alias).filter(pk__in=list(stats)))
+    for customer in customers:
+        for field, value in stats[customer.pk].items():
+            setattr(customer, field, value)
+    Customer.objects.using(db_alias).bulk_update(customers, STAT_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loanapp', '0002_loan_loan_approved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='emi_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_loan_year',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_year_loan_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='loan_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='loan_volume',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='loans_paid_on_time',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_loan_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loanapp', '0005_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('score_year', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CreditScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credit_score', models.IntegerField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loanapp.customer')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='loanapp.scoringrun')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='creditscoresnapshot',
+            constraint=models.UniqueConstraint(fields=('run', 'customer'), name='credit_score_snapshot_run_customer_uniq'),
+        ),
+    ]
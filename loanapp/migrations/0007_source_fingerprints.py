@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loanapp', '0006_credit_score_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('digest', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sourcefingerprint',
+            constraint=models.UniqueConstraint(fields=('source', 'key'), name='source_fingerprint_source_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Indexes the admin's ^name searches can use. Django runs istartswith as
+# LIKE 'x%' on SQLite, which needs a NOCASE index, and as
+# UPPER(col::text) LIKE UPPER('x%') on PostgreSQL, which needs an index on
+# the same expression with text_pattern_ops. Neither is expressible as a
+# portable models.Index, so they are created per backend here.
+PREFIX_INDEXES = {
+    'customer_last_name_prefix_idx': 'last_name',
+    'customer_first_name_prefix_idx': 'first_name',
+}
+
+INDEX_EXPRESSIONS = {
+    'sqlite': '{column} COLLATE NOCASE',
+    'postgresql': 'UPPER({column}) text_pattern_ops',
+}
+
+
+def create_indexes(apps, schema_editor):
+    expression = INDEX_EXPRESSIONS.get(schema_editor.connection.vendor)
+    if expression is None:
+        return
+    quote = schema_editor.quote_name
+    for name, column in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX {quote(name)} ON {quote('loanapp_customer')} ({expression.format(column=quote(column))})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in INDEX_EXPRESSIONS:
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loanapp', '0007_source_fingerprints'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -10,11 +10,20 @@ class Customer(models.Model):
     approved_limit = models.DecimalField(max_digits=10, decimal_places=2)
     current_debt   = models.DecimalField(max_digits=10, decimal_places=2)
 
+    # Loan-book counters kept in step with Loan writes (see loanapp/loan_stats.py)
+    loan_count           = models.IntegerField(default=0)
+    loans_paid_on_time   = models.IntegerField(default=0)
+    loan_volume          = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    emi_total            = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_loan_year       = models.IntegerField(null=True, blank=True)
+    last_year_loan_count = models.IntegerField(default=0)
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 class Loan(models.Model):
-    customer          = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # Indexed through the composite indexes below, which all lead with customer.
+    customer          = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     loan_id           = models.CharField(max_length=100, unique=True)
     loan_amount       = models.DecimalField(max_digits=10, decimal_places=2)
     tenure            = models.IntegerField()
@@ -25,5 +34,77 @@ class Loan(models.Model):
     end_date          = models.DateField()
     loan_approved     = models.BooleanField(default=False)   # Add this
 
+    class Meta:
+        indexes = [
+            # view-loans: customer__customer_id=... AND loan_approved
+            models.Index(fields=['customer', 'loan_approved'], name='loan_customer_approved_idx'),
+            # per-customer year filters in the credit score; on PostgreSQL it also
+            # covers the loan-stats aggregation as an index-only scan
+            models.Index(
+                fields=['customer', 'start_date'],
+                include=['loan_amount', 'interest_rate', 'tenure', 'emis_paid_on_time', 'monthly_repayment'],
+                name='loan_customer_start_idx',
+            ),
+            # admin date filters
+            models.Index(fields=['start_date'], name='loan_start_date_idx'),
+            models.Index(fields=['end_date'], name='loan_end_date_idx'),
+        ]
+
     def __str__(self):
         return f"Loan {self.loan_id} for {self.customer.first_name}"
+
+class IdempotencyKey(models.Model):
+    """A create-loan response stored under the client's Idempotency-Key header."""
+    key          = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code  = models.IntegerField()
+    response     = models.JSONField()
+    created_at   = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+class ScoringRun(models.Model):
+    """One rescore_portfolio pass; its snapshots fill in chunk by chunk."""
+    started_at  = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    score_year  = models.IntegerField()   # "current year" the run scores against
+
+    def __str__(self):
+        return f"Scoring run {self.pk}"
+
+class CreditScoreSnapshot(models.Model):
+    run          = models.ForeignKey(ScoringRun, on_delete=models.CASCADE, related_name='scores')
+    customer     = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    credit_score = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index rescore_portfolio --resume uses to skip scored customers.
+            models.UniqueConstraint(fields=['run', 'customer'], name='credit_score_snapshot_run_customer_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Score {self.credit_score} for customer {self.customer_id} in run {self.run_id}"
+
+class IdCounter(models.Model):
+    """Last id handed out from a numeric id sequence, 'customer' or 'loan' (see utils.allocate_ids)."""
+    name  = models.CharField(max_length=20, unique=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} {self.value}"
+
+class SourceFingerprint(models.Model):
+    """Digest of the source row a Customer or Loan was last ingested from (see ingest_data --incremental)."""
+    source = models.CharField(max_length=20)    # 'customers' or 'loans'
+    key    = models.CharField(max_length=100)   # customer_id / loan_id
+    digest = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'key'], name='source_fingerprint_source_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.key}"
@@ -0,0 +1,122 @@
+"""
+Keyset pagination, field selection and ETags for view-loans.
+
+Pages are ordered by Loan pk and the cursor is the last pk served, so each
+page is one index range scan however deep the client pages. The next page
+is advertised in a ``Link: <...>; rel="next"`` header and the body stays a
+plain list.
+"""
+import base64
+import hashlib
+from typing import NamedTuple
+
+from rest_framework.utils.urls import replace_query_param
+
+from .serializers import money
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# LoanSummarySerializer fields -> (Loan columns, builder from those columns).
+SUMMARY_FIELDS = {
+    'loan_id': (('loan_id',), lambda loan_id: loan_id),
+    'loan_amount': (('loan_amount',), money),
+    'interest_rate': (('interest_rate',), lambda interest_rate: interest_rate),
+    'monthly_installment': (('monthly_repayment',), money),
+    'repayments_left': (('tenure', 'emis_paid_on_time'), lambda tenure, paid: max(0, tenure - paid)),
+}
+
+
+class PageRequest(NamedTuple):
+    after_pk: int
+    limit: int
+    fields: tuple
+
+
+def encode_cursor(pk: int) -> str:
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        pk = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if pk < 0:
+        raise ValueError("Invalid cursor.")
+    return pk
+
+
+def parse_page_request(params) -> PageRequest:
+    """Read cursor, limit and fields from query params; raises ValueError with a client message."""
+    cursor = params.get('cursor')
+    after_pk = decode_cursor(cursor) if cursor else 0
+
+    try:
+        limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    fields = tuple(field for field in params.get('fields', '').split(',') if field) or tuple(SUMMARY_FIELDS)
+    unknown = [field for field in fields if field not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(SUMMARY_FIELDS)}.")
+    return PageRequest(after_pk, limit, fields)
+
+
+def page_columns(fields) -> list:
+    """The Loan columns the selected fields are built from, without repeats."""
+    return list(dict.fromkeys(column for field in fields for column in SUMMARY_FIELDS[field][0]))
+
+
+def page_queryset(loans, page: PageRequest):
+    """
+    Rows for one page: the pk, then the columns of ``page.fields``.
+
+    Fetches one row past the page so callers can tell whether a next page exists.
+    """
+    return loans.filter(pk__gt=page.after_pk).order_by('pk').values_list(
+        'pk', *page_columns(page.fields),
+    )[:page.limit + 1]
+
+
+def render_rows(rows, fields) -> list:
+    """LoanSummarySerializer output restricted to ``fields``, from page_queryset rows."""
+    positions = {column: i for i, column in enumerate(page_columns(fields), start=1)}
+    builders = [
+        (field, [positions[column] for column in SUMMARY_FIELDS[field][0]], SUMMARY_FIELDS[field][1])
+        for field in fields
+    ]
+    return [
+        {field: build(*(row[i] for i in indexes)) for field, indexes, build in builders}
+        for row in rows
+    ]
+
+
+def page_etag(rows, fields) -> str:
+    """
+    Weak ETag over the raw rows, lookahead row included.
+
+    Cheap to compute without serializing, and it changes whenever the page
+    body or its next link would.
+    """
+    digest = hashlib.blake2b(repr((fields, rows)).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """If-None-Match check with weak comparison, as RFC 9110 requires for GET."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
+
+
+def next_link(request, rows, page: PageRequest):
+    """The Link header value for the next page, or None on the last page."""
+    if len(rows) <= page.limit:
+        return None
+    url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(rows[page.limit - 1][0]))
+    return f'<{url}>; rel="next"'
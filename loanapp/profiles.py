@@ -0,0 +1,148 @@
+"""
+Per-customer credit profiles, cached in Django's cache framework.
+
+A profile is a snapshot of the customer row, with its loan-book counters,
+plus the credit score create-loan decides on. check-eligibility answers a
+cached customer without a query; create-loan uses the cached score only
+when the counters on the row it has locked still match the snapshot, so a
+profile cached just before a concurrent loan is never trusted.
+
+Loan and Customer saves and deletes invalidate through signals (see
+signals.py); bulk writes that bypass signals call
+invalidate_all_credit_profiles(). Rows read from a replica are not cached.
+"""
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .loan_stats import STAT_FIELDS
+from .models import Customer
+from .sharding import current_shard
+from .utils import CREDIT_AGGREGATES, calculate_credit_score, score_from_aggregates, with_credit_aggregates
+
+CACHE_ALIAS = 'credit_profiles'
+
+# Fields a cached score depends on; create-loan compares them with the locked row.
+SCORE_FIELDS = ['approved_limit', *STAT_FIELDS]
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class CreditProfile(NamedTuple):
+    """Everything the loan endpoints derive from a customer and its loan book."""
+    customer: Customer
+    credit_score: int
+
+
+def profile_key(customer_id, shard=None) -> str:
+    # Sharded, a customer_id's rows can move between shards (rebalance_shards).
+    shard = shard or current_shard()
+    return f'credit-profile:{shard}:{customer_id}' if shard else f'credit-profile:{customer_id}'
+
+
+def _count(**increments):
+    with _stats_lock:
+        _stats.update(increments)
+
+
+def _profile(customer) -> CreditProfile:
+    """A profile from a customer annotated by with_credit_aggregates."""
+    aggregates = {name: getattr(customer, name) for name in CREDIT_AGGREGATES[1:]}
+    return CreditProfile(customer, score_from_aggregates(**aggregates))
+
+
+def _store(profiles):
+    """Cache ``profiles`` ({customer_id: CreditProfile}) unless they were read from a replica."""
+    fresh = {
+        profile_key(customer_id): profile for customer_id, profile in profiles.items()
+        if profile.customer._state.db not in settings.READ_REPLICAS
+    }
+    caches[CACHE_ALIAS].set_many(fresh)
+
+
+def get_credit_profiles(customer_ids) -> dict:
+    """
+    Credit profiles for many customers of the current shard, cached where possible.
+
+    Misses are loaded together in one query and written back. Returns
+    {customer_id: CreditProfile} for the customers that exist.
+    """
+    keys = {profile_key(customer_id): customer_id for customer_id in customer_ids}
+    profiles = {keys[key]: profile for key, profile in caches[CACHE_ALIAS].get_many(keys).items()}
+    missing = [customer_id for customer_id in keys.values() if customer_id not in profiles]
+    _count(hits=len(profiles), misses=len(missing))
+
+    if missing:
+        loaded = {
+            customer.customer_id: _profile(customer)
+            for customer in with_credit_aggregates(Customer.objects.filter(customer_id__in=missing))
+        }
+        _store(loaded)
+        profiles.update(loaded)
+    return profiles
+
+
+def get_credit_profile(customer_id):
+    """The customer's CreditProfile, or None if there is no such customer."""
+    return get_credit_profiles([customer_id]).get(customer_id)
+
+
+async def aget_credit_profile(customer_id):
+    """get_credit_profile() for async views."""
+    key = profile_key(customer_id)
+    profile = await caches[CACHE_ALIAS].aget(key)
+    if profile is not None:
+        _count(hits=1)
+        return profile
+    _count(misses=1)
+    customer = await with_credit_aggregates(Customer.objects.filter(customer_id=customer_id)).afirst()
+    if customer is None:
+        return None
+    profile = _profile(customer)
+    if customer._state.db not in settings.READ_REPLICAS:
+        await caches[CACHE_ALIAS].aset(key, profile)
+    return profile
+
+
+def locked_credit_score(customer) -> int:
+    """
+    The credit score for ``customer``, a row locked for update.
+
+    The cached score is used only when the snapshot it was computed from
+    agrees with the locked row; otherwise it is recomputed from the loan
+    book and the fresh profile cached.
+    """
+    profile = caches[CACHE_ALIAS].get(profile_key(customer.customer_id))
+    if profile is not None and all(
+        getattr(profile.customer, field) == getattr(customer, field) for field in SCORE_FIELDS
+    ):
+        _count(hits=1)
+        return profile.credit_score
+    _count(misses=1)
+    credit_score = calculate_credit_score(customer.pk)
+    _store({customer.customer_id: CreditProfile(customer, credit_score)})
+    return credit_score
+
+
+def invalidate_credit_profiles(customer_ids, shard=None):
+    caches[CACHE_ALIAS].delete_many([profile_key(customer_id, shard) for customer_id in customer_ids])
+    _count(invalidations=1)
+
+
+def invalidate_all_credit_profiles():
+    """Drop every cached profile, for bulk writes that bypass model signals."""
+    caches[CACHE_ALIAS].clear()
+    _count(invalidations=1)
+
+
+def cache_stats() -> dict:
+    """Hit/miss/invalidation counters for this process."""
+    with _stats_lock:
+        stats = {name: _stats[name] for name in ('hits', 'misses', 'invalidations')}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
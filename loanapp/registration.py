@@ -0,0 +1,124 @@
+"""
+Bulk customer registration, for /api/register/bulk/.
+
+Rows that are plainly well formed (trimmed ASCII text within the column
+lengths, integer age and income) are accepted with a few inline checks;
+anything else goes through CustomerRegisterSerializer, so odd input gets
+exactly the coercions and error messages /api/register/ gives it.
+Approved limits are computed for the whole list at once, customer_ids are
+reserved as one block from the id counter, and rows are inserted with
+bulk_create, one transaction per batch (per shard of the batch, sharded).
+"""
+import numpy as np
+from django.db import transaction
+
+from .models import Customer
+from .serializers import CustomerRegisterSerializer
+from .sharding import group_by_shard
+from .utils import next_customer_id
+
+# Rows inserted per transaction.
+BATCH_SIZE = 1000
+
+TEXT_FIELDS = {name: Customer._meta.get_field(name).max_length for name in ('first_name', 'last_name', 'phone_number')}
+
+# IntegerField's range, and DecimalField(max_digits=10, decimal_places=2)'s whole digits.
+MAX_AGE = 2 ** 31 - 1
+MAX_INCOME = 10 ** 8
+
+
+def approved_limits(monthly_salaries) -> np.ndarray:
+    """36 x monthly salary to the nearest lakh, as registration computes it, for many salaries at once."""
+    # np.round rounds halves to even, like round() on the single-customer path.
+    return np.round(np.asarray(monthly_salaries, dtype=float) * 36 / 100000) * 100000
+
+
+def plain_text(value, max_length: int) -> bool:
+    return (
+        type(value) is str and 0 < len(value) <= max_length
+        and value.isascii() and '\x00' not in value and value == value.strip()
+    )
+
+
+def is_plain(row) -> bool:
+    """True if the serializer would accept ``row`` unchanged; False means it has to decide."""
+    return (
+        isinstance(row, dict)
+        and all(plain_text(row.get(name), max_length) for name, max_length in TEXT_FIELDS.items())
+        and type(row.get('age')) is int and -MAX_AGE - 1 <= row['age'] <= MAX_AGE
+        and type(row.get('monthly_income')) is int and -MAX_INCOME < row['monthly_income'] < MAX_INCOME
+    )
+
+
+def validate_registrations(rows):
+    """
+    Validate ``rows`` in one pass.
+
+    Returns ``(valid, errors)``, both keyed by position in ``rows``: the
+    customer fields of each valid row, and serializer errors for the rest.
+    """
+    valid, errors = {}, {}
+    for index, row in enumerate(rows):
+        if is_plain(row):
+            valid[index] = {
+                'first_name': row['first_name'],
+                'last_name': row['last_name'],
+                'age': row['age'],
+                'monthly_salary': row['monthly_income'],
+                'phone_number': row['phone_number'],
+            }
+            continue
+        serializer = CustomerRegisterSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = dict(serializer.validated_data)
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+def registered(customer: Customer) -> dict:
+    """A registered customer as /api/register/ returns it."""
+    return {
+        "customer_id": customer.customer_id,
+        "name": f"{customer.first_name} {customer.last_name}",
+        "age": customer.age,
+        "monthly_income": int(customer.monthly_salary),
+        "approved_limit": int(customer.approved_limit),
+        "phone_number": customer.phone_number,
+    }
+
+
+def register_customers(rows, batch_size: int = BATCH_SIZE) -> list:
+    """
+    Register every valid row of ``rows``; returns one result per row, in order.
+
+    A row's result is the registered customer or ``{"error": ...}``; invalid
+    rows don't stop the others.
+    """
+    valid, errors = validate_registrations(rows)
+    results = [{"error": errors[index]} if index in errors else None for index in range(len(rows))]
+
+    indexes = list(valid)
+    limits = approved_limits([valid[index]['monthly_salary'] for index in indexes]).tolist()
+    limits = dict(zip(indexes, limits))
+    if not indexes:
+        return results
+    # Row i of ``indexes`` gets customer_id first_id + i.
+    first_id = next_customer_id(len(indexes))
+    for start in range(0, len(indexes), batch_size):
+        customers = [
+            Customer(
+                customer_id=str(first_id + start + offset),
+                approved_limit=limits[index],
+                current_debt=0,
+                **valid[index],
+            )
+            for offset, index in enumerate(indexes[start:start + batch_size])
+        ]
+        # A customer's id decides its shard; each shard's rows commit on their own.
+        for shard, group in group_by_shard(customers, key=lambda customer: customer.customer_id).items():
+            with transaction.atomic(using=shard):
+                Customer.objects.using(shard).bulk_create(group)
+        for index, customer in zip(indexes[start:start + batch_size], customers):
+            results[index] = registered(customer)
+    return results
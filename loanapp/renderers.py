@@ -0,0 +1,30 @@
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to DRF's JSONRenderer
+    orjson = None
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSONRenderer's compact UTF-8 output, encoded by orjson.
+
+    Types orjson does not handle natively (Decimal and friends) go through
+    DRF's encoder, so the output matches JSONRenderer's.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self._encoder.default)
+
+
+# Renderers for the hot read endpoints.
+FAST_RENDERERS = [ORJSONRenderer if orjson is not None else JSONRenderer, BrowsableAPIRenderer]
@@ -0,0 +1,188 @@
+"""
+Read-replica routing.
+
+ReplicaRouter sends writes to the primary ('default') and reads to one of
+READ_REPLICAS, but only where reads have been allowed onto a replica: in
+views marked ``replica_reads = True`` (set up per request by
+ReplicaMiddleware) and in ``replica_reads()`` blocks. Everywhere else --
+the write endpoints, ingest, management commands -- reads stay on the
+primary, as do reads inside a transaction on the primary.
+
+Read-your-writes: a request to a view that writes pins its client to the
+primary for REPLICA_PIN_SECONDS with a cookie, so the client's next reads
+see its own writes even while the replicas catch up.
+
+Each process checks a replica at most every REPLICA_CHECK_INTERVAL
+seconds. One that can't be reached, or lags more than
+REPLICA_MAX_LAG_SECONDS, gets no reads until a later check passes; with
+no usable replica, reads fall back to the primary.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The replica this context's reads go to; None means the primary.
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+# alias -> (monotonic time of the last check, whether it passed)
+_health = {}
+
+
+def replication_lag(connection):
+    """
+    Seconds the replica behind ``connection`` trails its primary, or None if
+    the backend can't tell. Raises DatabaseError if it can't be reached.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # A standby that has replayed everything it received is current,
+            # however old its last replayed transaction is.
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            lag = cursor.fetchone()[0]
+            return None if lag is None else float(lag)
+        cursor.execute("SELECT 1")
+        return None
+
+
+def check_replica(alias: str) -> bool:
+    try:
+        lag = replication_lag(connections[alias])
+    except DatabaseError:
+        logger.warning("Read replica %s is unreachable; reading from the primary", alias, exc_info=True)
+        return False
+    if lag is not None and lag > settings.REPLICA_MAX_LAG_SECONDS:
+        logger.warning("Read replica %s lags %.1fs; reading from the primary", alias, lag)
+        return False
+    return True
+
+
+def replica_usable(alias: str) -> bool:
+    """Whether ``alias`` passed its last health check, re-checking once REPLICA_CHECK_INTERVAL has passed."""
+    now = time.monotonic()
+    checked_at, usable = _health.get(alias, (None, False))
+    if checked_at is None or now - checked_at >= settings.REPLICA_CHECK_INTERVAL:
+        usable = check_replica(alias)
+        _health[alias] = (now, usable)
+    return usable
+
+
+def health_check_due() -> bool:
+    """Whether choose_replica() would query a replica to re-check its health."""
+    now = time.monotonic()
+    return any(
+        alias not in _health or now - _health[alias][0] >= settings.REPLICA_CHECK_INTERVAL
+        for alias in settings.READ_REPLICAS
+    )
+
+
+def reset_replica_health():
+    _health.clear()
+
+
+def choose_replica():
+    """A random usable replica, or None to read from the primary."""
+    usable = [alias for alias in settings.READ_REPLICAS if replica_usable(alias)]
+    return random.choice(usable) if usable else None
+
+
+@contextmanager
+def replica_reads():
+    """Let reads in this block go to a replica, for read-only work outside the views."""
+    token = _read_alias.set(choose_replica())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # A transaction on the primary must see its own uncommitted writes.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so an object read from one can
+        # be related to an object saved to the other.
+        databases = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """Moves the reads of read-only views onto a replica and pins writing clients to the primary."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'READ_REPLICAS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Awaited in the request's own context, without a thread hop
+            # unless a replica health check is due.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Reset per request: a worker thread's context outlives the request.
+        token = _read_alias.set(None)
+        request.replica_reads = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        request.replica_reads = False
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.pin(request, response)
+
+    @staticmethod
+    def pin(request, response):
+        if request.method not in SAFE_METHODS and not request.replica_reads:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    @staticmethod
+    def wants_replica(request, view_func) -> bool:
+        request.replica_reads = getattr(getattr(view_func, 'view_class', view_func), 'replica_reads', False)
+        return request.replica_reads and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.wants_replica(request, view_func):
+            _read_alias.set(choose_replica())
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if self.wants_replica(request, view_func):
+            _read_alias.set(await sync_to_async(choose_replica)() if health_check_due() else choose_replica())
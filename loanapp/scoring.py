@@ -0,0 +1,91 @@
+"""
+Vectorized portfolio scoring for rescore_portfolio.
+
+A ScoringRun and its snapshots live on one shard, alongside the customers
+they score; every query here runs on the run's own database, so chunks
+can be scored in worker processes that don't share this one's context.
+"""
+import numpy as np
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import CreditScoreSnapshot, Customer, Loan
+from .utils import score_from_aggregate_arrays
+
+# Loan columns score_loan_rows expects, in order.
+SCORE_LOAN_COLUMNS = ['customer', 'emis_paid_on_time', 'start_date__year', 'loan_amount', 'monthly_repayment']
+
+
+def as_float(field):
+    """Read a money column as a float: skips building a Decimal per value."""
+    return Cast(field, FloatField())
+
+
+def _cents(values) -> np.ndarray:
+    return np.rint(np.asarray(values, dtype=float) * 100).astype(np.int64)
+
+
+def score_loan_rows(customer_rows, loan_rows, year: int):
+    """
+    Credit scores for a block of customers from their raw loan rows.
+
+    ``customer_rows`` are (pk, approved_limit) pairs and ``loan_rows`` are
+    SCORE_LOAN_COLUMNS tuples. Returns (pks, scores) arrays equal to
+    calculate_credit_scores for the same customers, without its GROUP BY.
+    """
+    customers = np.array(list(customer_rows), dtype=float).reshape(-1, 2)
+    pks = customers[:, 0].astype(np.int64)
+    loans = np.array(list(loan_rows), dtype=float).reshape(-1, len(SCORE_LOAN_COLUMNS))
+    owners, emis_paid, start_years, amounts, repayments = loans.T
+
+    # Loans of customers outside the block are dropped.
+    index = np.searchsorted(pks, owners.astype(np.int64))
+    known = index < len(pks)
+    known[known] = pks[index[known]] == owners[known]
+    index = index[known]
+
+    def per_customer(weights=None):
+        return np.bincount(index, weights=None if weights is None else weights[known], minlength=len(pks))
+
+    scores = score_from_aggregate_arrays(
+        approved_limit_cents=_cents(customers[:, 1]),
+        # Mirrors the aggregate query's emis_paid_on_time=True filter.
+        on_time_loans=per_customer(emis_paid == 1),
+        total_loans=per_customer(),
+        loans_this_year=per_customer(start_years == year),
+        total_approved_volume_cents=per_customer(_cents(amounts)),
+        current_loans_sum_cents=per_customer(_cents(repayments)),
+    )
+    return pks, scores
+
+
+def unscored_customers(run):
+    """Customers with no snapshot in ``run`` yet, in pk order."""
+    return Customer.objects.using(run._state.db).exclude(
+        pk__in=CreditScoreSnapshot.objects.using(run._state.db).filter(run=run).values('customer'),
+    ).order_by('pk')
+
+
+def score_customer_range(run, first_pk: int, last_pk: int):
+    """Score the unscored customers of ``run`` with pks in [first_pk, last_pk]."""
+    customers = unscored_customers(run).filter(pk__range=(first_pk, last_pk))
+    customer_rows = customers.values_list('pk', as_float('approved_limit'))
+    loan_rows = Loan.objects.using(run._state.db).filter(customer__gte=first_pk, customer__lte=last_pk).values_list(
+        *SCORE_LOAN_COLUMNS[:3], as_float('loan_amount'), as_float('monthly_repayment'),
+    )
+    return score_loan_rows(customer_rows, loan_rows, run.score_year)
+
+
+def write_snapshots(run, pks, scores):
+    """
+    Insert one snapshot row per customer with a single executemany.
+
+    Rows already in the run are skipped, so re-writing a chunk is harmless.
+    """
+    connection = connections[run._state.db]
+    table = connection.ops.quote_name(CreditScoreSnapshot._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(column) for column in ('run_id', 'customer_id', 'credit_score'))
+    sql = f"INSERT INTO {table} ({columns}) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(run.pk, int(pk), int(score)) for pk, score in zip(pks, scores)])
@@ -1,3 +1,5 @@
+import math
+
 from rest_framework import serializers
 from .models import Customer, Loan
 
@@ -56,3 +58,86 @@ class LoanSummarySerializer(serializers.ModelSerializer):
 
     def get_repayments_left(self, obj):
         return max(0, obj.tenure - obj.emis_paid_on_time)
+
+
+# Upper bounds on the terms of an application; past them the EMI maths
+# overflows to inf/NaN or runs into Loan's column limits.
+MAX_LOAN_AMOUNT = 10 ** 8   # Loan.loan_amount's whole digits
+MAX_INTEREST_RATE = 100.0   # % a year
+MAX_TENURE = 600            # months
+
+
+class FiniteFloatField(serializers.FloatField):
+    """FloatField that rejects NaN, which slips past min_value/max_value comparisons."""
+    default_error_messages = {'invalid': 'A valid finite number is required.'}
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not math.isfinite(value):
+            self.fail('invalid')
+        return value
+
+
+class EligibilityRequestSerializer(serializers.Serializer):
+    customer_id = serializers.CharField()
+    loan_amount = FiniteFloatField(min_value=0, max_value=MAX_LOAN_AMOUNT)
+    interest_rate = FiniteFloatField(min_value=0, max_value=MAX_INTEREST_RATE)
+    tenure = serializers.IntegerField(min_value=1, max_value=MAX_TENURE)
+
+
+class LoanRequestSerializer(EligibilityRequestSerializer):
+    """create-loan's body: an application that books a loan, so it must lend something."""
+
+    def validate_loan_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Ensure this value is greater than 0.")
+        return value
+
+
+# Read-path projections: the same output as LoanDetailsSerializer and
+# LoanSummarySerializer, built from values_list() rows so the views skip
+# model instances and per-field serializer work.
+
+LOAN_DETAIL_COLUMNS = (
+    'loan_id', 'loan_approved', 'loan_amount', 'interest_rate', 'monthly_repayment', 'tenure',
+    'customer__customer_id', 'customer__first_name', 'customer__last_name',
+    'customer__phone_number', 'customer__age',
+)
+
+LOAN_SUMMARY_COLUMNS = ('loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'tenure', 'emis_paid_on_time')
+
+
+def money(value) -> str:
+    """A two-place decimal rendered the way DRF's DecimalField renders it."""
+    return f'{value:.2f}'
+
+
+def loan_detail(row) -> dict:
+    (loan_id, loan_approved, loan_amount, interest_rate, monthly_repayment, tenure,
+     customer_id, first_name, last_name, phone_number, age) = row
+    return {
+        'loan_id': loan_id,
+        'customer': {
+            'customer_id': customer_id,
+            'first_name': first_name,
+            'last_name': last_name,
+            'phone_number': phone_number,
+            'age': age,
+        },
+        'loan_approved': loan_approved,
+        'loan_amount': money(loan_amount),
+        'interest_rate': interest_rate,
+        'monthly_repayment': money(monthly_repayment),
+        'tenure': tenure,
+    }
+
+
+def loan_summary(row) -> dict:
+    loan_id, loan_amount, interest_rate, monthly_repayment, tenure, emis_paid_on_time = row
+    return {
+        'loan_id': loan_id,
+        'loan_amount': money(loan_amount),
+        'interest_rate': interest_rate,
+        'monthly_installment': money(monthly_repayment),
+        'repayments_left': max(0, tenure - emis_paid_on_time),
+    }
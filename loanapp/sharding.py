@@ -0,0 +1,164 @@
+"""
+Horizontal sharding of customers and their loans by customer_id.
+
+With SHARDS set to a list of database aliases, each customer lives on the
+shard its customer_id hashes to, and so does everything recorded for it:
+its loans, score snapshots, and the idempotency keys of its create-loan
+requests. Source fingerprints, id counters and Django's own tables
+(auth, sessions, admin log) stay on "default", which may itself be one
+of the shards.
+
+ShardRouter sends the sharded models to the shard selected for the
+current context with use_shard() or customer_shard(), or else to the
+database the instance at hand was loaded from. A query on a sharded model
+with neither is an error, never a silent read of the wrong database.
+Lookups by loan_id can't know the shard, so scatter_first() tries each.
+
+Shards are picked by jump consistent hashing (Lamping & Veach), so
+appending an alias to SHARDS moves only about 1/N of the customers, all
+of them onto the new shard; rebalance_shards moves their rows. An empty
+SHARDS keeps everything on "default" and leaves routing to ReplicaRouter.
+"""
+import contextvars
+import functools
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SHARDED_APP = 'loanapp'
+
+# loanapp models describing the data set as a whole, kept on "default".
+GLOBAL_MODELS = {'sourcefingerprint', 'idcounter'}
+
+# The shard this context's customer-owned queries go to.
+_shard = contextvars.ContextVar('shard', default=None)
+
+
+def shard_aliases() -> list:
+    """The configured shards in hashing order; just "default" when unsharded."""
+    return list(settings.SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def is_sharded_model(model) -> bool:
+    return model._meta.app_label == SHARDED_APP and model._meta.model_name not in GLOBAL_MODELS
+
+
+def customer_hash(customer_id) -> int:
+    """Stable 64-bit hash of a customer_id; ints and their digit strings hash alike."""
+    return int.from_bytes(hashlib.blake2b(str(customer_id).encode(), digest_size=8).digest(), 'little')
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash of a 64-bit key into range(buckets)."""
+    bucket, following = -1, 0
+    while following < buckets:
+        bucket = following
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        following = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(customer_id, shards=None) -> str:
+    """The alias holding ``customer_id``'s rows under ``shards`` (default: SHARDS)."""
+    shards = shards or shard_aliases()
+    if len(shards) == 1:
+        return shards[0]
+    return shards[jump_hash(customer_hash(customer_id), len(shards))]
+
+
+def group_by_shard(items, key=None, shards=None) -> dict:
+    """
+    Split ``items`` by shard, keeping their order within each; ``key`` gives
+    an item's customer_id (default: the item is one). Returns {alias: items}.
+    """
+    shards = shards or shard_aliases()
+    if len(shards) == 1:
+        return {shards[0]: list(items)}
+    groups = {}
+    for item in items:
+        groups.setdefault(shard_for(item if key is None else key(item), shards), []).append(item)
+    return groups
+
+
+def current_shard():
+    """The shard selected for this context, or None (always None when unsharded)."""
+    return _shard.get() if settings.SHARDS else None
+
+
+@contextmanager
+def use_shard(alias: str):
+    """Route the sharded models' queries in this block to ``alias``."""
+    token = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def customer_shard(customer_id):
+    """use_shard() for the shard holding ``customer_id``; yields its alias."""
+    return use_shard(shard_for(customer_id))
+
+
+def on_first_shard(function):
+    """
+    Decorator for code that measures or samples a single database, such as
+    the benchmark commands: sharded, it runs against the first shard.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with use_shard(shard_aliases()[0]):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def scatter_first(query):
+    """Run ``query()`` on each shard in turn; the first result that isn't None, else None."""
+    for alias in shard_aliases():
+        with use_shard(alias):
+            result = query()
+        if result is not None:
+            return result
+    return None
+
+
+async def ascatter_first(query):
+    """scatter_first() for a coroutine function ``query``."""
+    for alias in shard_aliases():
+        with use_shard(alias):
+            result = await query()
+        if result is not None:
+            return result
+    return None
+
+
+class ShardRouter:
+    """Routes the sharded models; with SHARDS empty it leaves every decision to the next router."""
+
+    def db_for_read(self, model, **hints):
+        if not settings.SHARDS or not is_sharded_model(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        alias = _shard.get()
+        if alias is None:
+            raise RuntimeError(
+                f"No shard selected for {model._meta.label}; query it inside use_shard() or customer_shard()."
+            )
+        return alias
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.SHARDS or not (is_sharded_model(type(obj1)) and is_sharded_model(type(obj2))):
+            return None
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards other than "default" only get the sharded tables.
+        if db == DEFAULT_DB_ALIAS or db not in settings.SHARDS:
+            return None
+        return app_label == SHARDED_APP and model_name not in GLOBAL_MODELS
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .metrics import record_queries
+from .models import Customer, Loan
+from .profiles import invalidate_credit_profiles
+
+
+def _shard(instance):
+    return instance._state.db if settings.SHARDS else None
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_profile_on_customer_change(sender, instance, **kwargs):
+    invalidate_credit_profiles([instance.customer_id], _shard(instance))
+
+
+@receiver([post_save, post_delete], sender=Loan)
+def invalidate_profile_on_loan_change(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Customer):
+        return  # deleted with its customer, whose own signal covers it
+    if Loan.customer.is_cached(instance):
+        customer_id = instance.customer.customer_id
+    else:
+        customer_id = (
+            Customer.objects.using(instance._state.db).filter(pk=instance.customer_id)
+            .values_list('customer_id', flat=True).first()
+        )
+    if customer_id is not None:
+        invalidate_credit_profiles([customer_id], _shard(instance))
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Tune each new SQLite connection with settings.SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Let MetricsMiddleware see this connection's queries, whichever thread runs them."""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_queries)
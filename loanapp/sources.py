@@ -0,0 +1,189 @@
+"""
+Chunked readers for the customer and loan source files: xlsx, CSV and Parquet.
+
+Every reader yields DataFrames of at most ``chunk_size`` rows holding only
+the columns ingest_data uses, already typed, so peak memory follows the chunk
+size rather than the file size. CSV is parsed straight into the declared
+dtypes and Parquet reads only the needed column chunks; xlsx still goes
+through openpyxl's streaming reader, which is the slow path.
+"""
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional, see requirements-parquet.txt
+    pa = pq = None
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+SUFFIX_FORMATS = {
+    '.xlsx': 'xlsx', '.xlsm': 'xlsx',
+    '.csv': 'csv', '.gz': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+}
+
+# Source column -> dtype, for the columns ingest_data reads. IDs and phone
+# numbers are text in the database, so they are read as text.
+CUSTOMER_COLUMNS = {
+    'Customer ID': str,
+    'First Name': str,
+    'Last Name': str,
+    'Age': 'int64',
+    'Phone Number': str,
+    'Monthly Salary': 'float64',
+    'Approved Limit': 'float64',
+}
+LOAN_COLUMNS = {
+    'Customer ID': str,
+    'Loan ID': str,
+    'Loan Amount': 'float64',
+    'Tenure': 'int64',
+    'Interest Rate': 'float64',
+    'Monthly payment': 'float64',
+    'EMIs paid on Time': 'int64',
+    'Date of Approval': 'datetime64[ns]',
+    'End Date': 'datetime64[ns]',
+}
+
+
+def detect_format(path) -> str:
+    """The format of ``path`` from its suffix; raises ValueError if unknown."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in SUFFIX_FORMATS:
+        raise ValueError(f"Can't tell the format of {path}; pass one of {', '.join(FORMATS)}.")
+    return SUFFIX_FORMATS[suffix]
+
+
+def parse_dates(series) -> pd.Series:
+    """Vectorized date parsing to datetime64; blanks and unparseable values become NaT."""
+    return pd.to_datetime(series, errors='coerce')
+
+
+def as_dates(series) -> pd.Series:
+    """datetime64 values as datetime.date objects, NaT as None, for model fields."""
+    return series.dt.date.where(series.notna(), None)
+
+
+def typed(df, columns: dict) -> pd.DataFrame:
+    """Keep only ``columns`` and cast them to their dtypes; a no-op for already typed chunks."""
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}.")
+    df = df[list(columns)]
+    casts = {}
+    for column, dtype in columns.items():
+        if dtype == 'datetime64[ns]':
+            if df[column].dtype != dtype:
+                casts[column] = parse_dates(df[column])
+        elif dtype is str:
+            if df[column].dtype == object:
+                # Blank cells stay NaN instead of becoming the string 'nan'.
+                casts[column] = df[column].where(df[column].isna(), df[column].astype(str))
+            else:
+                casts[column] = df[column].astype(str)
+        elif df[column].dtype != dtype:
+            if dtype == 'int64' and df[column].isna().any():
+                # Left as floats so the blank rows can be reported and skipped.
+                continue
+            casts[column] = df[column].astype(dtype)
+    return df.assign(**casts) if casts else df
+
+
+def read_excel_chunks(path, chunk_size):
+    """
+    Stream a workbook as DataFrames of at most ``chunk_size`` rows.
+
+    openpyxl's read-only mode parses rows lazily, so only one chunk is held
+    in memory at a time instead of the whole sheet.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            # Formatted-but-empty trailing rows come back as all-None tuples.
+            batch = [row for row in batch if any(value is not None for value in row)]
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_csv_chunks(path, chunk_size, columns: dict):
+    dates = [column for column, dtype in columns.items() if dtype == 'datetime64[ns]']
+    # Integers are read as floats, which can hold blanks; typed() narrows them.
+    dtypes = {
+        column: 'float64' if dtype == 'int64' else dtype for column, dtype in columns.items() if column not in dates
+    }
+    try:
+        yield from pd.read_csv(path, usecols=list(columns), dtype=dtypes, chunksize=chunk_size)
+    except ValueError as error:
+        if 'Usecols' in str(error):
+            raise ValueError(f"Missing columns in {path}: {error}")
+        raise
+
+
+def read_parquet_chunks(path, chunk_size, columns: dict):
+    if pq is None:
+        raise ValueError("Reading Parquet needs pyarrow; pip install -r requirements-parquet.txt.")
+    parquet = pq.ParquetFile(path)
+    missing = [column for column in columns if column not in parquet.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Missing columns in {path}: {', '.join(missing)}.")
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=list(columns)):
+        yield batch.to_pandas()
+
+
+def read_chunks(path, columns: dict, chunk_size: int, file_format: str = 'auto'):
+    """Typed DataFrames of at most ``chunk_size`` rows with only ``columns``, from any supported format."""
+    file_format = detect_format(path) if file_format == 'auto' else file_format
+    if file_format == 'csv':
+        chunks = read_csv_chunks(path, chunk_size, columns)
+    elif file_format == 'parquet':
+        chunks = read_parquet_chunks(path, chunk_size, columns)
+    else:
+        chunks = read_excel_chunks(path, chunk_size)
+    for chunk in chunks:
+        yield typed(chunk, columns)
+
+
+def arrow_schema(columns: dict):
+    types = {str: pa.string(), 'int64': pa.int64(), 'float64': pa.float64(), 'datetime64[ns]': pa.timestamp('ns')}
+    return pa.schema([(column, types[dtype]) for column, dtype in columns.items()])
+
+
+def write_chunks(chunks, path, file_format: str, columns: dict) -> int:
+    """
+    Write typed ``columns`` chunks to one CSV or Parquet file, a chunk at a time.
+
+    Returns the number of rows written.
+    """
+    if file_format == 'parquet' and pa is None:
+        raise ValueError("Writing Parquet needs pyarrow; pip install -r requirements-parquet.txt.")
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if file_format == 'parquet':
+                # A fixed schema, so a chunk with an all-blank column still matches.
+                schema = arrow_schema(columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            else:
+                chunk.to_csv(path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -1,3 +1,1565 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import runpy
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test import Client, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from . import sources
+from .admin import EstimatedCountPaginator, LoanAdmin
+from .capture import CaptureWriter, get_writer, response_digest
+from .management.commands.ingest_data import CUSTOMER_UPDATE_FIELDS, LOAN_UPDATE_FIELDS
+from .loadgen import MIX_WEIGHTS, endpoint_name, read_requests, record_and_compare, request_mix, write_requests
+from .metrics import reset_metrics
+from .profiles import CACHE_ALIAS, cache_stats, get_credit_profile, invalidate_all_credit_profiles, profile_key
+from .models import CreditScoreSnapshot, Customer, IdempotencyKey, Loan, ScoringRun, SourceFingerprint
+from .renderers import ORJSONRenderer
+from .routers import replica_reads, reset_replica_health
+from .serializers import LoanDetailsSerializer, LoanSummarySerializer
+from .sharding import customer_shard, shard_for, use_shard
+from .signals import apply_sqlite_pragmas
+from .emi import amortization_schedule, amortization_schedules, emi, emi_decimal, emi_money, emi_rounded, iter_schedule
+from .loan_stats import STAT_FIELDS, aggregate_loan_stats, loan_history, rebuild_loan_stats, record_loan
+from .utils import advance_ids, assess_eligibility, calculate_credit_score, next_customer_id
+
+
+def make_customer(customer_id='1', **fields):
+    defaults = {
+        'first_name': 'Aaron',
+        'last_name': 'Garcia',
+        'age': 40,
+        'phone_number': '9629317944',
+        'monthly_salary': 100000,
+        'approved_limit': 1000000,
+        'current_debt': 0,
+    }
+    defaults.update(fields)
+    return Customer.objects.create(customer_id=customer_id, **defaults)
+
+
+def make_loan(customer, loan_id, **fields):
+    defaults = {
+        'loan_amount': 100000,
+        'tenure': 12,
+        'interest_rate': 10.0,
+        'monthly_repayment': 8792,
+        'emis_paid_on_time': 12,
+        'start_date': date(2015, 1, 1),
+        'end_date': date(2016, 1, 1),
+        'loan_approved': True,
+    }
+    defaults.update(fields)
+    loan = Loan.objects.create(customer=customer, loan_id=loan_id, **defaults)
+    record_loan(loan)
+    return loan
+
+
+class IngestDataTests(TestCase):
+    def ingest(self, **options):
+        out = StringIO()
+        call_command('ingest_data', stdout=out, **options)
+        return out.getvalue()
+
+    def test_ingests_workbooks_in_chunks(self):
+        output = self.ingest(chunk_size=100, batch_size=50)
+
+        self.assertIn('rows/sec', output)
+        self.assertEqual(Customer.objects.count(), 300)
+        # Duplicate loan ids in the sheet collapse onto the last occurrence.
+        self.assertEqual(Loan.objects.count(), 753)
+        loan = Loan.objects.get(loan_id='5930')
+        self.assertEqual(loan.customer.customer_id, '14')
+        self.assertEqual(str(loan.start_date), '2017-03-09')
+
+    def test_reingest_updates_in_place(self):
+        self.ingest()
+        Customer.objects.filter(customer_id='1').update(first_name='Changed', current_debt=5)
+
+        self.ingest()
+
+        self.assertEqual(Customer.objects.count(), 300)
+        self.assertEqual(Loan.objects.count(), 753)
+        customer = Customer.objects.get(customer_id='1')
+        self.assertEqual(customer.first_name, 'Aaron')
+        self.assertEqual(customer.current_debt, 0)
+
+    def test_recompute_emi_prices_from_terms(self):
+        self.ingest(recompute_emi=True)
+
+        loan = Loan.objects.get(loan_id='5930')
+        self.assertEqual(loan.monthly_repayment, emi_decimal(900000, 8.2, 129))
+
+    def test_converted_files_ingest_the_same_rows(self):
+        self.ingest()
+        expected_loans = list(Loan.objects.order_by('loan_id').values_list(*LOAN_UPDATE_FIELDS[1:], 'customer__customer_id'))
+        expected_customers = list(Customer.objects.order_by('customer_id').values_list(*CUSTOMER_UPDATE_FIELDS))
+
+        # Parquet needs the optional pyarrow (requirements-parquet.txt).
+        for file_format in ('csv', 'parquet') if sources.pq is not None else ('csv',):
+            Loan.objects.all().delete()
+            Customer.objects.all().delete()
+            with tempfile.TemporaryDirectory() as directory:
+                call_command('convert_data_files', to=file_format, output_dir=directory, stdout=StringIO())
+                self.ingest(
+                    customers=os.path.join(directory, f'customer_data.{file_format}'),
+                    loans=os.path.join(directory, f'loan_data.{file_format}'),
+                    chunk_size=100,
+                )
+
+            self.assertEqual(
+                list(Customer.objects.order_by('customer_id').values_list(*CUSTOMER_UPDATE_FIELDS)), expected_customers,
+            )
+            self.assertEqual(
+                list(Loan.objects.order_by('loan_id').values_list(*LOAN_UPDATE_FIELDS[1:], 'customer__customer_id')),
+                expected_loans,
+            )
+
+    def test_unchanged_incremental_ingest_writes_nothing(self):
+        self.ingest(incremental=True)
+        self.assertEqual(SourceFingerprint.objects.filter(source='loans').count(), 753)
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('convert_data_files', output_dir=directory, stdout=StringIO())
+            with CaptureQueriesContext(connection) as queries:
+                # Same rows from Parquet: fingerprints are format-independent.
+                output = self.ingest(
+                    incremental=True, chunk_size=100,
+                    customers=os.path.join(directory, 'customer_data.parquet'),
+                    loans=os.path.join(directory, 'loan_data.parquet'),
+                )
+
+        self.assertIn('300 read, 0 new or changed, 0 no longer in the file', output)
+        self.assertIn('782 read, 0 new or changed, 0 no longer in the file', output)
+        writes = [query['sql'] for query in queries if not query['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_incremental_ingest_writes_changes_and_deletes_missing_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('convert_data_files', to='csv', output_dir=directory, stdout=StringIO())
+            customers, loans = (os.path.join(directory, f'{name}_data.csv') for name in ('customer', 'loan'))
+            self.ingest(incremental=True, customers=customers, loans=loans)
+            Loan.objects.filter(loan_id='5930').update(tenure=1)  # not in the source: left alone
+
+            df = pd.read_csv(loans)
+            df.loc[df['Loan ID'] == 5152, 'Tenure'] = 6
+            df[df['Loan ID'] != 6701].to_csv(loans, index=False)
+            output = self.ingest(incremental=True, delete_missing=True, customers=customers, loans=loans)
+
+        self.assertIn('781 read, 1 new or changed, 1 no longer in the file', output)
+        self.assertEqual(Loan.objects.get(loan_id='5152').tenure, 6)
+        self.assertEqual(Loan.objects.get(loan_id='5930').tenure, 1)
+        self.assertFalse(Loan.objects.filter(loan_id='6701').exists())
+        self.assertFalse(SourceFingerprint.objects.filter(source='loans', key='6701').exists())
+
+    def test_loans_without_a_usable_tenure_are_skipped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('convert_data_files', to='csv', output_dir=directory, stdout=StringIO())
+            customers, loans = (os.path.join(directory, f'{name}_data.csv') for name in ('customer', 'loan'))
+            df = pd.read_csv(loans)
+            df.loc[df['Loan ID'] == 5152, 'Tenure'] = 0
+            df.loc[df['Loan ID'] == 6701, 'Tenure'] = None
+            df.loc[df['Loan ID'] == 5930, 'Monthly payment'] = None
+            df.to_csv(loans, index=False)
+
+            output = self.ingest(customers=customers, loans=loans, chunk_size=100)
+
+        self.assertIn('Skipping Loan 5152: tenure must be a positive number of months.', output)
+        self.assertIn('Skipping Loan 6701: tenure must be a positive number of months.', output)
+        self.assertEqual(Loan.objects.count(), 751)
+        self.assertEqual(Loan.objects.get(loan_id='5930').monthly_repayment, emi_decimal(900000, 8.2, 129))
+
+    def test_unreadable_sources_are_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pd.DataFrame({'Customer ID': [1]}).to_csv(os.path.join(directory, 'customers.csv'), index=False)
+
+            with self.assertRaisesMessage(CommandError, 'Missing columns'):
+                self.ingest(customers=os.path.join(directory, 'customers.csv'))
+            with self.assertRaisesMessage(CommandError, "Can't tell the format"):
+                self.ingest(customers=os.path.join(directory, 'customers.txt'))
+
+
+class RecomputeEmisTests(TestCase):
+    def test_rewrites_every_loan(self):
+        customer = make_customer()
+        for i in range(5):
+            make_loan(customer, str(i), loan_amount=100000 * (i + 1), monthly_repayment=1)
+
+        call_command('recompute_emis', chunk_size=2, stdout=StringIO())
+
+        for loan in Loan.objects.all():
+            self.assertEqual(loan.monthly_repayment, emi_decimal(loan.loan_amount, loan.interest_rate, loan.tenure))
+
+
+class CreditScoreTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        this_year = date.today().year
+        make_loan(self.customer, '1', loan_amount=200000, monthly_repayment=5000,
+                  emis_paid_on_time=1, start_date=date(this_year, 1, 1))
+        make_loan(self.customer, '2', loan_amount=300000, monthly_repayment=7000,
+                  emis_paid_on_time=5)
+        make_loan(self.customer, '3', loan_amount=100000, monthly_repayment=3000,
+                  emis_paid_on_time=1)
+
+    def test_score_is_one_query(self):
+        with self.assertNumQueries(1):
+            score = calculate_credit_score(self.customer.pk)
+        # 2 on-time, 3 loans, 1 this year, 600k volume.
+        self.assertEqual(score, int((0.2 * 0.4 + 0.15 * 0.2 + 0.2 * 0.1 + 0.6 * 0.3) * 100))
+
+    def test_repayments_over_limit_score_zero(self):
+        Customer.objects.filter(pk=self.customer.pk).update(approved_limit=10000)
+        self.assertEqual(calculate_credit_score(self.customer.pk), 0)
+
+    def test_customer_without_loans(self):
+        other = make_customer('2')
+        self.assertEqual(calculate_credit_score(other.pk), 0)
+
+    def test_unknown_customer(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(calculate_credit_score(999), 0)
+
+
+class EmiTests(TestCase):
+    loans = [(100000, 10.0, 12), (250000, 14.5, 36), (5000, 0, 10), (900000, 8.2, 129)]
+
+    def test_vectorized_matches_decimal_reference(self):
+        expected = [emi_decimal(*loan) for loan in self.loans]
+        self.assertEqual(emi_money(*zip(*self.loans)), expected)
+        self.assertEqual(emi_rounded(*zip(*self.loans)).tolist(), [float(value) for value in expected])
+        self.assertEqual(emi_money(100000, 10.0, 12), Decimal('8791.59'))
+
+    def test_vanishing_rates_fall_back_to_straight_division(self):
+        # (1+r)^n - 1 would cancel to 0 in floats.
+        self.assertEqual(float(emi(1000, 1e-300, 10)), 100.0)
+        self.assertEqual(emi_decimal(1000, 1e-300, 10), Decimal('100.00'))
+        schedule = amortization_schedule(1000, 1e-300, 10)
+        self.assertAlmostEqual(schedule['balance'][4], 500.0)
+
+    def test_half_paisa_ties_round_up(self):
+        # 1000.05 / 10 = 100.005 exactly, which float arithmetic rounds down.
+        self.assertEqual(emi_money(1000.05, 0, 10), Decimal('100.01'))
+
+    def test_schedule_pays_off_principal(self):
+        schedule = amortization_schedule(100000, 10.0, 12)
+
+        self.assertEqual(len(schedule['balance']), 12)
+        self.assertAlmostEqual(schedule['principal'].sum(), 100000)
+        self.assertAlmostEqual(schedule['balance'][-1], 0)
+        self.assertAlmostEqual(schedule['interest'][0], 100000 * 10 / 1200)
+        self.assertAlmostEqual(schedule['payment'][0], 8791.59, places=2)
+
+    def test_schedules_pad_shorter_loans(self):
+        schedules = amortization_schedules([1000, 1200], [0, 12], [2, 3])
+
+        self.assertEqual(schedules['payment'].shape, (2, 3))
+        self.assertEqual(schedules['payment'][0, :2].tolist(), [500, 500])
+        self.assertTrue(np.isnan(schedules['payment'][0, 2]))
+
+    def test_lazy_schedule_matches_closed_form(self):
+        rows = np.array(list(iter_schedule(250000, 14.5, 36)))
+        schedule = amortization_schedule(250000, 14.5, 36)
+
+        np.testing.assert_allclose(rows[:, 1], schedule['payment'])
+        np.testing.assert_allclose(rows[:, 2], schedule['interest'])
+        np.testing.assert_allclose(rows[:, 4], schedule['balance'], atol=1e-6)
+
+
+class RegisterTests(TestCase):
+    def registration(self, **fields):
+        return dict({
+            'first_name': 'Abbie', 'last_name': 'Rodrigues', 'age': 35, 'monthly_income': 75000,
+            'phone_number': '9876543210',
+        }, **fields)
+
+    def bulk(self, rows):
+        return self.client.post(reverse('register_customers_bulk'), rows, content_type='application/json')
+
+    def test_register_allocates_ids(self):
+        make_customer('41')
+
+        first = self.client.post(reverse('register_customer'), self.registration(), content_type='application/json')
+        second = self.client.post(reverse('register_customer'), self.registration(), content_type='application/json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual([first.json()['customer_id'], second.json()['customer_id']], ['42', '43'])
+        self.assertEqual(first.json()['approved_limit'], 2700000)
+
+    def test_bulk_matches_single_registration(self):
+        make_customer('7')
+        rows = [
+            self.registration(),
+            self.registration(first_name=' Zoë ', monthly_income='12500.00', age='40'),  # through the serializer
+            self.registration(monthly_income=12500),  # a half lakh: rounds to even
+            self.registration(age='old'),
+            'not a customer',
+            self.registration(phone_number='9' * 16),
+        ]
+
+        response = self.bulk(rows)
+        results = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result.get('customer_id') for result in results], ['8', '9', '10', None, None, None])
+        self.assertEqual(results[1]['name'], 'Zoë Rodrigues')
+        self.assertEqual([result.get('approved_limit') for result in results[:3]], [2700000, 400000, 400000])
+        self.assertEqual(results[3], {'error': {'age': ['A valid integer is required.']}})
+        self.assertIn('non_field_errors', results[4]['error'])
+        self.assertIn('phone_number', results[5]['error'])
+        for result in results[:3]:
+            single = self.client.post(
+                reverse('register_customer'), self.registration(monthly_income=result['monthly_income']),
+                content_type='application/json',
+            ).json()
+            self.assertEqual(single['approved_limit'], result['approved_limit'])
+        customer = Customer.objects.get(customer_id='9')
+        self.assertEqual((customer.first_name, customer.age, customer.current_debt), ('Zoë', 40, 0))
+
+    def test_bulk_queries_dont_grow_with_rows(self):
+        self.bulk([self.registration()])  # seeds the id counter
+        with CaptureQueriesContext(connection) as ten:
+            self.bulk([self.registration()] * 10)
+        with self.assertNumQueries(len(ten)):
+            self.bulk([self.registration()] * 30)
+        self.assertEqual(Customer.objects.count(), 41)
+
+    def test_ids_come_from_the_counter(self):
+        make_customer('1')
+        make_customer('3')
+
+        # The first allocation seeds the counter from the highest stored id.
+        results = self.bulk([self.registration()] * 3).json()
+        self.assertEqual([result['customer_id'] for result in results], ['4', '5', '6'])
+
+        # Ids written from elsewhere (ingest_data) move the counter past them;
+        # later allocations don't scan the table again.
+        make_customer('20')
+        advance_ids('customer', ['20', 'x-1'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(next_customer_id(2), 21)
+        self.assertFalse([query for query in queries if 'loanapp_customer' in query['sql']])
+        registered = self.client.post(reverse('register_customer'), self.registration(), content_type='application/json')
+        self.assertEqual(registered.json()['customer_id'], '23')
+
+    def test_bad_requests(self):
+        self.assertEqual(self.bulk({'rows': []}).status_code, 400)
+        with mock.patch('loanapp.views.RegisterCustomersBulkView.MAX_CUSTOMERS', 2):
+            self.assertEqual(self.bulk([self.registration()] * 3).status_code, 400)
+        self.assertEqual(self.bulk({'customers': []}).json(), [])
+
+
+class CheckEligibilityTests(TestCase):
+    def check(self, **payload):
+        body = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12}
+        body.update(payload)
+        return self.client.post(reverse('check-eligibility'), body, content_type='application/json')
+
+    def test_approves_customer_with_good_history(self):
+        customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+
+        response = self.check()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['approval'])
+        self.assertEqual(response.data['corrected_interest_rate'], 10.0)
+
+    def test_rejects_when_emis_exceed_half_salary(self):
+        customer = make_customer(monthly_salary=20000)
+        make_loan(customer, '1', loan_amount=200000, tenure=12)
+
+        response = self.check()
+
+        self.assertFalse(response.data['approval'])
+        self.assertEqual(response.data['reason'], 'Total EMI exceeds 50% of monthly salary')
+
+    def test_long_history_is_constant_queries(self):
+        customer = make_customer(monthly_salary=10 ** 6, approved_limit=10 ** 7)
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_id=str(i), loan_amount=1000, tenure=12,
+                 interest_rate=12.0, monthly_repayment=89, emis_paid_on_time=12,
+                 start_date=date(2015, 1, 1), end_date=date(2016, 1, 1))
+            for i in range(1000)
+        ])
+        rebuild_loan_stats([customer.pk])
+
+        make_loan(make_customer('2', monthly_salary=10 ** 6, approved_limit=10 ** 7), 'short')
+
+        with self.assertNumQueries(1):
+            response = self.check()
+
+        self.assertTrue(response.data['approval'])
+        # Best of several uncached runs each, so scheduler noise can't fail it:
+        # 1,000 loans may cost a little, not a per-loan Python pass.
+        long_history, short_history = (self.best_uncached_time(customer_id) for customer_id in ('1', '2'))
+        self.assertLess(long_history, 3 * short_history + 0.02)
+
+    def best_uncached_time(self, customer_id, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            invalidate_all_credit_profiles()
+            started = time.perf_counter()
+            self.check(customer_id=customer_id)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+
+class AsyncViewTests(TestCase):
+    """The async read views answer exactly like their APIView counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(self.customer, str(i), loan_amount=300000, emis_paid_on_time=i * 4)
+        make_loan(self.customer, '3', loan_approved=False)
+
+    async def assert_same(self, method, sync_name, async_name, *args, body=None, query=''):
+        request = getattr(self.client, method)
+        async_request = getattr(self.async_client, method)
+        kwargs = {'data': body, 'content_type': 'application/json'} if body else {}
+
+        expected = await sync_to_async(request)(reverse(sync_name, args=args) + query, **kwargs)
+        response = await async_request(reverse(async_name, args=args) + query, **kwargs)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        for header in ('ETag', 'Link'):
+            self.assertEqual(response.get(header, '').replace('/async', ''), expected.get(header, ''))
+
+    async def test_check_eligibility(self):
+        body = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12}
+        await self.assert_same('post', 'check-eligibility', 'async-check-eligibility', body=body)
+        await self.assert_same(
+            'post', 'check-eligibility', 'async-check-eligibility', body=dict(body, customer_id='missing'),
+        )
+
+    async def test_check_eligibility_rejects_what_the_batch_rejects(self):
+        body = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12}
+        requests = [{'customer_id': '1'}] + [
+            dict(body, **fields) for fields in (
+                {'loan_amount': 'lots'}, {'tenure': 0}, {'tenure': -5}, {'loan_amount': 'nan'}, {'interest_rate': 'inf'},
+            )
+        ]
+        batch = await sync_to_async(self.client.post)(
+            reverse('check-eligibility-batch'), requests, content_type='application/json',
+        )
+
+        for request, batch_result in zip(requests, batch.json()):
+            response = await self.async_client.post(
+                reverse('async-check-eligibility'), request, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400, request)
+            self.assertEqual(response.json(), batch_result)
+            await self.assert_same('post', 'check-eligibility', 'async-check-eligibility', body=request)
+        await self.assert_same('post', 'check-eligibility', 'async-check-eligibility', body='{"customer_id":')
+
+    async def test_loan_detail(self):
+        await self.assert_same('get', 'view_loan', 'async-view-loan', 1)
+        await self.assert_same('get', 'view_loan', 'async-view-loan', 999)
+
+    async def test_customer_loans(self):
+        await self.assert_same('get', 'customer-loans', 'async-customer-loans', '1')
+        await self.assert_same('get', 'customer-loans', 'async-customer-loans', 'missing')
+        await self.assert_same(
+            'get', 'customer-loans', 'async-customer-loans', '1', query='?limit=1&fields=loan_id,repayments_left',
+        )
+
+
+class ReadPathTests(TestCase):
+    """The projected read views render exactly what the model serializers would."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(self.customer, str(i), loan_amount=Decimal('300000.50'), emis_paid_on_time=i * 7)
+        make_loan(self.customer, '3', loan_approved=False)
+
+    def test_loan_detail_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_loan', args=[1]))
+
+        self.assertEqual(response.json(), LoanDetailsSerializer(Loan.objects.get(loan_id='1')).data)
+
+    def test_customer_loans_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('customer-loans', args=['1']))
+        with self.assertNumQueries(1):
+            missing = self.client.get(reverse('customer-loans', args=['missing']))
+
+        loans = Loan.objects.filter(customer=self.customer, loan_approved=True)
+        self.assertEqual(response.json(), LoanSummarySerializer(loans, many=True).data)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {'loan_amount': Decimal('12.50'), 'rate': 8.25, 'name': 'Zoë', 'items': [1, None, True]}
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class CustomerLoansPaginationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+        self.loans = [make_loan(self.customer, str(i), emis_paid_on_time=i) for i in range(5)]
+
+    def get(self, url=None, **params):
+        return self.client.get(url or reverse('customer-loans', args=['1']), params)
+
+    def test_pages_follow_link_header_in_pk_order(self):
+        pages = [self.get(limit=2)]
+        while 'Link' in pages[-1]:
+            url = pages[-1]['Link'].split(';')[0].strip('<>')
+            pages.append(self.get(url))
+
+        self.assertEqual([[loan['loan_id'] for loan in page.json()] for page in pages], [['0', '1'], ['2', '3'], ['4']])
+
+    def test_fields_restricts_columns(self):
+        response = self.get(fields='repayments_left,loan_id')
+
+        self.assertEqual(response.json()[1], {'repayments_left': 11, 'loan_id': '1'})
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'fields': 'loan_id,ssn'}, {'cursor': '!!'}, {'limit': 0}, {'limit': 'all'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_unchanged_page_returns_304(self):
+        first = self.get(limit=2)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                reverse('customer-loans', args=['1']), {'limit': 2}, HTTP_IF_NONE_MATCH=first['ETag'],
+            )
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        Loan.objects.filter(pk=self.loans[1].pk).update(emis_paid_on_time=12)
+        changed = self.client.get(
+            reverse('customer-loans', args=['1']), {'limit': 2}, HTTP_IF_NONE_MATCH=first['ETag'],
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.json()[1]['repayments_left'], 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        make_loan(make_customer(), '1')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_recorded_per_view(self):
+        self.client.get(reverse('view_loan', args=[1]))
+        self.client.get(reverse('view_loan', args=[1]))
+
+        lines = self.scrape()
+        self.assertIn('loanapp_requests_total{view="view_loan",method="GET",status="200"} 2', lines)
+        self.assertIn('loanapp_request_duration_seconds_count{view="view_loan",method="GET"} 2', lines)
+        self.assertIn('loanapp_request_db_queries_bucket{view="view_loan",method="GET",le="0"} 0', lines)
+        self.assertIn('loanapp_request_db_queries_sum{view="view_loan",method="GET"} 2.0', lines)
+        size = len(self.client.get(reverse('view_loan', args=[1])).content)
+        self.assertIn(f'loanapp_response_size_bytes_sum{{view="view_loan",method="GET"}} {3.0 * size}', self.scrape())
+
+    async def test_async_views_are_recorded(self):
+        # Under ASGI the sync view runs in a worker thread; its queries still count.
+        await self.async_client.get(reverse('view_loan', args=[1]))
+        await self.async_client.get(reverse('async-view-loan', args=[1]))
+
+        lines = await sync_to_async(self.scrape)()
+        self.assertIn('loanapp_request_db_queries_sum{view="view_loan",method="GET"} 1.0', lines)
+        self.assertIn('loanapp_request_db_queries_sum{view="async-view-loan",method="GET"} 1.0', lines)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_logged_with_sql_at_debug(self):
+        with self.assertLogs('loanapp.metrics', 'WARNING') as logs:
+            self.client.get(reverse('view_loan', args=[1]))
+        self.assertIn('GET /api/view-loan/1/ (view_loan)', logs.output[0])
+        self.assertNotIn('"loanapp_loan"', logs.output[0])
+
+        with self.assertLogs('loanapp.metrics', 'DEBUG') as logs:
+            self.client.get(reverse('view_loan', args=[1]))
+        self.assertIn('"loanapp_loan"', logs.output[1])
+
+    def test_scrapes_outside_the_allowlist_are_refused(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 404)
+        with self.settings(METRICS_ALLOWED_IPS=['203.0.113.0/24']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.client.get(reverse('view_loan', args=[1]))
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with self.settings(METRICS_ENABLED=True):
+            self.assertNotIn('view="view_loan"', ''.join(self.scrape()))
+
+
+class LoanOffersTests(TestCase):
+    def offers(self, **params):
+        return self.client.get(reverse('loan-offers'), dict({'customer_id': '1'}, **params))
+
+    def test_max_amounts_match_check_eligibility(self):
+        # Score 34: the 12% slab, so low requested rates get corrected.
+        customer = make_customer(monthly_salary=200001, approved_limit=3000000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+        customer.refresh_from_db()
+        history = loan_history(customer)
+
+        with self.assertNumQueries(1):
+            response = self.offers(tenures='1,7,12,36,120', interest_rates='0,9.99,11.5,13,17.25')
+        body = response.json()
+
+        self.assertEqual(body['emi_headroom'], round(100000.5 - history.existing_emis, 2))
+        self.assertEqual(len(body['offers']), 25)
+        self.assertEqual({offer['corrected_interest_rate'] for offer in body['offers']}, {12.0, 13.0, 17.25})
+        for offer in body['offers']:
+            tenure, rate, amount = offer['tenure'], offer['interest_rate'], offer['max_loan_amount']
+            approved = assess_eligibility(customer, history, amount, rate, tenure)
+            self.assertTrue(approved['approval'], offer)
+            self.assertEqual(approved['corrected_interest_rate'], offer['corrected_interest_rate'])
+            self.assertEqual(approved['monthly_installment'], offer['monthly_installment'])
+            rejected = assess_eligibility(customer, history, amount + 1, rate, tenure)
+            self.assertEqual(rejected['reason'], 'Total EMI exceeds 50% of monthly salary', offer)
+
+    def test_no_offers_below_the_last_slab(self):
+        make_customer()
+
+        body = self.offers().json()
+
+        self.assertEqual(body['offers'], [])
+        self.assertEqual(body['reason'], 'Low credit score')
+
+    def test_bad_requests(self):
+        make_customer()
+
+        self.assertEqual(self.offers(customer_id='missing').status_code, 404)
+        for params in ({'tenures': '12,x'}, {'tenures': '0'}, {'interest_rates': '-1'}, {'interest_rates': 'nan'},
+                       {'tenures': '100000'}, {'interest_rates': '1e308'}, {'interest_rates': 'inf'},
+                       {'tenures': ','.join(['12'] * 101), 'interest_rates': ','.join(['10'] * 100)}):
+            self.assertEqual(self.offers(**params).status_code, 400, params)
+
+
+class CheckEligibilityBatchTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        rich = make_customer('1', monthly_salary=200000)
+        poor = make_customer('2', monthly_salary=20000)
+        for i in range(3):
+            make_loan(rich, f'r{i}', loan_amount=300000)
+        make_loan(poor, 'p0', loan_amount=200000)
+        self.applications = [
+            {'customer_id': '2', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12},
+            {'customer_id': '404', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12},
+            {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12},
+            {'customer_id': '1', 'loan_amount': 'lots', 'interest_rate': 10, 'tenure': 12},
+        ]
+
+    def post(self, path_suffix=''):
+        return self.client.post(
+            reverse('check-eligibility-batch') + path_suffix,
+            self.applications,
+            content_type='application/json',
+        )
+
+    def test_results_in_request_order_with_constant_queries(self):
+        with self.assertNumQueries(1):
+            response = self.post()
+
+        results = response.data
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0]['reason'], 'Total EMI exceeds 50% of monthly salary')
+        self.assertEqual(results[1], {'customer_id': '404', 'error': 'Customer not found'})
+        self.assertTrue(results[2]['approval'])
+        self.assertIn('loan_amount', results[3]['error'])
+
+    def test_terms_are_bounded(self):
+        self.applications = [
+            {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 100000},
+            {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 1e308, 'tenure': 12},
+        ]
+
+        results = self.post().data
+        self.assertIn('tenure', results[0]['error'])
+        self.assertIn('interest_rate', results[1]['error'])
+
+    def test_agrees_with_single_endpoint(self):
+        results = self.post().data
+        for application, result in zip(self.applications[::2], results[::2]):
+            single = self.client.post(reverse('check-eligibility'), application, content_type='application/json')
+            self.assertEqual(single.data, result)
+
+    def test_streams_json_lines(self):
+        response = self.post('?stream=1')
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(json.dumps(self.post().data)))
+
+
+class ScheduleViewTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer()
+        make_loan(customer, '7', loan_amount=100000, interest_rate=10.0, tenure=12)
+        make_loan(customer, '8', loan_amount=360000, interest_rate=0, tenure=360)
+
+    def test_streams_json_lines(self):
+        response = self.client.get(reverse('loan-schedule', args=[7]))
+
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], {
+            'loan_id': '7', 'month': 1, 'payment': 8791.59,
+            'interest': 833.33, 'principal': 7958.26, 'balance': 92041.74,
+        })
+        self.assertEqual(rows[-1]['balance'], 0)
+
+    def test_streams_csv(self):
+        response = self.client.get(reverse('loan-schedule', args=[8]), {'output': 'csv'})
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'loan_id,month,payment,interest,principal,balance')
+        self.assertEqual(lines[1], '8,1,1000.0,0.0,1000.0,359000.0')
+        self.assertEqual(len(lines), 361)
+
+    def test_customer_export_covers_every_loan(self):
+        response = self.client.get(reverse('customer-schedules', args=['1']))
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 12 + 360)
+        self.assertEqual({row['loan_id'] for row in rows}, {'7', '8'})
+
+    def test_unknown_loan(self):
+        self.assertEqual(self.client.get(reverse('loan-schedule', args=[404])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('customer-schedules', args=['404'])).status_code, 404)
+
+
+class CreditProfileCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(self.customer, str(i), loan_amount=300000)
+
+    def check(self):
+        return self.client.post(reverse('check-eligibility'), {
+            'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12,
+        }, content_type='application/json')
+
+    def test_second_check_is_a_hit(self):
+        before = cache_stats()
+        with self.assertNumQueries(1):
+            first = self.check()
+        with self.assertNumQueries(0):
+            second = self.check()
+
+        self.assertEqual(first.data, second.data)
+        after = cache_stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    def test_loan_writes_invalidate(self):
+        self.assertEqual(get_credit_profile('1').customer.loan_count, 3)
+
+        loan = make_loan(self.customer, '3')
+        self.assertEqual(get_credit_profile('1').customer.loan_count, 4)
+
+        loan.delete()
+        rebuild_loan_stats([self.customer.pk])
+        self.assertEqual(get_credit_profile('1').customer.loan_count, 3)
+
+    def test_customer_writes_invalidate(self):
+        self.assertGreater(get_credit_profile('1').credit_score, 0)
+
+        self.customer.approved_limit = 1000
+        self.customer.save()
+
+        self.assertEqual(get_credit_profile('1').credit_score, 0)
+
+    def test_create_loan_uses_the_cached_score_until_the_loan_book_changes(self):
+        self.check()
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as booked:
+                self.client.post(reverse('create_loan'), {
+                    'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12,
+                }, content_type='application/json')
+        # Scored from the cache: no aggregate over the loan book.
+        self.assertFalse([query for query in booked if 'COUNT(' in query['sql']])
+        # Booking the loan dropped the profile, so the next read sees it.
+        self.assertEqual(get_credit_profile('1').customer.loan_count, 4)
+
+        # A snapshot that disagrees with the locked row is not trusted.
+        caches[CACHE_ALIAS].set(profile_key('1'), get_credit_profile('1')._replace(credit_score=0))
+        Customer.objects.filter(pk=self.customer.pk).update(loan_count=F('loan_count') + 1)
+        response = self.client.post(reverse('create_loan'), {
+            'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12,
+        }, content_type='application/json')
+        self.assertNotEqual(response.data['message'], 'Low credit score')
+
+    def test_stats_endpoint(self):
+        response = self.client.get(reverse('credit-profile-cache'))
+        self.assertEqual(set(response.data), {'hits', 'misses', 'invalidations', 'hit_ratio'})
+
+
+class LoanStatsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_customer()
+
+    def stored_stats(self):
+        return Customer.objects.filter(pk=self.customer.pk).values(*STAT_FIELDS).get()
+
+    def test_incremental_updates_match_full_aggregation(self):
+        this_year = date.today().year
+        make_loan(self.customer, '1', start_date=date(2015, 3, 1))
+        make_loan(self.customer, '2', loan_amount=250000.5, emis_paid_on_time=3, start_date=date(this_year, 1, 1))
+        make_loan(self.customer, '3', interest_rate=0, start_date=date(this_year, 2, 1))
+        make_loan(self.customer, '4', start_date=date(2016, 3, 1))
+
+        stats = self.stored_stats()
+        self.assertEqual(stats, aggregate_loan_stats([self.customer.pk])[self.customer.pk])
+        self.assertEqual(stats['loan_count'], 4)
+        self.assertEqual(stats['loans_paid_on_time'], 3)
+        self.assertEqual(stats['last_loan_year'], this_year)
+        self.assertEqual(stats['last_year_loan_count'], 2)
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        make_loan(self.customer, '1')
+        Customer.objects.filter(pk=self.customer.pk).update(loan_count=7)
+
+        with self.assertRaisesMessage(CommandError, '1 drifted'):
+            call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+        call_command('rebuild_loan_stats', stdout=StringIO())
+        call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+
+        self.assertEqual(self.stored_stats()['loan_count'], 1)
+
+    def test_ingest_maintains_counters(self):
+        call_command('ingest_data', stdout=StringIO())
+        call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+
+
+class CreateLoanTests(TestCase):
+    def test_creates_loan_and_updates_counters(self):
+        customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+
+        response = self.client.post(
+            reverse('create_loan'),
+            {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        loan = Loan.objects.get(loan_id=response.data['loan_id'])
+        self.assertEqual(loan.loan_id, '3')
+        self.assertEqual(loan.monthly_repayment, emi_decimal(50000, 16, 12))
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_debt, 50000)
+        self.assertEqual(customer.loan_count, 4)
+        self.assertEqual(
+            Customer.objects.filter(pk=customer.pk).values(*STAT_FIELDS).get(),
+            aggregate_loan_stats([customer.pk])[customer.pk],
+        )
+
+    def test_invalid_applications_are_rejected_before_booking(self):
+        customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+        body = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12}
+
+        for fields in ({'loan_amount': None}, {'loan_amount': -100000}, {'loan_amount': 0}, {'tenure': 0},
+                       {'interest_rate': 'nan'}, {'interest_rate': 1e308}):
+            request = {name: value for name, value in dict(body, **fields).items() if value is not None}
+            response = self.client.post(reverse('create_loan'), request, content_type='application/json')
+            self.assertEqual(response.status_code, 400, fields)
+            self.assertIn('error', response.json())
+
+        customer.refresh_from_db()
+        self.assertEqual((customer.loan_count, customer.current_debt), (3, 0))
+
+    def post_loan(self, key, **fields):
+        body = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12}
+        body.update(fields)
+        return self.client.post(
+            reverse('create_loan'), body, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_idempotency_key_replays_without_booking_twice(self):
+        customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+
+        first = self.post_loan('retry-1')
+        second = self.post_loan('retry-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.filter(customer=customer).count(), 4)
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_debt, 50000)
+
+    def test_idempotency_key_reused_for_other_request_is_rejected(self):
+        customer = make_customer(monthly_salary=200000)
+        for i in range(3):
+            make_loan(customer, str(i), loan_amount=300000)
+
+        self.post_loan('retry-1')
+        response = self.post_loan('retry-1', loan_amount=60000)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Loan.objects.filter(customer=customer).count(), 4)
+
+
+class ConcurrentCreateLoanTests(TransactionTestCase):
+    """Many threads booking loans for one customer at once, each on its own connection."""
+    THREADS = 20
+
+    def setUp(self):
+        # Room for exactly five 50000 loans: the limit is checked against the
+        # debt before each loan.
+        self.customer = make_customer(monthly_salary=200000, approved_limit=200000)
+        for i in range(3):
+            make_loan(self.customer, str(i), loan_amount=300000)
+
+    def post_concurrently(self, keys):
+        barrier = threading.Barrier(len(keys))
+        responses = [None] * len(keys)
+
+        def post(i):
+            try:
+                barrier.wait()
+                responses[i] = self.client_class().post(
+                    reverse('create_loan'),
+                    {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12},
+                    content_type='application/json',
+                    HTTP_IDEMPOTENCY_KEY=keys[i],
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(i,)) for i in range(len(keys))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_no_lost_debt_updates(self):
+        responses = self.post_concurrently([f'load-{i}' for i in range(self.THREADS)])
+
+        self.assertTrue(all(response.status_code in (200, 201) for response in responses))
+        booked = [response for response in responses if response.status_code == 201]
+        self.assertEqual(len(booked), 5)
+        self.assertEqual(len({response.data['loan_id'] for response in booked}), 5)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, 250000)
+        self.assertEqual(self.customer.loan_count, 8)
+        self.assertEqual(
+            Customer.objects.filter(pk=self.customer.pk).values(*STAT_FIELDS).get(),
+            aggregate_loan_stats([self.customer.pk])[self.customer.pk],
+        )
+        self.assertEqual(IdempotencyKey.objects.count(), self.THREADS)
+
+    def test_concurrent_retries_book_once(self):
+        responses = self.post_concurrently(['same-key'] * self.THREADS)
+
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.data['loan_id'] for response in responses}), 1)
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 4)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, 50000)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_request_mix_covers_every_endpoint(self):
+        make_loan(make_customer(), '1')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mix.jsonl')
+            write_requests(path, request_mix(200, seed=1))
+            entries = read_requests(path)
+
+        self.assertEqual(len(entries), 200)
+        self.assertEqual({endpoint_name(entry['path']) for entry in entries}, set(MIX_WEIGHTS))
+        self.assertEqual(entries, request_mix(200, seed=1))
+
+    def test_results_compared_with_previous_run(self):
+        params = {'requests': 100}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            first = record_and_compare(path, 'replay', params, {'rps': 100.0, 'p99_ms': 10.0}, 0.1)
+            other = record_and_compare(path, 'replay', {'requests': 5}, {'rps': 1.0}, 0.1)
+            second = record_and_compare(path, 'replay', params, {'rps': 80.0, 'p99_ms': 10.5}, 0.1)
+
+        self.assertEqual(first, (None, {}))
+        self.assertEqual(other, (None, {}))
+        previous, worse = second
+        self.assertEqual(previous['metrics']['rps'], 100.0)
+        self.assertEqual(worse, {'rps': (100.0, 80.0)})
+
+
+class ReplayRequestsTests(LiveServerTestCase):
+    eligibility = {'customer_id': '1', 'loan_amount': 50000, 'interest_rate': 10, 'tenure': 12}
+
+    def setUp(self):
+        make_loan(make_customer(), '1')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_replays_mix_and_stores_result(self):
+        mix, results = os.path.join(self.directory.name, 'mix.jsonl'), os.path.join(self.directory.name, 'results.jsonl')
+        write_requests(mix, [entry for entry in request_mix(40) if entry['method'] == 'GET'])
+        out = StringIO()
+        call_command('replay_requests', mix, base_url=self.live_server_url, concurrency=2,
+                     results=results, stdout=out)
+        with open(results) as f:
+            stored = [json.loads(line) for line in f]
+
+        self.assertIn('view_loan', out.getvalue())
+        self.assertEqual(stored[0]['metrics']['errors'], 0)
+        self.assertEqual(stored[0]['metrics']['requests'], stored[0]['params']['requests'])
+
+    def test_captured_traffic_replays_with_same_responses(self):
+        path = os.path.join(self.directory.name, 'requests-{pid}.jsonl')
+        with self.settings(CAPTURE_ENABLED=True, CAPTURE_SAMPLE_RATE=1, CAPTURE_PATH=path):
+            client = Client()
+            viewed = client.get(reverse('view_loan', args=[1]))
+            client.get(reverse('customer-loans', args=['1']), {'limit': 1})
+            client.post(reverse('check-eligibility'), self.eligibility, content_type='application/json')
+            get_writer().flush()
+        captured = path.format(pid=os.getpid())
+        entries = read_requests(captured)
+
+        self.assertEqual([entry['path'] for entry in entries][:2], ['/api/view-loan/1/', '/api/view-loans/1/?limit=1'])
+        self.assertEqual(entries[0]['response_digest'], response_digest(viewed.content))
+        self.assertEqual(entries[2]['body'], self.eligibility)
+
+        out = StringIO()
+        call_command('replay_requests', captured, base_url=self.live_server_url, rate=50, no_store=True, stdout=out)
+        self.assertIn('vs capture', out.getvalue())
+        self.assertRegex(out.getvalue(), r'check-eligibility +0 +0 ')
+
+
+class CaptureWriterTests(TestCase):
+    def test_rotates_and_keeps_backup_count_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'requests.jsonl')
+            writer = CaptureWriter(path, max_bytes=200, backup_count=2)
+            for i in range(30):
+                writer.submit({'method': 'GET', 'path': f'/api/view-loan/{i}/', 'body': b'', 'headers': {}})
+                writer.flush()
+            writer.close()
+
+            self.assertEqual(sorted(os.listdir(directory)), ['requests.jsonl', 'requests.jsonl.1', 'requests.jsonl.2'])
+            newest = read_requests(path) or read_requests(path + '.1')
+            self.assertEqual(newest[-1]['path'], '/api/view-loan/29/')
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        customer = make_customer()
+        make_loan(customer, '1')
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(reverse('admin:loanapp_loan_changelist'))
+        for i in range(2, 6):
+            make_loan(make_customer(str(i)), str(i))
+
+        with self.assertNumQueries(len(one)):
+            response = self.client.get(reverse('admin:loanapp_loan_changelist'))
+        self.assertContains(response, 'Aaron Garcia', count=5)
+
+    def test_estimated_and_capped_counts(self):
+        for i in range(1, 6):
+            make_customer(str(i), loan_count=i % 2)
+        Customer.objects.filter(customer_id='2').delete()
+
+        with mock.patch('loanapp.admin.EXACT_COUNT_LIMIT', 2):
+            # The estimate still counts the deleted row.
+            self.assertEqual(EstimatedCountPaginator(Customer.objects.order_by('pk'), 100).count, 5)
+            self.assertEqual(EstimatedCountPaginator(Customer.objects.filter(loan_count=1).order_by('pk'), 100).count, 2)
+        self.assertEqual(EstimatedCountPaginator(Customer.objects.order_by('pk'), 100).count, 4)
+
+    def test_search(self):
+        garcia = make_customer('11')
+        make_loan(garcia, '12')
+        make_loan(make_customer('12', first_name='Dev', last_name='Patel'), '11')
+
+        def found(params):
+            response = self.client.get(reverse('admin:loanapp_loan_changelist'), params)
+            return sorted(loan.loan_id for loan in response.context['cl'].result_list)
+
+        self.assertEqual(found({'q': 'gar'}), ['12'])
+        self.assertEqual(found({'q': '11'}), ['11', '12'])  # loan 11, and customer 11's loan
+        self.assertEqual(found({'q': 'arcia'}), [])
+        self.assertEqual(found({'q': 'pat 11'}), ['11'])
+
+    def test_customer_autocomplete(self):
+        make_customer('1')
+        make_customer('2', last_name='Lee')
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'loanapp', 'model_name': 'loan', 'field_name': 'customer', 'term': 'le',
+        })
+
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Aaron Lee'])
+
+    def test_csv_export_streams(self):
+        customer = make_customer()
+        for i in range(3):
+            make_loan(customer, str(i))
+
+        response = self.client.post(reverse('admin:loanapp_loan_changelist'), {
+            'action': 'export_csv', 'select_across': '1', 'index': '0', '_selected_action': ['1'],
+        })
+
+        self.assertTrue(response.streaming)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], ','.join(LoanAdmin.csv_fields))
+        self.assertEqual(rows[1], '0,1,100000.00,12,10.0,8792.00,12,2015-01-01,2016-01-01,True')
+        self.assertEqual(len(rows), 4)
+
+
+@override_settings(READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        reset_replica_health()
+        self.addCleanup(reset_replica_health)
+        # Customer 1 with loan 1 on both; loan 2 only on the primary, as if
+        # the replica had not caught up with it yet.
+        for alias in ('default', 'replica'):
+            customer = Customer.objects.using(alias).create(
+                customer_id='1', first_name='Aaron', last_name='Garcia', age=40, phone_number='9629317944',
+                monthly_salary=100000, approved_limit=1000000, current_debt=0,
+            )
+            for loan_id in ('1', '2') if alias == 'default' else ('1',):
+                Loan.objects.using(alias).create(
+                    customer=customer, loan_id=loan_id, loan_amount=500000, tenure=12, interest_rate=10,
+                    monthly_repayment=8792, emis_paid_on_time=12, start_date=date(2015, 1, 1),
+                    end_date=date(2016, 1, 1), loan_approved=True,
+                )
+
+    def view_loan(self, loan_id):
+        return self.client.get(reverse('view_loan', args=[loan_id])).status_code
+
+    def test_read_only_views_read_from_the_replica(self):
+        self.assertEqual(self.view_loan(1), 200)
+        self.assertEqual(self.view_loan(2), 404)
+        self.assertEqual(self.client.get(reverse('async-view-loan', args=[2])).status_code, 404)
+        self.assertEqual(len(self.client.get(reverse('customer-loans', args=['1'])).json()), 1)
+
+    async def test_replica_reads_under_asgi(self):
+        # Both the health check and the reads run on the async path.
+        self.assertEqual((await self.async_client.get(reverse('view_loan', args=[2]))).status_code, 404)
+        self.assertEqual((await self.async_client.get(reverse('async-view-loan', args=[2]))).status_code, 404)
+        self.assertEqual((await self.async_client.get(reverse('async-view-loan', args=[1]))).status_code, 200)
+
+    def test_writes_and_other_reads_use_the_primary(self):
+        self.assertEqual(Loan.objects.count(), 2)
+        with replica_reads():
+            self.assertEqual(Loan.objects.count(), 1)
+            with transaction.atomic():
+                self.assertEqual(Loan.objects.count(), 2)
+
+        response = self.client.post(reverse('create_loan'), {
+            'customer_id': '1', 'loan_amount': 10000, 'interest_rate': 14, 'tenure': 12,
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['loan_id'], '3')
+        self.assertFalse(Loan.objects.using('replica').filter(loan_id='3').exists())
+
+    def test_writing_client_reads_its_writes(self):
+        self.client.post(reverse('register_customer'), {
+            'first_name': 'Abbie', 'last_name': 'Rodrigues', 'age': 35, 'monthly_income': 75000,
+            'phone_number': '9876543210',
+        }, content_type='application/json')
+        self.assertEqual(self.view_loan(2), 200)
+
+        # Another client, and a check-eligibility POST, which only reads, don't pin.
+        self.client = Client()
+        response = self.client.post(reverse('check-eligibility'), {
+            'customer_id': '1', 'loan_amount': 10000, 'interest_rate': 14, 'tenure': 12,
+        }, content_type='application/json')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(self.view_loan(2), 404)
+
+    def test_falls_back_to_the_primary(self):
+        with mock.patch('loanapp.routers.replication_lag', side_effect=OperationalError('unreachable')), \
+                self.assertLogs('loanapp.routers', 'WARNING'):
+            self.assertEqual(self.view_loan(2), 200)
+        # Still failed until the next check.
+        self.assertEqual(self.view_loan(2), 200)
+
+        reset_replica_health()
+        with mock.patch('loanapp.routers.replication_lag', return_value=30), self.assertLogs('loanapp.routers') as logs:
+            self.assertEqual(self.view_loan(2), 200)
+        self.assertIn('lags 30.0s', logs.output[0])
+        with override_settings(REPLICA_CHECK_INTERVAL=0), mock.patch('loanapp.routers.replication_lag', return_value=1):
+            self.assertEqual(self.view_loan(2), 404)
+
+
+@override_settings(SHARDS=['default', 'shard_1'])
+class ShardingTests(TransactionTestCase):
+    databases = {'default', 'shard_1', 'shard_2'}
+
+    @staticmethod
+    def customers_on(alias):
+        with use_shard(alias):
+            return set(Customer.objects.values_list('customer_id', flat=True))
+
+    @staticmethod
+    def loans_on(alias):
+        with use_shard(alias):
+            return set(Loan.objects.values_list('loan_id', flat=True))
+
+    def make_borrower(self, customer_id, loan_id):
+        with customer_shard(customer_id):
+            customer = make_customer(customer_id, monthly_salary=200000)
+            make_loan(customer, loan_id, loan_amount=500000)
+
+    def test_adding_a_shard_only_moves_customers_onto_it(self):
+        ids = range(1, 3001)
+        two = [shard_for(customer_id, ['default', 'shard_1']) for customer_id in ids]
+        three = [shard_for(customer_id, ['default', 'shard_1', 'shard_2']) for customer_id in ids]
+
+        moved = [after for before, after in zip(two, three) if before != after]
+        self.assertEqual(set(moved), {'shard_2'})
+        self.assertAlmostEqual(len(moved) / len(ids), 1 / 3, delta=0.05)
+        self.assertAlmostEqual(two.count('default') / len(ids), 1 / 2, delta=0.05)
+        self.assertEqual(shard_for(7), shard_for('7'))
+
+    def test_sharded_models_need_a_shard(self):
+        with self.assertRaisesMessage(RuntimeError, 'No shard selected for loanapp.Customer'):
+            Customer.objects.count()
+        # Unsharded bookkeeping stays on "default".
+        self.assertEqual(SourceFingerprint.objects.count(), 0)
+
+    def test_endpoints_route_each_customer_to_its_shard(self):
+        first, second = '1', next(str(n) for n in range(2, 100) if shard_for(n) != shard_for('1'))
+        self.make_borrower(first, '1')
+        self.make_borrower(second, '2')
+
+        created = [
+            self.client.post(reverse('create_loan'), {
+                'customer_id': customer_id, 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12,
+            }, content_type='application/json')
+            for customer_id in (first, second, first)
+        ]
+        self.assertEqual([response.status_code for response in created], [201, 201, 201])
+        loan_ids = [response.json()['loan_id'] for response in created]
+        self.assertEqual(len(set(loan_ids)), 3)
+        for customer_id, loan_id in zip((first, second, first), loan_ids):
+            self.assertIn(loan_id, self.loans_on(shard_for(customer_id)))
+
+        for customer_id, loan_id in ((first, loan_ids[0]), (second, loan_ids[1])):
+            detail = self.client.get(reverse('view_loan', args=[loan_id]))
+            self.assertEqual(detail.json()['customer']['customer_id'], customer_id)
+            self.assertEqual(self.client.get(reverse('async-view-loan', args=[loan_id])).status_code, 200)
+        self.assertEqual(len(self.client.get(reverse('customer-loans', args=[first])).json()), 3)
+        eligibility = self.client.post(reverse('check-eligibility'), {
+            'customer_id': second, 'loan_amount': 10000, 'interest_rate': 16, 'tenure': 12,
+        }, content_type='application/json')
+        self.assertEqual(eligibility.json()['customer_id'], second)
+        batch = self.client.post(reverse('check-eligibility-batch'), [
+            {'customer_id': customer_id, 'loan_amount': 10000, 'interest_rate': 16, 'tenure': 12}
+            for customer_id in (second, first, '999')
+        ], content_type='application/json').json()
+        self.assertEqual([result['customer_id'] for result in batch], [second, first, '999'])
+        self.assertEqual(batch[2]['error'], 'Customer not found')
+
+    def test_registration_spreads_customers_over_the_shards(self):
+        registered = self.client.post(reverse('register_customers_bulk'), [
+            {'first_name': 'Abbie', 'last_name': f'R{n}', 'age': 35, 'monthly_income': 75000, 'phone_number': '98765'}
+            for n in range(20)
+        ], content_type='application/json').json()
+        single = self.client.post(reverse('register_customer'), {
+            'first_name': 'Abbie', 'last_name': 'R', 'age': 35, 'monthly_income': 75000, 'phone_number': '98765',
+        }, content_type='application/json').json()
+
+        self.assertEqual([customer['customer_id'] for customer in registered], [str(n) for n in range(1, 21)])
+        self.assertEqual(single['customer_id'], '21')
+        for alias in ('default', 'shard_1'):
+            self.assertEqual(self.customers_on(alias), {str(n) for n in range(1, 22) if shard_for(n) == alias})
+
+    def test_ingest_and_rebalance_onto_a_new_shard(self):
+        call_command('ingest_data', chunk_size=100, stdout=StringIO())
+
+        customers = self.customers_on('default') | self.customers_on('shard_1')
+        self.assertEqual(len(customers), 300)
+        self.assertEqual(len(self.loans_on('default') | self.loans_on('shard_1')), 753)
+        with use_shard('shard_1'):
+            self.assertTrue(all(shard_for(loan.customer.customer_id) == 'shard_1' for loan in Loan.objects.all()))
+        call_command('rebuild_loan_stats', stdout=StringIO())
+
+        three = ['default', 'shard_1', 'shard_2']
+        with override_settings(SHARDS=three):
+            dry_run = StringIO()
+            call_command('rebalance_shards', dry_run=True, stdout=dry_run)
+            self.assertEqual(self.customers_on('shard_2'), set())
+            out = StringIO()
+            call_command('rebalance_shards', batch_size=50, stdout=out)
+            again = StringIO()
+            call_command('rebalance_shards', stdout=again)
+
+            self.assertIn('Would move', dry_run.getvalue())
+            self.assertIn('Moved 0 customers', again.getvalue())
+            for alias in three:
+                self.assertEqual(self.customers_on(alias), {c for c in customers if shard_for(c, three) == alias})
+            self.assertTrue(self.customers_on('shard_2'))
+            self.assertEqual(sum(len(self.loans_on(alias)) for alias in three), 753)
+            # Counters moved with the rows, so they still match the loans.
+            call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+            self.assertEqual(self.client.get(reverse('view_loan', args=[5930])).json()['customer']['customer_id'], '14')
+
+    def test_rebalance_moves_idempotency_keys_with_their_customer(self):
+        three = ['default', 'shard_1', 'shard_2']
+        customer_id = next(str(n) for n in range(1, 100) if shard_for(n, three) == 'shard_2')
+        old_shard = shard_for(customer_id)
+        self.make_borrower(customer_id, '1')
+        body = {'customer_id': customer_id, 'loan_amount': 50000, 'interest_rate': 16, 'tenure': 12}
+
+        def book():
+            return self.client.post(
+                reverse('create_loan'), body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1',
+            )
+
+        first = book()
+        self.assertEqual(first.status_code, 201)
+        with override_settings(SHARDS=three):
+            call_command('rebalance_shards', stdout=StringIO())
+            retried = book()
+
+            self.assertEqual(retried.json(), first.json())
+            self.assertEqual(retried['Idempotent-Replayed'], 'true')
+            self.assertEqual(len(self.loans_on('shard_2')), 2)
+            with use_shard(old_shard):
+                self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_reingest_moves_a_loan_to_its_new_customers_shard(self):
+        moved_to = next(str(n) for n in range(1, 300) if shard_for(n) != shard_for('14'))
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('convert_data_files', to='csv', output_dir=directory, stdout=StringIO())
+            customers, loans = (os.path.join(directory, name) for name in ('customer_data.csv', 'loan_data.csv'))
+            call_command('ingest_data', customers=customers, loans=loans, chunk_size=100, stdout=StringIO())
+            call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+            self.assertIn('5930', self.loans_on(shard_for('14')))
+            df = pd.read_csv(loans)
+            df.loc[df['Loan ID'] == 5930, 'Customer ID'] = int(moved_to)
+            df.to_csv(loans, index=False)
+
+            call_command('ingest_data', customers=customers, loans=loans, chunk_size=100, stdout=StringIO())
+
+        self.assertNotIn('5930', self.loans_on(shard_for('14')))
+        self.assertIn('5930', self.loans_on(shard_for(moved_to)))
+        self.assertEqual(len(self.loans_on('default') | self.loans_on('shard_1')), 753)
+        call_command('rebuild_loan_stats', check=True, stdout=StringIO())
+
+    def test_maintenance_commands_and_admin_work_per_shard(self):
+        call_command('seed_data', customers=20, loans=60, chunk_size=15, stdout=StringIO())
+        for alias in ('default', 'shard_1'):
+            self.assertEqual(
+                self.customers_on(alias), {str(n) for n in range(1, 21) if shard_for(n) == alias}
+            )
+            with use_shard(alias):
+                self.assertTrue(all(shard_for(loan.customer.customer_id) == alias for loan in Loan.objects.all()))
+        self.assertEqual(sum(len(self.loans_on(alias)) for alias in ('default', 'shard_1')), 60)
+        with use_shard('shard_1'):
+            Loan.objects.update(monthly_repayment=1)
+
+        call_command('recompute_emis', stdout=StringIO())
+        call_command('rescore_portfolio', workers=1, stdout=StringIO())
+        call_command('benchmark_queries', repeat=1, no_drop=True, stdout=StringIO())
+
+        for alias in ('default', 'shard_1'):
+            with use_shard(alias):
+                self.assertFalse(Loan.objects.filter(monthly_repayment=1).exists())
+                run = ScoringRun.objects.get()
+                self.assertEqual(run.scores.count(), Customer.objects.count())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        for alias in ('default', 'shard_1'):
+            response = self.client.get(reverse('admin:loanapp_customer_changelist'), {'shard': alias})
+            listed = {customer.customer_id for customer in response.context['cl'].result_list}
+            self.assertEqual(listed, self.customers_on(alias))
+            with use_shard(alias):
+                loan = Loan.objects.first()
+            change = self.client.get(
+                reverse('admin:loanapp_loan_change', args=[loan.pk]), {'_changelist_filters': f'shard={alias}'},
+            )
+            self.assertContains(change, loan.loan_id)
+
+    def test_benchmark_adds_shards(self):
+        out = StringIO()
+        call_command('benchmark_shards', shards=2, customers=20, requests=20, concurrency=2, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[-2:]], ['1', '2'])
+        self.assertEqual([line.split()[-1] for line in lines[-2:]], ['0', '0'])
+
+
+class ProductionSettingsTests(TestCase):
+    def load_settings(self, **env):
+        env = {'DJANGO_SECRET_KEY': 'test-key', 'DJANGO_ALLOWED_HOSTS': 'api.example.com', **env}
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_module('loanproject.settings_production')
+
+    def test_secret_key_and_allowed_hosts_are_required(self):
+        for name in ('DJANGO_SECRET_KEY', 'DJANGO_ALLOWED_HOSTS'):
+            with self.subTest(name=name), self.assertRaisesMessage(ImproperlyConfigured, name):
+                self.load_settings(**{name: ''})
+
+        settings = self.load_settings(DJANGO_ALLOWED_HOSTS='api.example.com,www.example.com')
+        self.assertEqual(settings['SECRET_KEY'], 'test-key')
+        self.assertEqual(settings['ALLOWED_HOSTS'], ['api.example.com', 'www.example.com'])
+
+    def test_sqlite_by_default_with_persistent_connections(self):
+        settings = self.load_settings()
+
+        database = settings['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertGreater(database['CONN_MAX_AGE'], 0)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(settings['DEBUG'])
+        self.assertEqual(settings['SQLITE_PRAGMAS']['journal_mode'], 'WAL')
+
+    def test_postgresql_from_environment(self):
+        settings = self.load_settings(DB_ENGINE='postgresql', POSTGRES_HOST='db', DB_POOLER='pgbouncer')
+
+        database = settings['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['HOST'], 'db')
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_read_replicas_from_environment(self):
+        settings = self.load_settings(DB_ENGINE='postgresql', POSTGRES_HOST='db', POSTGRES_REPLICA_HOSTS='db2,db3:6432')
+
+        self.assertEqual(settings['READ_REPLICAS'], ['replica_1', 'replica_2'])
+        self.assertEqual(settings['DATABASES']['replica_1']['HOST'], 'db2')
+        self.assertEqual(
+            (settings['DATABASES']['replica_2']['HOST'], settings['DATABASES']['replica_2']['PORT']), ('db3', '6432'),
+        )
+        self.assertEqual(self.load_settings()['READ_REPLICAS'], [])
+
+    def test_shards_from_environment(self):
+        settings = self.load_settings(SQLITE_SHARD_PATHS='/data/shard1.sqlite3,/data/shard2.sqlite3')
+
+        self.assertEqual(settings['SHARDS'], ['default', 'shard_1', 'shard_2'])
+        self.assertEqual(settings['DATABASES']['shard_2']['NAME'], '/data/shard2.sqlite3')
+        self.assertEqual(settings['READ_REPLICAS'], [])
+        self.assertEqual(self.load_settings()['SHARDS'], [])
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -4096})
+    def test_pragmas_applied_to_new_connections(self):
+        apply_sqlite_pragmas(sender=type(connection), connection=connection)
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4096)
+
+
+def make_scoring_portfolio():
+    """Customers covering each branch of the credit score."""
+    this_year = date.today().year
+    plain = make_customer('1')
+    for i in range(3):
+        make_loan(plain, f'p{i}', loan_amount=300000)
+    on_time = make_customer('2')
+    make_loan(on_time, 'o1', emis_paid_on_time=1)
+    make_loan(on_time, 'o2', start_date=date(this_year, 1, 1), end_date=date(this_year + 1, 1, 1))
+    over_limit = make_customer('3', approved_limit=5000)
+    make_loan(over_limit, 'x1', monthly_repayment=6000)
+    make_customer('4')
+    return [plain, on_time, over_limit]
+
+
+class RescorePortfolioTests(TestCase):
+    def rescore(self, **options):
+        call_command('rescore_portfolio', stdout=StringIO(), workers=1, **options)
+        return ScoringRun.objects.latest('pk')
+
+    def test_snapshot_matches_calculate_credit_score(self):
+        plain, on_time, over_limit = make_scoring_portfolio()
+
+        run = self.rescore(chunk_size=2)
+
+        self.assertIsNotNone(run.finished_at)
+        snapshot = dict(run.scores.values_list('customer_id', 'credit_score'))
+        expected = {pk: calculate_credit_score(pk) for pk in Customer.objects.values_list('pk', flat=True)}
+        self.assertEqual(snapshot, expected)
+        self.assertEqual(snapshot[over_limit.pk], 0)
+        self.assertNotEqual(snapshot[plain.pk], snapshot[on_time.pk])
+
+    def test_resume_scores_only_missing_customers(self):
+        customers = make_scoring_portfolio()
+        run = ScoringRun.objects.create(score_year=date.today().year)
+        CreditScoreSnapshot.objects.create(run=run, customer=customers[0], credit_score=-1)
+
+        resumed = self.rescore(resume=True)
+
+        self.assertEqual(resumed.pk, run.pk)
+        self.assertEqual(run.scores.count(), Customer.objects.count())
+        self.assertEqual(run.scores.get(customer=customers[0]).credit_score, -1)
+        with self.assertRaises(CommandError):
+            self.rescore(resume=True)
+
+
+class RescorePortfolioPoolTests(TransactionTestCase):
+    def test_process_pool_matches_in_process_scores(self):
+        make_scoring_portfolio()
+
+        call_command('rescore_portfolio', stdout=StringIO(), workers=2, chunk_size=1)
+
+        run = ScoringRun.objects.get()
+        expected = {pk: calculate_credit_score(pk) for pk in Customer.objects.values_list('pk', flat=True)}
+        self.assertEqual(dict(run.scores.values_list('customer_id', 'credit_score')), expected)
+
+    def test_workers_fork_whatever_the_default_start_method(self):
+        make_scoring_portfolio()
+        default = multiprocessing.get_start_method()
+        self.addCleanup(multiprocessing.set_start_method, default, force=True)
+        multiprocessing.set_start_method('spawn', force=True)
+
+        call_command('rescore_portfolio', stdout=StringIO(), workers=2, chunk_size=1)
+
+        self.assertEqual(ScoringRun.objects.get().scores.count(), Customer.objects.count())
@@ -1,10 +1,24 @@
 from django.urls import path
-from .views import RegisterCustomerView, CheckEligibilityView,CreateLoanView,LoanDetailView,CustomerLoansView
+from .metrics import metrics_view
+from .async_views import AsyncCheckEligibilityView, AsyncCustomerLoansView, AsyncLoanDetailView
+from .views import RegisterCustomerView, RegisterCustomersBulkView, CheckEligibilityView, CheckEligibilityBatchView,CreateLoanView,LoanOffersView,LoanDetailView,CustomerLoansView, LoanScheduleView, CustomerSchedulesView, CreditProfileCacheView
 
 urlpatterns = [
     path('register/', RegisterCustomerView.as_view(), name='register_customer'),
+    path('register/bulk/', RegisterCustomersBulkView.as_view(), name='register_customers_bulk'),
     path('check-eligibility/', CheckEligibilityView.as_view(), name='check-eligibility'),
+    path('check-eligibility/batch/', CheckEligibilityBatchView.as_view(), name='check-eligibility-batch'),
+    path('loan-offers/', LoanOffersView.as_view(), name='loan-offers'),
     path('create-loan/', CreateLoanView.as_view(), name='create_loan'),  # Add this line
     path('view-loan/<int:loan_id>/', LoanDetailView.as_view(), name='view_loan'),
+    path('view-loan/<int:loan_id>/schedule/', LoanScheduleView.as_view(), name='loan-schedule'),
     path('view-loans/<str:customer_id>/', CustomerLoansView.as_view(), name='customer-loans'),
+    path('view-loans/<str:customer_id>/schedules/', CustomerSchedulesView.as_view(), name='customer-schedules'),
+    path('credit-profile-cache/', CreditProfileCacheView.as_view(), name='credit-profile-cache'),
+    path('metrics', metrics_view, name='metrics'),
+
+    # Async variants of the read paths, for serving under ASGI
+    path('async/check-eligibility/', AsyncCheckEligibilityView.as_view(), name='async-check-eligibility'),
+    path('async/view-loan/<int:loan_id>/', AsyncLoanDetailView.as_view(), name='async-view-loan'),
+    path('async/view-loans/<str:customer_id>/', AsyncCustomerLoansView.as_view(), name='async-customer-loans'),
 ]
@@ -1,7 +1,16 @@
-from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime
-from .models import Loan, Customer
-from django.db.models import Sum
+import calendar
+from decimal import Decimal
+from datetime import date, datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from .emi import emi, emi_rounded
+from .models import Customer, IdCounter, Loan
+from .sharding import shard_aliases, use_shard
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, router, transaction
+from django.db.models import Count, F, IntegerField, Max, Q, Sum
+from django.db.models.functions import Cast, Greatest
 def calculate_credit_score(customer_id: int) -> int:
     """
     Calculate credit score (out of 100) based on:
@@ -11,92 +20,329 @@ def calculate_credit_score(customer_id: int) -> int:
     iv. Loan approved volume
     v. If sum of current loans > approved limit, score = 0
     """
-    try:
-        customer = Customer.objects.get(pk=customer_id)
-    except Customer.DoesNotExist:
-        return 0  # or raise error if preferred
+    return calculate_credit_scores([customer_id]).get(customer_id, 0)  # 0 if customer is missing
+
+
+def calculate_credit_scores(customer_pks) -> dict:
+    """
+    Credit scores for many customers from one query.
+
+    Returns {customer pk: score}; unknown customers are left out.
+    """
+    profiles = credit_score_aggregates(customer_pks)
+    return {profile.pop('pk'): score_from_aggregates(**profile) for profile in profiles}
+
 
-    loans = Loan.objects.filter(customer=customer)
+# pk, then score_from_aggregates' arguments, as with_credit_aggregates annotates them.
+CREDIT_AGGREGATES = (
+    'pk', 'approved_limit', 'on_time_loans', 'total_loans', 'loans_this_year',
+    'total_approved_volume', 'current_loans_sum',
+)
 
-    # Past loans paid on time (assume Loan has 'emis_paid_on_time' boolean field)
-    on_time_loans = loans.filter(emis_paid_on_time=True).count()
 
-    # Number of loans taken in past
-    total_loans = loans.count()
+def credit_score_aggregates(customer_pks):
+    """The single aggregate query behind calculate_credit_scores, as a queryset."""
+    # One query: conditional aggregates over each customer's loans, joined to
+    # the customer row for approved_limit.
+    return with_credit_aggregates(Customer.objects.filter(pk__in=customer_pks)).values(*CREDIT_AGGREGATES)
 
-    # Loan activity in current year (loans with start_date in current year)
+
+def with_credit_aggregates(customers):
+    """Annotate a Customer queryset with the loan aggregates score_from_aggregates takes."""
     current_year = datetime.now().year
-    loans_this_year = loans.filter(start_date__year=current_year).count()
+    return (
+        customers
+        .annotate(
+            # Past loans paid on time (assume Loan has 'emis_paid_on_time' boolean field)
+            on_time_loans=Count('loan', filter=Q(loan__emis_paid_on_time=True)),
+            # Number of loans taken in past
+            total_loans=Count('loan'),
+            # Loan activity in current year (loans with start_date in current year)
+            loans_this_year=Count('loan', filter=Q(loan__start_date__year=current_year)),
+            # Loan approved volume (sum of all loan amounts approved)
+            total_approved_volume=Sum('loan__loan_amount'),
+            # Sum of current loans (assume 'monthly_repayment' represents ongoing liabilities)
+            current_loans_sum=Sum('loan__monthly_repayment'),
+        )
+    )
+
+
+# Normalize each component as per some weighting (example weights, can adjust).
+# Shared by score_from_aggregates and its vectorized twin below; after tuning,
+# refresh stored scores with ``manage.py rescore_portfolio``.
+WEIGHT_ON_TIME = 0.4
+WEIGHT_LOANS_TAKEN = 0.2
+WEIGHT_ACTIVITY_YEAR = 0.1
+WEIGHT_APPROVED_VOL = 0.3
 
-    # Loan approved volume (sum of all loan amounts approved)
-    total_approved_volume = loans.aggregate(total_amount=Sum('loan_amount'))['total_amount'] or Decimal('0')
+# Each component saturates at these values.
+MAX_ON_TIME_LOANS = 10
+MAX_LOANS_TAKEN = 20
+MAX_LOANS_THIS_YEAR = 5
+MAX_APPROVED_VOLUME = 1000000
 
-    # Sum of current loans (assume 'monthly_repayment' represents ongoing liabilities)
-    current_loans_sum = loans.aggregate(total_repayment=Sum('monthly_repayment'))['total_repayment'] or Decimal('0')
+
+def score_from_aggregates(approved_limit, on_time_loans, total_loans, loans_this_year,
+                          total_approved_volume, current_loans_sum) -> int:
+    """Weighted credit score from a customer's loan aggregates."""
+    total_approved_volume = total_approved_volume or Decimal('0')
+    current_loans_sum = current_loans_sum or Decimal('0')
 
     # If current loans sum > approved_limit, credit score = 0
-    if current_loans_sum > customer.approved_limit:
+    if current_loans_sum > approved_limit:
         return 0
 
-    # Normalize each component as per some weighting (example weights, can adjust)
-    # You can tune these weights as you like
-    weight_on_time = 0.4
-    weight_loans_taken = 0.2
-    weight_activity_year = 0.1
-    weight_approved_vol = 0.3
-
     # Normalize on_time_loans (max 10 for example)
-    on_time_score = min(on_time_loans, 10) / 10  # 0 to 1
+    on_time_score = min(on_time_loans, MAX_ON_TIME_LOANS) / MAX_ON_TIME_LOANS  # 0 to 1
 
     # Normalize total loans (max 20)
-    loans_taken_score = min(total_loans, 20) / 20
+    loans_taken_score = min(total_loans, MAX_LOANS_TAKEN) / MAX_LOANS_TAKEN
 
     # Normalize loans this year (max 5)
-    activity_score = min(loans_this_year, 5) / 5
+    activity_score = min(loans_this_year, MAX_LOANS_THIS_YEAR) / MAX_LOANS_THIS_YEAR
 
     # Normalize approved volume (max 1 million)
-    approved_volume_score = float(min(total_approved_volume, Decimal('1000000'))) / 1000000
+    approved_volume_score = float(min(total_approved_volume, Decimal(MAX_APPROVED_VOLUME))) / MAX_APPROVED_VOLUME
 
     # Calculate weighted score out of 100
     credit_score = int(
-        (on_time_score * weight_on_time +
-         loans_taken_score * weight_loans_taken +
-         activity_score * weight_activity_year +
-         approved_volume_score * weight_approved_vol) * 100
+        (on_time_score * WEIGHT_ON_TIME +
+         loans_taken_score * WEIGHT_LOANS_TAKEN +
+         activity_score * WEIGHT_ACTIVITY_YEAR +
+         approved_volume_score * WEIGHT_APPROVED_VOL) * 100
     )
 
     return credit_score
 
 
-def calculate_emi(loan_amount: float, interest_rate: float, tenure: int) -> float:
+def score_from_aggregate_arrays(approved_limit_cents, on_time_loans, total_loans, loans_this_year,
+                                total_approved_volume_cents, current_loans_sum_cents) -> np.ndarray:
+    """
+    score_from_aggregates over NumPy arrays, one element per customer.
+
+    Money comes in whole cents so the limit comparison is exact; the float
+    steps match the scalar version operation for operation, so the scores
+    agree exactly.
+    """
+    on_time_score = np.minimum(on_time_loans, MAX_ON_TIME_LOANS) / MAX_ON_TIME_LOANS
+    loans_taken_score = np.minimum(total_loans, MAX_LOANS_TAKEN) / MAX_LOANS_TAKEN
+    activity_score = np.minimum(loans_this_year, MAX_LOANS_THIS_YEAR) / MAX_LOANS_THIS_YEAR
+    approved_volume_score = np.minimum(total_approved_volume_cents / 100, MAX_APPROVED_VOLUME) / MAX_APPROVED_VOLUME
+
+    credit_scores = (
+        (on_time_score * WEIGHT_ON_TIME +
+         loans_taken_score * WEIGHT_LOANS_TAKEN +
+         activity_score * WEIGHT_ACTIVITY_YEAR +
+         approved_volume_score * WEIGHT_APPROVED_VOL) * 100
+    ).astype(np.int64)
+    # If current loans sum > approved_limit, credit score = 0
+    credit_scores[np.asarray(current_loans_sum_cents) > np.asarray(approved_limit_cents)] = 0
+    return credit_scores
+
+
+class LoanHistory(NamedTuple):
+    """Per-customer loan aggregates used by the eligibility rules."""
+    count: int = 0
+    paid_on_time: int = 0
+    current_year_loans: int = 0
+    total_loan_amount: float = 0.0
+    existing_emis: float = 0.0
+
+
+# check-eligibility's rate slabs: score above the bound -> minimum interest rate.
+RATE_SLABS = ((50, 0.0), (30, 12.0), (10, 16.0))
+
+# Share of the monthly salary all EMIs together may take.
+EMI_SALARY_SHARE = 0.5
+
+
+def eligibility_score(customer, history: LoanHistory) -> float:
+    """check-eligibility's simple credit score out of 100, from the loan history alone."""
+    score = 0
+    score += history.paid_on_time * 5  # each on-time payment gives 5 points
+    score += max(0, 10 - history.count)  # fewer loans, better score
+    score += history.current_year_loans * 2
+    score += min(40, (history.total_loan_amount / float(customer.approved_limit)) * 40)  # normalized to 40
+    return score
+
+
+def minimum_rate(score: float):
+    """Lowest interest rate the score's slab allows, or None below the last slab."""
+    for bound, rate in RATE_SLABS:
+        if score > bound:
+            return rate
+    return None
+
+
+def assess_eligibility(customer, history: LoanHistory, loan_amount: float, interest_rate: float, tenure: int) -> dict:
     """
-    Calculate EMI (Equated Monthly Installment) using formula:
+    Apply the check-eligibility decision rules to one application.
 
-    EMI = P * r * (1+r)^n / ((1+r)^n - 1)
+    Returns the response body shared by the single and batch
+    check-eligibility endpoints.
+    """
+    result = {
+        "customer_id": customer.customer_id,
+        "approval": False,
+        "interest_rate": interest_rate,
+        "corrected_interest_rate": None,
+        "tenure": tenure,
+        "monthly_installment": None,
+    }
+
+    # If current debt exceeds approved limit, credit score is 0
+    if customer.current_debt > customer.approved_limit:
+        result["reason"] = "Current debt exceeds approved limit"
+        return result
+
+    score = eligibility_score(customer, history)
+
+    # Check EMI impact
+    monthly_salary = float(customer.monthly_salary)
+    new_emi = float(emi_rounded(loan_amount, interest_rate, tenure))
+
+    if history.existing_emis + new_emi > EMI_SALARY_SHARE * monthly_salary:
+        result["monthly_installment"] = new_emi
+        result["reason"] = "Total EMI exceeds 50% of monthly salary"
+        return result
+
+    # Determine interest rate slab based on score
+    floor_rate = minimum_rate(score)
+    if floor_rate is None:
+        result["reason"] = "Low credit score"
+        return result
+
+    corrected_interest = max(interest_rate, floor_rate)
+    result["approval"] = True
+    result["corrected_interest_rate"] = corrected_interest
+    result["monthly_installment"] = float(emi_rounded(loan_amount, corrected_interest, tenure))
+    return result
+
+
+def loan_offers(customer, history: LoanHistory, tenures, interest_rates) -> dict:
+    """
+    The largest loan check-eligibility would approve for every tenure x rate.
+
+    The EMI check runs at the requested rate, so the largest principal is
+    the 50% salary headroom divided by the EMI of one unit of principal,
+    floored to whole rupees and stepped down where half-up rounding of the
+    EMI would tip it over. Any amount up to ``max_loan_amount`` is approved
+    at ``corrected_interest_rate``. Offers come in tenure-major order.
+    """
+    result = {"customer_id": customer.customer_id, "offers": []}
+    if customer.current_debt > customer.approved_limit:
+        result["reason"] = "Current debt exceeds approved limit"
+        return result
+    floor_rate = minimum_rate(eligibility_score(customer, history))
+    if floor_rate is None:
+        result["reason"] = "Low credit score"
+        return result
+
+    headroom = EMI_SALARY_SHARE * float(customer.monthly_salary) - history.existing_emis
+    result["emi_headroom"] = round(max(headroom, 0.0), 2)
+
+    tenure_grid, rate_grid = (grid.ravel() for grid in np.meshgrid(
+        np.asarray(tenures, dtype=int), np.asarray(interest_rates, dtype=float), indexing='ij',
+    ))
+    principal = np.floor(max(headroom, 0.0) / emi(1.0, rate_grid, tenure_grid))
+    # The closed form is exact up to float error and the paisa rounding of
+    # the EMI; nudge the cells where it lands one rupee off either way.
+    for _ in range(2):
+        over = (principal > 0) & (emi_rounded(principal, rate_grid, tenure_grid) > headroom)
+        principal[over] -= 1
+        under = ~over & (emi_rounded(principal + 1, rate_grid, tenure_grid) <= headroom)
+        principal[under] += 1
+    principal = np.maximum(principal, 0)
+
+    corrected = np.maximum(rate_grid, floor_rate)
+    installments = emi_rounded(principal, corrected, tenure_grid)
+    result["offers"] = [
+        {
+            "tenure": int(tenure),
+            "interest_rate": float(rate),
+            "corrected_interest_rate": float(corrected_rate),
+            "max_loan_amount": float(amount),
+            "monthly_installment": float(installment) if amount else None,
+        }
+        for tenure, rate, corrected_rate, amount, installment in zip(
+            tenure_grid, rate_grid, corrected, principal, installments,
+        )
+    ]
+    return result
 
-    where:
-    P = principal loan amount
-    r = monthly interest rate (decimal)
-    n = tenure (months)
 
-    Return EMI as float rounded to 2 decimals
+def add_months(start: date, months: int) -> date:
+    """Same day ``months`` later, clamped to the end of shorter months."""
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return start.replace(year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def highest_id(model, field: str) -> int:
+    """Highest numeric ``field`` of ``model`` on any shard, 0 if there are no rows."""
+    highest = 0
+    for alias in shard_aliases():
+        with use_shard(alias):
+            value = model.objects.aggregate(highest=Max(Cast(field, IntegerField())))['highest']
+        highest = max(highest, value or 0)
+    return highest
+
+
+# Numeric id sequences: counter name -> the model and field whose ids it hands out.
+ID_SEQUENCES = {'customer': (Customer, 'customer_id'), 'loan': (Loan, 'loan_id')}
+
+
+def allocate_ids(name: str, count: int = 1) -> int:
+    """
+    Reserve ``count`` consecutive ids from the ``name`` sequence; returns the first.
+
+    The counter is one IdCounter row on "default", bumped with an UPDATE
+    that locks it until the surrounding transaction ends, so concurrent
+    callers queue for distinct blocks instead of reading the same maximum.
+    (On SQLite the UPDATE takes the database write lock, as in
+    lock_customer.) The first allocation seeds the row from the highest id
+    stored on any shard; that scan is never repeated.
     """
-    P = Decimal(str(loan_amount))
-    annual_interest_rate = Decimal(str(interest_rate))
-    n = tenure
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        counters = IdCounter.objects.using(DEFAULT_DB_ALIAS).filter(name=name)
+        if not counters.update(value=F('value') + count):
+            model, field = ID_SEQUENCES[name]
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    IdCounter.objects.using(DEFAULT_DB_ALIAS).create(name=name, value=highest_id(model, field) + count)
+            except IntegrityError:
+                # Seeded concurrently; take the next block from that row.
+                counters.update(value=F('value') + count)
+        return counters.values_list('value', flat=True).get() - count + 1
 
-    # Convert annual interest rate % to monthly decimal rate
-    r = (annual_interest_rate / Decimal('12')) / Decimal('100')
 
-    if r == 0:
-        # If interest rate is 0, EMI = Principal / tenure
-        emi = P / n
-    else:
-        numerator = P * r * (1 + r) ** n
-        denominator = (1 + r) ** n - 1
-        emi = numerator / denominator
+def advance_ids(name: str, ids) -> None:
+    """Move the ``name`` sequence past ``ids``, numeric ids written from elsewhere (e.g. source files)."""
+    highest = max((int(value) for value in ids if str(value).isdigit()), default=0)
+    if highest:
+        IdCounter.objects.using(DEFAULT_DB_ALIAS).filter(name=name).update(value=Greatest('value', highest))
 
-    # Round EMI to 2 decimals
-    emi = emi.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-    return float(emi)
+def next_loan_id() -> str:
+    """Next free numeric loan_id (loan ids are numeric strings from the source data)."""
+    return str(allocate_ids('loan'))
+
+
+def next_customer_id(count: int = 1) -> int:
+    """First of ``count`` fresh numeric customer_ids, reserved for the caller."""
+    return allocate_ids('customer', count)
+
+
+def lock_customer(customer_id: str) -> Customer:
+    """
+    Fetch a customer and lock its row until the surrounding transaction ends.
+
+    Uses SELECT ... FOR UPDATE where the backend has it. SQLite ignores FOR
+    UPDATE, so there a no-op UPDATE takes the database write lock up front;
+    concurrent writers then wait on the busy timeout instead of failing when
+    a read transaction later tries to upgrade. Raises Customer.DoesNotExist.
+    """
+    customers = Customer.objects.filter(customer_id=customer_id)
+    if not connections[router.db_for_write(Customer)].features.has_select_for_update:
+        customers.update(current_debt=F('current_debt'))
+    return customers.select_for_update().get()
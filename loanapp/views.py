@@ -1,150 +1,260 @@
+import csv
+import itertools
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import CustomerRegisterSerializer, LoanDetailsSerializer,LoanSummarySerializer
+from .serializers import (
+    LOAN_DETAIL_COLUMNS, MAX_INTEREST_RATE, MAX_TENURE, CustomerRegisterSerializer, EligibilityRequestSerializer,
+    LoanRequestSerializer, loan_detail,
+)
 from loanapp.models import Customer, Loan
-from datetime import datetime
-from .utils import calculate_credit_score, calculate_emi  
-import math
+from .emi import emi_money, emi_rounded, iter_schedule
+from .idempotency import HEADER as IDEMPOTENCY_HEADER, request_fingerprint, store_response, stored_response
+from .loan_stats import loan_history, record_loan
+from .pagination import etag_matches, next_link, page_etag, page_queryset, parse_page_request, render_rows
+from .profiles import (
+    cache_stats, get_credit_profile, get_credit_profiles, invalidate_credit_profiles, locked_credit_score,
+)
+from .registration import register_customers, registered
+from .renderers import FAST_RENDERERS
+from .sharding import current_shard, customer_shard, group_by_shard, scatter_first, use_shard
+from .utils import (
+    add_months, assess_eligibility, loan_offers, lock_customer, next_customer_id, next_loan_id,
+)
 
 
 class RegisterCustomerView(APIView):
     def post(self, request):
         serializer = CustomerRegisterSerializer(data=request.data)
         if serializer.is_valid():
-            customer = serializer.save()
-            response_data = {
-                "customer_id": customer.customer_id,
-                "name": f"{customer.first_name} {customer.last_name}",
-                "age": customer.age,
-                "monthly_income": int(customer.monthly_salary),
-                "approved_limit": int(customer.approved_limit),
-                "phone_number": customer.phone_number,
-            }
-            return Response(response_data, status=status.HTTP_201_CREATED)
+            customer_id = str(next_customer_id())
+            with customer_shard(customer_id) as shard, transaction.atomic(using=shard):
+                customer = serializer.save(customer_id=customer_id)
+            return Response(registered(customer), status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class RegisterCustomersBulkView(APIView):
+    """
+    Register a list of customers in one request.
+
+    Results come back in request order: each customer as /register/ returns
+    it, or ``{"error": ...}`` for rows that failed validation. Invalid rows
+    don't stop the rest from being registered.
+    """
+    renderer_classes = FAST_RENDERERS
+    MAX_CUSTOMERS = 100000
 
-class CheckEligibilityView(APIView):
     def post(self, request):
-        data = request.data
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('customers')
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of customers."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.MAX_CUSTOMERS:
+            return Response(
+                {"error": f"At most {self.MAX_CUSTOMERS} customers per request."}, status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        try:
-            customer = Customer.objects.get(customer_id=data['customer_id'])
-        except Customer.DoesNotExist:
-            return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(register_customers(rows), status=status.HTTP_200_OK)
 
-        loan_amount = float(data['loan_amount'])
-        interest_rate = float(data['interest_rate'])
-        tenure = int(data['tenure'])
 
-        # If current debt exceeds approved limit, credit score is 0
-        if customer.current_debt > customer.approved_limit:
-            return Response({
-                "customer_id": customer.customer_id,
-                "approval": False,
-                "interest_rate": interest_rate,
-                "corrected_interest_rate": None,
-                "tenure": tenure,
-                "monthly_installment": None,
-                "reason": "Current debt exceeds approved limit"
-            }, status=status.HTTP_200_OK)
 
-        # Loan history based credit score
-        past_loans = Loan.objects.filter(customer=customer)
-        past_loans_count = past_loans.count()
-        current_year = datetime.now().year
+class CheckEligibilityView(APIView):
+    # Read-only: its queries may go to a read replica (see loanapp/routers.py).
+    replica_reads = True
 
-        paid_on_time = sum(1 for loan in past_loans if loan.end_date and loan.end_date <= loan.tenure_end_date)
-        current_year_loans = sum(1 for loan in past_loans if loan.start_date and loan.start_date.year == current_year)
-        total_loan_amount = sum(loan.loan_amount for loan in past_loans)
+    def post(self, request):
+        # The batch endpoint's validation, so the two agree on what is a valid application.
+        serializer = EligibilityRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        item = serializer.validated_data
+
+        with customer_shard(item['customer_id']):
+            profile = get_credit_profile(item['customer_id'])
+        if profile is None:
+            return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Simple credit score calculation out of 100
-        score = 0
-        score += paid_on_time * 5  # each on-time payment gives 5 points
-        score += max(0, 10 - past_loans_count)  # fewer loans, better score
-        score += current_year_loans * 2
-        score += min(40, (total_loan_amount / customer.approved_limit) * 40)  # normalized to 40
+        # Loan-book counters live on the customer row: no loan queries needed,
+        # and none at all while the profile is cached.
+        customer = profile.customer
+        result = assess_eligibility(
+            customer, loan_history(customer), item['loan_amount'], item['interest_rate'], item['tenure'],
+        )
+        return Response(result, status=status.HTTP_200_OK)
 
-        # Check EMI impact
-        monthly_salary = float(customer.monthly_salary)
-        existing_emis = sum(self.calculate_emi(loan.loan_amount, loan.interest_rate, loan.tenure) for loan in past_loans)
-        new_emi = self.calculate_emi(loan_amount, interest_rate, tenure)
 
-        if existing_emis + new_emi > 0.5 * monthly_salary:
-            return Response({
-                "customer_id": customer.customer_id,
-                "approval": False,
-                "interest_rate": interest_rate,
-                "corrected_interest_rate": None,
-                "tenure": tenure,
-                "monthly_installment": new_emi,
-                "reason": "Total EMI exceeds 50% of monthly salary"
-            }, status=status.HTTP_200_OK)
+class LoanOffersView(APIView):
+    """
+    Every tenure x interest rate a customer could borrow at, in one call.
 
-        # Determine interest rate slab based on score
-        if score > 50:
-            corrected_interest = interest_rate
-            approval = True
-        elif 50 >= score > 30:
-            corrected_interest = max(interest_rate, 12.0)
-            approval = True
-        elif 30 >= score > 10:
-            corrected_interest = max(interest_rate, 16.0)
-            approval = True
-        else:
-            return Response({
-                "customer_id": customer.customer_id,
-                "approval": False,
-                "interest_rate": interest_rate,
-                "corrected_interest_rate": None,
-                "tenure": tenure,
-                "monthly_installment": None,
-                "reason": "Low credit score"
-            }, status=status.HTTP_200_OK)
+    ``?customer_id=1&tenures=12,24&interest_rates=10,14`` returns, per cell,
+    the largest amount check-eligibility would approve and the rate it
+    would correct to, so clients don't probe that endpoint amount by amount.
+    """
+    replica_reads = True
+    renderer_classes = FAST_RENDERERS
+    DEFAULT_TENURES = (6, 12, 24, 36, 48, 60)
+    DEFAULT_INTEREST_RATES = (8.0, 10.0, 12.0, 14.0, 16.0, 18.0)
+    MAX_CELLS = 10000
 
-        corrected_emi = self.calculate_emi(loan_amount, corrected_interest, tenure)
+    def get(self, request):
+        params = request.query_params
+        try:
+            tenures = self.parse_list(params.get('tenures'), int, self.DEFAULT_TENURES, 'tenures')
+            rates = self.parse_list(params.get('interest_rates'), float, self.DEFAULT_INTEREST_RATES, 'interest_rates')
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        # check-eligibility's bounds; the comparisons also turn away NaN.
+        if not (all(1 <= tenure <= MAX_TENURE for tenure in tenures)
+                and all(0 <= rate <= MAX_INTEREST_RATE for rate in rates)):
+            return Response(
+                {"error": f"tenures must be 1 to {MAX_TENURE} and interest_rates 0 to {MAX_INTEREST_RATE:g}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(tenures) * len(rates) > self.MAX_CELLS:
+            return Response(
+                {"error": f"At most {self.MAX_CELLS} tenure x rate combinations per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response({
-            "customer_id": customer.customer_id,
-            "approval": approval,
-            "interest_rate": interest_rate,
-            "corrected_interest_rate": corrected_interest,
-            "tenure": tenure,
-            "monthly_installment": corrected_emi
-        }, status=status.HTTP_200_OK)
+        try:
+            with customer_shard(params.get('customer_id')):
+                customer = Customer.objects.get(customer_id=params.get('customer_id'))
+        except Customer.DoesNotExist:
+            return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(loan_offers(customer, loan_history(customer), tenures, rates), status=status.HTTP_200_OK)
+
+    @staticmethod
+    def parse_list(value, cast, default, name):
+        if not value:
+            return list(default)
+        try:
+            return [cast(item) for item in value.split(',')]
+        except ValueError:
+            raise ValueError(f"{name} must be a comma-separated list of numbers.")
 
-    def calculate_emi(self, principal, rate, tenure_months):
-        r = rate / (12 * 100)
-        emi = principal * r * (math.pow(1 + r, tenure_months)) / (math.pow(1 + r, tenure_months) - 1)
-        return round(emi, 2)
 
+class CheckEligibilityBatchView(APIView):
+    """
+    Score a list of applications in one request.
 
+    Customers are loaded with one query per batch and scored from their
+    loan-book counters; results come back in request order. Pass
+    ``?stream=1`` to receive JSON lines, evaluated STREAM_CHUNK_SIZE
+    applications at a time.
+    """
+    replica_reads = True
+    STREAM_CHUNK_SIZE = 1000
+
+    def post(self, request):
+        applications = request.data
+        if isinstance(applications, dict):
+            applications = applications.get('applications')
+        if not isinstance(applications, list):
+            return Response({"error": "Expected a list of applications."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('stream'):
+            return StreamingHttpResponse(self.stream(applications), content_type='application/x-ndjson')
+        return Response(self.evaluate(applications), status=status.HTTP_200_OK)
+
+    def stream(self, applications):
+        for start in range(0, len(applications), self.STREAM_CHUNK_SIZE):
+            for result in self.evaluate(applications[start:start + self.STREAM_CHUNK_SIZE]):
+                yield json.dumps(result) + "\n"
+
+    def evaluate(self, applications):
+        serializers = [EligibilityRequestSerializer(data=item) for item in applications]
+        valid = [serializer.validated_data for serializer in serializers if serializer.is_valid()]
+
+        # Cached profiles, then one query per shard holding any of the batch's other customers.
+        customers = {}
+        for shard, customer_ids in group_by_shard({item['customer_id'] for item in valid}).items():
+            with use_shard(shard):
+                profiles = get_credit_profiles(customer_ids)
+                customers.update((customer_id, profile.customer) for customer_id, profile in profiles.items())
+
+        results = []
+        for serializer in serializers:
+            if serializer.errors:
+                results.append({"error": serializer.errors})
+                continue
+            item = serializer.validated_data
+            customer = customers.get(item['customer_id'])
+            if customer is None:
+                results.append({"customer_id": item['customer_id'], "error": "Customer not found"})
+                continue
+            results.append(assess_eligibility(
+                customer,
+                loan_history(customer),
+                item['loan_amount'],
+                item['interest_rate'],
+                item['tenure'],
+            ))
+        return results
 
 
 class CreateLoanView(APIView):
     def post(self, request):
-        data = request.data
-        customer_id = data.get('customer_id')
-        loan_amount = float(data.get('loan_amount'))
-        interest_rate = float(data.get('interest_rate'))
-        tenure = int(data.get('tenure'))
+        serializer = LoanRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        customer_id, loan_amount, interest_rate, tenure = (
+            serializer.validated_data[field] for field in ('customer_id', 'loan_amount', 'interest_rate', 'tenure')
+        )
 
-        try:
-            customer = Customer.objects.get(customer_id=customer_id)
-        except Customer.DoesNotExist:
-            return Response({
-                "loan_id": None,
-                "customer_id": customer_id,
-                "loan_approved": False,
-                "message": "Customer not found.",
-                "monthly_installment": None
-            }, status=status.HTTP_404_NOT_FOUND)
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        fingerprint = request_fingerprint({
+            'customer_id': customer_id, 'loan_amount': loan_amount,
+            'interest_rate': interest_rate, 'tenure': tenure,
+        })
 
-        # Run credit score logic (same as check-eligibility)
-        credit_score = calculate_credit_score(customer_id)
+        try:
+            # Decide and book under the customer's row lock, so concurrent
+            # requests for one customer see each other's debt and loans. The
+            # loan and idempotency key are stored on the customer's shard.
+            with customer_shard(customer_id) as shard, transaction.atomic(using=shard):
+                try:
+                    customer = lock_customer(customer_id)
+                except Customer.DoesNotExist:
+                    return Response({
+                        "loan_id": None,
+                        "customer_id": customer_id,
+                        "loan_approved": False,
+                        "message": "Customer not found.",
+                        "monthly_installment": None
+                    }, status=status.HTTP_404_NOT_FOUND)
+
+                if idempotency_key:
+                    replay = stored_response(idempotency_key, fingerprint)
+                    if replay is not None:
+                        return replay
+
+                response = self.decide(customer, customer_id, loan_amount, interest_rate, tenure)
+                if idempotency_key:
+                    store_response(idempotency_key, fingerprint, response)
+        except IntegrityError:
+            # Another request committed the same key first; this one is rolled back.
+            with customer_shard(customer_id):
+                replay = stored_response(idempotency_key, fingerprint) if idempotency_key else None
+            if replay is None:
+                raise
+            return replay
+        return response
+
+    def decide(self, customer, customer_id, loan_amount, interest_rate, tenure):
+        # The cached score, if its snapshot still matches the locked row.
+        credit_score = locked_credit_score(customer)
         approved_limit = customer.approved_limit
 
         if customer.current_debt > approved_limit:
@@ -160,8 +270,8 @@ class CreateLoanView(APIView):
             reason = "Interest rate too low for this credit score."
             approved = False
         else:
-            monthly_installment = calculate_emi(loan_amount, interest_rate, tenure)
-            if monthly_installment * Loan.objects.filter(customer=customer).count() > 0.5 * customer.monthly_salary:
+            monthly_installment = float(emi_rounded(loan_amount, interest_rate, tenure))
+            if monthly_installment * customer.loan_count > 0.5 * float(customer.monthly_salary):
                 reason = "EMI exceeds 50% of monthly income"
                 approved = False
             else:
@@ -177,18 +287,16 @@ class CreateLoanView(APIView):
                 "monthly_installment": None
             }, status=status.HTTP_200_OK)
 
-        # Create Loan
-        loan = Loan.objects.create(
-            customer=customer,
-            loan_amount=loan_amount,
-            interest_rate=interest_rate,
-            tenure=tenure,
-            monthly_installment=monthly_installment
+        loan = self.create_loan(customer, loan_amount, interest_rate, tenure)
+        record_loan(loan)
+        # The counter and debt updates bypass model signals.
+        shard = current_shard()
+        transaction.on_commit(
+            lambda: invalidate_credit_profiles([customer.customer_id], shard), using=customer._state.db,
         )
 
         # Update customer's current debt
-        customer.current_debt += loan_amount
-        customer.save()
+        Customer.objects.filter(pk=customer.pk).update(current_debt=F('current_debt') + Decimal(str(loan_amount)))
 
         return Response({
             "loan_id": loan.loan_id,
@@ -198,24 +306,137 @@ class CreateLoanView(APIView):
             "monthly_installment": monthly_installment
         }, status=status.HTTP_201_CREATED)
 
+    def create_loan(self, customer, loan_amount, interest_rate, tenure):
+        start_date = date.today()
+        return Loan.objects.create(
+            customer=customer,
+            loan_id=next_loan_id(),
+            loan_amount=loan_amount,
+            interest_rate=interest_rate,
+            tenure=tenure,
+            monthly_repayment=emi_money(loan_amount, interest_rate, tenure),
+            emis_paid_on_time=0,
+            start_date=start_date,
+            end_date=add_months(start_date, tenure),
+            loan_approved=True,
+        )
+
 
 class LoanDetailView(APIView):
+    renderer_classes = FAST_RENDERERS
+    replica_reads = True
+
     def get(self, request, loan_id):
-        try:
-            loan = Loan.objects.get(loan_id=loan_id)
-        except Loan.DoesNotExist:
+        # One query per shard until it turns up, customer joined in, only the rendered columns.
+        row = scatter_first(lambda: Loan.objects.filter(loan_id=loan_id).values_list(*LOAN_DETAIL_COLUMNS).first())
+        if row is None:
             return Response({"detail": "Loan not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = LoanDetailsSerializer(loan)
-        return Response(serializer.data)
+        return Response(loan_detail(row))
 
 
 class CustomerLoansView(APIView):
+    """
+    Approved loans of a customer, a page at a time.
+
+    ``?limit=`` sets the page size and ``?fields=`` picks the summary fields;
+    the next page is in the Link header. Pages carry an ETag and answer a
+    matching If-None-Match with 304 before anything is serialized.
+    """
+    renderer_classes = FAST_RENDERERS
+    replica_reads = True
+
     def get(self, request, customer_id):
+        try:
+            page = parse_page_request(request.query_params)
+        except ValueError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
         loans = Loan.objects.filter(customer__customer_id=customer_id, loan_approved=True)
 
-        if not loans.exists():
+        # One query: an empty first page is the not-found case.
+        with customer_shard(customer_id):
+            rows = list(page_queryset(loans, page))
+        if not rows and not page.after_pk:
             return Response({"detail": "No approved loans found for this customer."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = LoanSummarySerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        headers = {'ETag': page_etag(rows, page.fields)}
+        link = next_link(request, rows, page)
+        if link:
+            headers['Link'] = link
+        if etag_matches(request.headers.get('If-None-Match'), headers['ETag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(render_rows(rows[:page.limit], page.fields), status=status.HTTP_200_OK, headers=headers)
+
+
+SCHEDULE_COLUMNS = ['loan_id', 'month', 'payment', 'interest', 'principal', 'balance']
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+def schedule_rows(loans):
+    """Lazily expand (loan_id, amount, rate, tenure) tuples into schedule rows."""
+    for loan_id, loan_amount, interest_rate, tenure in loans:
+        for month, payment, interest, principal, balance in iter_schedule(loan_amount, interest_rate, tenure):
+            yield [loan_id, month, round(payment, 2), round(interest, 2), round(principal, 2), round(balance, 2)]
+
+
+def schedule_response(request, loans, filename):
+    """
+    Stream schedules as JSON lines, or CSV with ``?output=csv``.
+
+    Rows are produced one at a time from ``loans``, which may itself be a
+    lazy queryset iterator, so nothing is materialized up front.
+    """
+    rows = schedule_rows(loans)
+    if request.query_params.get('output') == 'csv':
+        writer = csv.writer(Echo())
+        content = (writer.writerow(row) for row in itertools.chain([SCHEDULE_COLUMNS], rows))
+        response = StreamingHttpResponse(content, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    content = (json.dumps(dict(zip(SCHEDULE_COLUMNS, row))) + "\n" for row in rows)
+    return StreamingHttpResponse(content, content_type='application/x-ndjson')
+
+
+class LoanScheduleView(APIView):
+    replica_reads = True
+
+    def get(self, request, loan_id):
+        loan = scatter_first(lambda: Loan.objects.filter(loan_id=loan_id).values_list(
+            'loan_id', 'loan_amount', 'interest_rate', 'tenure',
+        ).first())
+        if loan is None:
+            return Response({"detail": "Loan not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        return schedule_response(request, [loan], f"loan-{loan_id}-schedule")
+
+
+class CustomerSchedulesView(APIView):
+    replica_reads = True
+
+    def get(self, request, customer_id):
+        with customer_shard(customer_id):
+            if not Customer.objects.filter(customer_id=customer_id).exists():
+                return Response({"detail": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
+            # Pinned now: the rows are read while the response streams, after this block.
+            database = router.db_for_read(Loan)
+
+        loans = (
+            Loan.objects.using(database).filter(customer__customer_id=customer_id)
+            .order_by('pk')
+            .values_list('loan_id', 'loan_amount', 'interest_rate', 'tenure')
+            .iterator(chunk_size=1000)
+        )
+        return schedule_response(request, loans, f"customer-{customer_id}-schedules")
+
+
+class CreditProfileCacheView(APIView):
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
@@ -42,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "loanapp.metrics.MetricsMiddleware",
+    "loanapp.capture.CaptureMiddleware",
+    "loanapp.routers.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -78,9 +81,122 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        # A file-backed test database: the default in-memory one uses shared-cache
+        # table locks that fail concurrent writers immediately instead of
+        # waiting, which the concurrent create-loan tests depend on.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    },
+    # A second local database standing in for a read replica. Nothing reads
+    # from it unless it is listed in READ_REPLICAS below.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_replica.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_db_replica.sqlite3"},
+    },
+    # Two more local databases standing in for shards; unused unless listed
+    # in SHARDS below.
+    "shard_1": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_shard_1.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_db_shard_1.sqlite3"},
+    },
+    "shard_2": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_shard_2.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_db_shard_2.sqlite3"},
+    },
 }
 
+DATABASE_ROUTERS = ["loanapp.sharding.ShardRouter", "loanapp.routers.ReplicaRouter"]
+
+
+# Read replicas
+#
+# loanapp.routers.ReplicaRouter sends the reads of views marked
+# replica_reads = True to a random usable alias in READ_REPLICAS; everything
+# else, and every write, uses "default". A client that makes a write request
+# reads from the primary for the next REPLICA_PIN_SECONDS (a cookie), which
+# should cover the lag allowed below. Replicas are checked at most every
+# REPLICA_CHECK_INTERVAL seconds per process and skipped while unreachable
+# or more than REPLICA_MAX_LAG_SECONDS behind. An empty READ_REPLICAS
+# takes the middleware out and sends everything to "default".
+
+READ_REPLICAS = []
+REPLICA_PIN_COOKIE = "loanapp_primary"
+REPLICA_PIN_SECONDS = 15
+REPLICA_CHECK_INTERVAL = 5
+REPLICA_MAX_LAG_SECONDS = 5
+
+
+# Shards
+#
+# SHARDS lists the databases customers are spread over, hashed on
+# customer_id (see loanapp/sharding.py); each customer's loans live on its
+# shard. Append new shards at the end and run rebalance_shards: only the
+# customers that now hash to the new shard move. Migrate each shard with
+# ``migrate --database <alias>``. Empty keeps everything on "default".
+# Read replicas only serve the tables left on "default" once sharded.
+
+SHARDS = []
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# Credit profiles (loanapp/profiles.py) live in their own cache so bulk jobs
+# can clear it without touching anything else. LocMemCache evicts
+# least-recently-used entries past MAX_ENTRIES, but is per process: with
+# several server workers, one worker's invalidations reach the others only
+# through TIMEOUT. Point it at Redis/Memcached to share it across workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "credit_profiles": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "credit-profiles",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+
+# Request metrics
+#
+# loanapp.metrics.MetricsMiddleware records per-view latency, query count and
+# time, and response size, served in Prometheus format at /api/metrics.
+# Requests slower than METRICS_SLOW_REQUEST_MS are logged to the
+# "loanapp.metrics" logger, with their SQL at DEBUG. Only clients in the
+# METRICS_ALLOWED_IPS networks can scrape; others get a 404.
+# METRICS_ENABLED = False removes the middleware from the stack.
+
+METRICS_ENABLED = True
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_ALLOWED_IPS = ["127.0.0.1/32", "::1/128"]
+
+
+# Traffic capture
+#
+# loanapp.capture.CaptureMiddleware appends a CAPTURE_SAMPLE_RATE share of
+# /api/ requests to CAPTURE_PATH for replay_requests, rotating it past
+# CAPTURE_MAX_BYTES and keeping CAPTURE_BACKUP_COUNT old files. {pid} in the
+# path gives each server worker its own file. Off by default: it records
+# request bodies.
+
+CAPTURE_ENABLED = False
+CAPTURE_SAMPLE_RATE = 0.01
+CAPTURE_PATH = str(BASE_DIR / "captured" / "requests-{pid}.jsonl")
+CAPTURE_PATH_PREFIX = "/api/"
+CAPTURE_MAX_BYTES = 50 * 1024 * 1024
+CAPTURE_BACKUP_COUNT = 5
+CAPTURE_MAX_BODY_BYTES = 64 * 1024
+
+
+# loanapp's covering index uses INCLUDE columns on PostgreSQL; SQLite builds the
+# same index without them, which is what we want.
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
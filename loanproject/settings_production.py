@@ -0,0 +1,127 @@
+"""
+Production settings for loanproject.
+
+Select with DJANGO_SETTINGS_MODULE=loanproject.settings_production (the
+Dockerfile does). Deployment-specific values come from the environment;
+gunicorn.conf.py holds the server side.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CAPTURE_PATH, CAPTURE_SAMPLE_RATE
+
+
+def required(name):
+    # No fallbacks: a missing variable must stop the deploy, not boot it
+    # with the committed dev key or without Host-header validation.
+    value = os.environ.get(name)
+    if not value:
+        raise ImproperlyConfigured(f"Set the {name} environment variable.")
+    return value
+
+
+SECRET_KEY = required("DJANGO_SECRET_KEY")
+
+DEBUG = os.environ.get("DEBUG", "0") == "1"
+
+ALLOWED_HOSTS = required("DJANGO_ALLOWED_HOSTS").split(",")
+
+
+# Database
+#
+# Connections stay open for DB_CONN_MAX_AGE seconds and are health-checked
+# before reuse, so each worker thread keeps one warm connection instead of
+# reconnecting per request. Under ASGI Django runs queries on per-request
+# threads, so persistent connections are off there by default.
+
+SERVER_INTERFACE = os.environ.get("SERVER_INTERFACE", "wsgi")
+
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 0 if SERVER_INTERFACE == "asgi" else 600))
+
+if os.environ.get("DB_ENGINE", "sqlite") == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "loanapp"),
+            "USER": os.environ.get("POSTGRES_USER", "loanapp"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # Django 4.2 has no built-in pool: persistent connections pool per
+            # worker thread, and PgBouncer pools across workers. In its
+            # transaction mode named cursors break, so turn them off.
+            "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DB_POOLER") == "pgbouncer",
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # Seconds a writer waits for the lock before "database is locked".
+            "OPTIONS": {"timeout": 20},
+        }
+    }
+
+# Read replicas: POSTGRES_REPLICA_HOSTS (host[:port],...) adds a replica_N
+# alias per standby with the primary's credentials; SQLITE_REPLICA_PATHS
+# does the same for SQLite copies kept current by an external replicator.
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    replica_locations = [
+        dict(zip(("HOST", "PORT"), host.split(":", 1)))
+        for host in os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(",") if host
+    ]
+else:
+    replica_locations = [{"NAME": path} for path in os.environ.get("SQLITE_REPLICA_PATHS", "").split(",") if path]
+READ_REPLICAS = []
+for number, location in enumerate(replica_locations, 1):
+    DATABASES[f"replica_{number}"] = {**DATABASES["default"], **location}
+    READ_REPLICAS.append(f"replica_{number}")
+
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 15))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+
+# Shards: POSTGRES_SHARD_HOSTS (host[:port],...) or SQLITE_SHARD_PATHS adds
+# a shard_N alias per database, with "default" as shard 0. Only ever
+# append: the order decides which shard each customer lives on.
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    shard_locations = [
+        dict(zip(("HOST", "PORT"), host.split(":", 1)))
+        for host in os.environ.get("POSTGRES_SHARD_HOSTS", "").split(",") if host
+    ]
+else:
+    shard_locations = [{"NAME": path} for path in os.environ.get("SQLITE_SHARD_PATHS", "").split(",") if path]
+SHARDS = ["default"] if shard_locations else []
+for number, location in enumerate(shard_locations, 1):
+    DATABASES[f"shard_{number}"] = {**DATABASES["default"], **location}
+    SHARDS.append(f"shard_{number}")
+
+# Applied to every new SQLite connection (see loanapp/signals.py). WAL lets
+# readers run alongside the single writer; synchronous=NORMAL is durable
+# across application crashes in WAL mode and skips an fsync per commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # KiB, so ~64 MB of page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+# Request metrics; METRICS_ENABLED=0 takes the middleware out entirely.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_SLOW_REQUEST_MS = int(os.environ.get("METRICS_SLOW_REQUEST_MS", 500))
+# Comma-separated addresses or CIDR networks allowed to scrape /api/metrics.
+METRICS_ALLOWED_IPS = os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1/32,::1/128").split(",")
+
+# Traffic capture for replay_requests (see settings.py).
+CAPTURE_ENABLED = os.environ.get("CAPTURE_ENABLED", "0") == "1"
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", CAPTURE_SAMPLE_RATE))
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH", CAPTURE_PATH)